@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+# Grafos para benchmarks: sintéticos (grilla y geométrico aleatorio) con los mismos
+# atributos que un grafo OSMnx (x/y, length, oneway, highway, geometry), y los
+# .graphml/.snapshot que haya en data/cache. Comentarios en español, variables en inglés.
+import glob
+import math
+import os
+import random
+from typing import Iterator, Tuple
+
+import networkx as nx
+import numpy as np
+from shapely.geometry import LineString
+
+from src.algorithms.astar import haversine_m
+from src.graph.downloader import CACHE_DIR
+
+HIGHWAY_CLASSES = ["residential", "tertiary", "secondary", "primary"]
+BASE_ID = 1_000_000
+
+
+def _add_street(G, a: int, b: int, rnd: random.Random, highway: str, oneway: bool) -> None:
+    na, nb = G.nodes[a], G.nodes[b]
+    length = haversine_m(na["y"], na["x"], nb["y"], nb["x"]) * rnd.uniform(1.0, 1.25)
+    geom = LineString([(na["x"], na["y"]), (nb["x"], nb["y"])])
+    G.add_edge(a, b, length=length, oneway=oneway, highway=highway, geometry=geom)
+    if not oneway:
+        G.add_edge(b, a, length=length, oneway=False, highway=highway,
+                   geometry=LineString(list(geom.coords)[::-1]))
+
+
+def grid_graph(
+        n: int,
+        seed: int = 0,
+        spacing_deg: float = 0.001,
+        oneway_ratio: float = 0.3,
+        lat0: float = 4.6,
+        lon0: float = -74.1,
+) -> nx.MultiDiGraph:
+    """Grilla n x n con coordenadas perturbadas, ~30 % de vías en un sentido y clases de vía."""
+    rnd = random.Random(seed)
+    G = nx.MultiDiGraph(crs="epsg:4326", name=f"grid_{n}x{n}")
+
+    def nid(i: int, j: int) -> int:
+        return BASE_ID + i * n + j
+
+    jitter = spacing_deg / 5
+    for i in range(n):
+        for j in range(n):
+            G.add_node(nid(i, j), x=lon0 + j * spacing_deg + rnd.uniform(-jitter, jitter),
+                       y=lat0 + i * spacing_deg + rnd.uniform(-jitter, jitter), street_count=4)
+    for i in range(n):
+        for j in range(n):
+            for di, dj in ((0, 1), (1, 0)):
+                if i + di < n and j + dj < n:
+                    # Arterias cada 10 filas/columnas
+                    major = (i % 10 == 0 and di == 0) or (j % 10 == 0 and dj == 0)
+                    hw = rnd.choice(HIGHWAY_CLASSES[2:]) if major else rnd.choice(HIGHWAY_CLASSES[:2])
+                    _add_street(G, nid(i, j), nid(i + di, j + dj), rnd, hw, rnd.random() < oneway_ratio)
+    return G
+
+
+def random_geometric_graph(
+        num_nodes: int,
+        seed: int = 0,
+        k: int = 4,
+        extent_deg: float = 0.1,
+        oneway_ratio: float = 0.2,
+        lat0: float = 4.6,
+        lon0: float = -74.1,
+) -> nx.MultiDiGraph:
+    """
+    Puntos aleatorios uniformes unidos a sus k vecinos más cercanos (KD-tree),
+    quedándose con la componente conexa más grande: topología irregular tipo ciudad.
+    """
+    from sklearn.neighbors import KDTree
+
+    rnd = random.Random(seed)
+    rng = np.random.default_rng(seed)
+    xs = lon0 + rng.uniform(0, extent_deg, num_nodes)
+    ys = lat0 + rng.uniform(0, extent_deg, num_nodes)
+    G = nx.MultiDiGraph(crs="epsg:4326", name=f"rgg_{num_nodes}")
+    for i in range(num_nodes):
+        G.add_node(BASE_ID + i, x=float(xs[i]), y=float(ys[i]))
+
+    coslat = math.cos(math.radians(lat0))
+    _dist, nbrs = KDTree(np.column_stack([xs * coslat, ys])).query(np.column_stack([xs * coslat, ys]), k=k + 1)
+    seen = set()
+    for i in range(num_nodes):
+        for j in nbrs[i, 1:]:
+            pair = (min(i, int(j)), max(i, int(j)))
+            if pair in seen:
+                continue
+            seen.add(pair)
+            hw = HIGHWAY_CLASSES[min(3, int(rnd.expovariate(1.5)))]
+            _add_street(G, BASE_ID + pair[0], BASE_ID + pair[1], rnd, hw, rnd.random() < oneway_ratio)
+
+    largest = max(nx.weakly_connected_components(G), key=len)
+    G = G.subgraph(largest).copy()
+    for n in G.nodes:
+        G.nodes[n]["street_count"] = G.degree(n)
+    return G
+
+
+def cached_graphs(cache_dir: str = CACHE_DIR) -> Iterator[Tuple[str, str]]:
+    """(nombre, ruta) de los grafos reales disponibles en data/cache (snapshot o .graphml)."""
+    seen = set()
+    for path in sorted(glob.glob(os.path.join(cache_dir, "*.snapshot"))):
+        name = os.path.basename(path)[: -len(".snapshot")]
+        seen.add(name)
+        yield name, path
+    for path in sorted(glob.glob(os.path.join(cache_dir, "*.graphml"))):
+        name = os.path.basename(path)[: -len(".graphml")]
+        if name not in seen:
+            yield name, path
+
+
+def load_cached_graph(path: str):
+    if path.endswith(".snapshot"):
+        from src.graph.snapshot import load_graph_snapshot
+        return load_graph_snapshot(path)
+    import osmnx as ox
+    return ox.load_graphml(path)
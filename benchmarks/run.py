@@ -0,0 +1,328 @@
+from __future__ import annotations
+
+# Suite de benchmarks de ruteo (offline). Mide construcción del grafo, memoria,
+# latencia por consulta (percentiles), nodos asentados y throughput de cada motor,
+# y escribe un JSON comparable entre commits. Comentarios en español, variables en inglés.
+#
+# Uso:
+#   python -m benchmarks.run                                  # grillas + RGG por defecto + data/cache
+#   python -m benchmarks.run --grid 50 100 --rgg 5000 --queries 200 --engines dijkstra_csr astar ch
+#   python -m benchmarks.run --compare benchmarks/results/a.json benchmarks/results/b.json
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, Optional, Sequence
+
+import numpy as np
+
+from benchmarks.graphs import cached_graphs, grid_graph, load_cached_graph, random_geometric_graph
+from src.algorithms.alt import ALTLandmarks
+from src.algorithms.astar import AStarSearch
+from src.algorithms.bidirectional import BidirectionalDijkstra
+from src.algorithms.contraction_hierarchies import ContractionHierarchy
+from src.algorithms.dijkstra import dijkstra
+from src.graph.builder import build_simple_graph
+from src.graph.csr import CSRGraph
+from src.graph.reduction import ReducedEngine, reduce_graph
+from src.graph.spatial_index import SnappingIndex
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+ENGINES = ("dijkstra", "dijkstra_csr", "astar", "bidirectional", "alt", "ch", "reduced")
+
+
+@contextlib.contextmanager
+def _quiet():
+    """Silencia los print por consulta de los motores durante las mediciones."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+TRACE_MEMORY = True
+
+
+def _measure(fn: Callable):
+    """
+    Ejecuta fn y devuelve (resultado, segundos, pico de memoria asignada en MB).
+    tracemalloc encarece las asignaciones (~2x en preprocesos); con --no-memory
+    los tiempos son más fieles y la memoria se reporta como None.
+    """
+    if not TRACE_MEMORY:
+        t0 = time.perf_counter()
+        with _quiet():
+            result = fn()
+        return result, time.perf_counter() - t0, None
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    try:
+        with _quiet():
+            result = fn()
+    finally:
+        elapsed = time.perf_counter() - t0
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, elapsed, peak / 1e6
+
+
+def _mb(value: Optional[float]) -> Optional[float]:
+    return None if value is None else round(value, 2)
+
+
+def _percentiles(samples_ms: Sequence[float]) -> Dict[str, float]:
+    a = np.asarray(samples_ms, dtype=np.float64)
+    if not len(a):
+        return {}
+    return {
+        "mean": round(float(a.mean()), 4),
+        "p50": round(float(np.percentile(a, 50)), 4),
+        "p90": round(float(np.percentile(a, 90)), 4),
+        "p99": round(float(np.percentile(a, 99)), 4),
+        "max": round(float(a.max()), 4),
+    }
+
+
+def _git_revision() -> Dict[str, Optional[str]]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=root, text=True).strip()
+        dirty = bool(subprocess.check_output(["git", "status", "--porcelain", "--untracked-files=no"],
+                                             cwd=root, text=True).strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def _engine_factories(G, adjacency, csr: CSRGraph, weight_type: str):
+    """{nombre: función de preproceso -> callable(source, target, stats)}."""
+    def dijkstra_dict():
+        return lambda s, t, stats: dijkstra(adjacency, s, t, weight_type, stats=stats)
+
+    def dijkstra_csr():
+        return lambda s, t, stats: dijkstra(csr, s, t, weight_type, stats=stats)
+
+    def astar():
+        engine = AStarSearch(G)
+        engine.heuristic_scale(csr, weight_type)
+        return lambda s, t, stats: engine(csr, s, t, weight_type, stats=stats)
+
+    def bidirectional():
+        engine = BidirectionalDijkstra(csr)
+        return lambda s, t, stats: engine(csr, s, t, weight_type, stats=stats)
+
+    def alt():
+        engine = ALTLandmarks.build(csr, weight_type, num_landmarks=16, G=G, verbose=False)
+        return lambda s, t, stats: engine.query(s, t, stats=stats)
+
+    def ch():
+        engine = ContractionHierarchy.build(csr, weight_type, verbose=False)
+        return lambda s, t, stats: engine.query(s, t, stats=stats)
+
+    def reduced():
+        # Solo contracción de cadenas (sin filtrar SCC) para que todos los pares sean comparables
+        with _quiet():
+            engine = ReducedEngine(reduce_graph(csr, largest_scc=False), dijkstra)
+        return lambda s, t, stats: engine(csr, s, t, weight_type, stats=stats)
+
+    return {
+        "dijkstra": dijkstra_dict,
+        "dijkstra_csr": dijkstra_csr,
+        "astar": astar,
+        "bidirectional": bidirectional,
+        "alt": alt,
+        "ch": ch,
+        "reduced": reduced,
+    }
+
+
+def bench_graph(
+        name: str,
+        G,
+        queries: int = 200,
+        engines: Sequence[str] = ENGINES,
+        weight_type: str = "distance",
+        seed: int = 0,
+        snap_points: int = 10_000,
+) -> dict:
+    """Benchmark completo de un grafo: construcción, ajuste espacial y cada motor de búsqueda."""
+    print(f"[BENCH] {name}: {G.number_of_nodes():,} nodos, {G.number_of_edges():,} aristas")
+    out = {"graph": name, "nodes": G.number_of_nodes(), "edges": G.number_of_edges(), "weight_type": weight_type}
+
+    # 1) Construcción del grafo simplificado (dict) y CSR
+    adjacency, build_s, build_mb = _measure(lambda: build_simple_graph("", "", G, weight_type=weight_type))
+    csr, csr_s, csr_mb = _measure(lambda: CSRGraph.from_adjacency(adjacency, weight_type=weight_type))
+    out["build"] = {
+        "build_simple_graph_s": round(build_s, 4),
+        "build_simple_graph_peak_mb": _mb(build_mb),
+        "csr_s": round(csr_s, 4),
+        "csr_peak_mb": _mb(csr_mb),
+        "csr_bytes": int(csr.memory_bytes()),
+    }
+
+    # 2) Ajuste espacial: construcción del índice, lote y consultas individuales
+    rng = np.random.default_rng(seed)
+    index, index_s, index_mb = _measure(lambda: SnappingIndex.from_graph(G, with_edges=False))
+    lats = rng.uniform(index.lat.min(), index.lat.max(), snap_points)
+    lons = rng.uniform(index.lon.min(), index.lon.max(), snap_points)
+    t0 = time.perf_counter()
+    index.nearest_nodes(lats, lons)
+    batch_s = time.perf_counter() - t0
+    single_ms = []
+    for la, lo in zip(lats[:200], lons[:200]):
+        t0 = time.perf_counter()
+        index.nearest_nodes([la], [lo])
+        single_ms.append((time.perf_counter() - t0) * 1000)
+    out["snapping"] = {
+        "index_build_s": round(index_s, 4),
+        "index_peak_mb": _mb(index_mb),
+        "batch_points": snap_points,
+        "batch_points_per_s": round(snap_points / batch_s, 1),
+        "single_ms": _percentiles(single_ms),
+    }
+
+    # 3) Motores de búsqueda sobre los mismos pares aleatorios
+    nodes = csr.node_ids
+    pairs = [(int(nodes[a]), int(nodes[b])) for a, b in rng.integers(0, len(nodes), size=(queries, 2))]
+    factories = _engine_factories(G, adjacency, csr, weight_type)
+    reference = None
+    out["engines"] = {}
+    for engine_name in engines:
+        query, prep_s, prep_mb = _measure(factories[engine_name])
+        latencies, settled, costs = [], [], []
+        with _quiet():
+            t_all = time.perf_counter()
+            for s, t in pairs:
+                stats = {}
+                t0 = time.perf_counter()
+                _path, cost = query(s, t, stats)
+                latencies.append((time.perf_counter() - t0) * 1000)
+                settled.append(stats.get("settled", 0))
+                costs.append(cost)
+            total_s = time.perf_counter() - t_all
+
+        costs = np.asarray(costs, dtype=np.float64)
+        if reference is None:
+            reference = costs
+        both_inf = np.isinf(costs) & np.isinf(reference)
+        close = np.isclose(costs, reference, rtol=1e-6, atol=1e-6) | both_inf
+        out["engines"][engine_name] = {
+            "preprocess_s": round(prep_s, 4),
+            "preprocess_peak_mb": _mb(prep_mb),
+            "latency_ms": _percentiles(latencies),
+            "settled_mean": round(float(np.mean(settled)), 1),
+            "queries_per_s": round(len(pairs) / total_s, 1),
+            "mismatches": int((~close).sum()),
+        }
+        r = out["engines"][engine_name]
+        print(
+            f"  {engine_name:<14} prep={r['preprocess_s']:>7.2f}s  p50={r['latency_ms']['p50']:>8.3f}ms  "
+            f"p99={r['latency_ms']['p99']:>8.3f}ms  settled={r['settled_mean']:>9.1f}  "
+            f"qps={r['queries_per_s']:>8.1f}  mismatches={r['mismatches']}"
+        )
+    return out
+
+
+def run(args) -> dict:
+    graphs = []
+    for n in args.grid:
+        graphs.append((f"grid_{n}x{n}", lambda n=n: grid_graph(n, seed=args.seed)))
+    for n in args.rgg:
+        graphs.append((f"rgg_{n}", lambda n=n: random_geometric_graph(n, seed=args.seed)))
+    if not args.no_cache_graphs:
+        for name, path in cached_graphs():
+            graphs.append((name, lambda path=path: load_cached_graph(path)))
+
+    results = []
+    for name, make in graphs:
+        G, load_s, _mb = _measure(make)
+        res = bench_graph(name, G, queries=args.queries, engines=args.engines, seed=args.seed)
+        res["load_s"] = round(load_s, 4)
+        results.append(res)
+
+    return {
+        "meta": {
+            **_git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "queries": args.queries,
+            "seed": args.seed,
+            "trace_memory": TRACE_MEMORY,
+        },
+        "results": results,
+    }
+
+
+def compare(old_path: str, new_path: str, threshold: float = 0.10) -> int:
+    """
+    Compara dos JSON de resultados (p50 y preproceso por motor/grafo, tiempo de construcción).
+    Devuelve el número de regresiones mayores que `threshold` (p. ej. 0.10 = 10 %).
+    """
+    with open(old_path, encoding="utf-8") as fh:
+        old = {r["graph"]: r for r in json.load(fh)["results"]}
+    with open(new_path, encoding="utf-8") as fh:
+        new = {r["graph"]: r for r in json.load(fh)["results"]}
+
+    regressions = 0
+
+    def row(label: str, a: float, b: float) -> None:
+        nonlocal regressions
+        ratio = (b / a) if a else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag, regressions = "  <-- REGRESIÓN", regressions + 1
+        elif ratio < 1 - threshold:
+            flag = "  (mejora)"
+        print(f"  {label:<40} {a:>10.3f} -> {b:>10.3f}  x{ratio:5.2f}{flag}")
+
+    for graph in sorted(set(old) & set(new)):
+        print(f"[COMPARE] {graph}")
+        o, n = old[graph], new[graph]
+        row("build_simple_graph_s", o["build"]["build_simple_graph_s"], n["build"]["build_simple_graph_s"])
+        for engine in sorted(set(o["engines"]) & set(n["engines"])):
+            oe, ne = o["engines"][engine], n["engines"][engine]
+            row(f"{engine} p50_ms", oe["latency_ms"]["p50"], ne["latency_ms"]["p50"])
+            row(f"{engine} preprocess_s", oe["preprocess_s"], ne["preprocess_s"])
+    print(f"[COMPARE] {regressions} regresión(es) > {threshold:.0%}")
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks de ruteo (offline).")
+    parser.add_argument("--grid", type=int, nargs="*", default=[50, 100], help="lados de grillas n x n")
+    parser.add_argument("--rgg", type=int, nargs="*", default=[5000], help="nodos de grafos geométricos aleatorios")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--engines", nargs="*", default=list(ENGINES), choices=ENGINES)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-cache-graphs", action="store_true", help="ignora los grafos de data/cache")
+    parser.add_argument("--output", default=None, help="JSON de salida (por defecto benchmarks/results/)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compara dos JSON de resultados")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument("--no-memory", action="store_true", help="no usa tracemalloc (tiempos más fieles)")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, threshold=args.threshold) else 0)
+
+    global TRACE_MEMORY
+    TRACE_MEMORY = not args.no_memory
+    report = run(args)
+    output = args.output
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        commit = (report["meta"]["commit"] or "nogit")[:10]
+        output = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{commit}.json")
+    with open(output, "w", encoding="utf-8") as fh:
+        json.dump(report, fh, indent=1)
+    print(f"[BENCH] Resultados guardados en: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+from __future__ import annotations
+
+# ALT (A*, Landmarks, Triangle inequality): tablas de distancias a/desde k landmarks
+# que dan una cota inferior más ajustada que la distancia en línea recta.
+# Comentarios en español, variables en inglés.
+import heapq
+import math
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from src.graph.csr import CSRGraph
+from src.graph.downloader import graph_cache_path
+
+ALT_FORMAT_VERSION = 1
+
+
+def alt_cache_path(place: str, network_type: str = "drive", weight_type: str = "distance",
+                   num_landmarks: int = 16) -> str:
+    """Ruta de las tablas ALT junto al .graphml de download_city_graph."""
+    return graph_cache_path(place, network_type, suffix=f".{weight_type}.alt{num_landmarks}.npz")
+
+
+def _index_lists(csr: CSRGraph) -> Tuple[list, list]:
+    """Listas por nodo [(vecino_idx, peso), ...] hacia adelante y hacia atrás."""
+    n = csr.num_nodes
+    ptr, ind, wts = csr.indptr.tolist(), csr.indices.tolist(), csr.weights.tolist()
+    forward = [list(zip(ind[ptr[i]:ptr[i + 1]], wts[ptr[i]:ptr[i + 1]])) for i in range(n)]
+    backward: list[list[Tuple[int, float]]] = [[] for _ in range(n)]
+    for u in range(n):
+        for v, w in forward[u]:
+            backward[v].append((u, w))
+    return forward, backward
+
+
+def _one_to_all(adj: list, source: int) -> np.ndarray:
+    """Dijkstra completo desde `source` sobre listas por índice; inf si no alcanzable."""
+    n = len(adj)
+    dist = [math.inf] * n
+    dist[source] = 0.0
+    queue = [(0.0, source)]
+    while queue:
+        d, x = heapq.heappop(queue)
+        if d > dist[x]:
+            continue
+        for y, w in adj[x]:
+            nd = d + w
+            if nd < dist[y]:
+                dist[y] = nd
+                heapq.heappush(queue, (nd, y))
+    return np.asarray(dist, dtype=np.float64)
+
+
+class ALTLandmarks:
+    """
+    Preprocesamiento ALT y consulta A* con cotas por landmarks.
+
+    Para cada landmark L se guardan d(L, v) (tabla forward) y d(v, L) (tabla backward).
+    Por desigualdad triangular, para llegar de v a t:
+        h(v) = max_L max(d(L, t) - d(L, v), d(v, L) - d(t, L))
+    es una cota inferior admisible y consistente.
+
+    La instancia es invocable con la firma de dijkstra (`dijkstra_fn`); como CH,
+    consulta el grafo con el que se construyeron las tablas.
+    """
+
+    def __init__(
+            self,
+            node_ids: np.ndarray,
+            indptr: np.ndarray,
+            indices: np.ndarray,
+            weights: np.ndarray,
+            landmarks: np.ndarray,
+            forward: np.ndarray,
+            backward: np.ndarray,
+            weight_type: str = "distance",
+            fingerprint: str = "",
+    ):
+        self.csr = CSRGraph(node_ids, indptr, indices, weights, weight_type=weight_type)
+        self.landmarks = landmarks          # índices densos de los landmarks (k,)
+        self.forward = forward              # (k, n): d(L, v)
+        self.backward = backward            # (k, n): d(v, L)
+        self.weight_type = weight_type
+        self.fingerprint = fingerprint or self.csr.fingerprint()
+        self.last_settled = 0
+
+        self._adj, _ = _index_lists(self.csr)
+        self._ids = node_ids.tolist()
+        self._index = {node: i for i, node in enumerate(self._ids)}
+        # Transpuestas contiguas: fila v = distancias de todos los landmarks
+        self._fwd_t = np.ascontiguousarray(forward.T)
+        self._bwd_t = np.ascontiguousarray(backward.T)
+
+    # ——— Preprocesamiento ———
+    @staticmethod
+    def select_landmarks(
+            csr: CSRGraph,
+            forward_adj: list,
+            num_landmarks: int,
+            coords: Optional[Dict[int, Tuple[float, float]]] = None,
+    ) -> list[int]:
+        """
+        Selección farthest-point: el primer landmark es el nodo más alejado del centro
+        del área del grafo (si hay coordenadas) y cada siguiente es el nodo alcanzable
+        con mayor distancia mínima (en el grafo) a los landmarks ya elegidos.
+        """
+        n = csr.num_nodes
+        ids = csr.node_ids.tolist()
+        if coords:
+            lats = [coords[i][0] for i in ids if i in coords]
+            lons = [coords[i][1] for i in ids if i in coords]
+            c_lat = (min(lats) + max(lats)) / 2
+            c_lon = (min(lons) + max(lons)) / 2
+            first = max(
+                (i for i in range(n) if ids[i] in coords),
+                key=lambda i: (coords[ids[i]][0] - c_lat) ** 2 + (coords[ids[i]][1] - c_lon) ** 2,
+            )
+        else:
+            first = 0
+
+        chosen = [first]
+        min_dist = _one_to_all(forward_adj, first)
+        while len(chosen) < min(num_landmarks, n):
+            finite = np.where(np.isfinite(min_dist), min_dist, -1.0)
+            finite[chosen] = -1.0
+            nxt = int(np.argmax(finite))
+            if finite[nxt] <= 0:
+                break
+            chosen.append(nxt)
+            min_dist = np.minimum(min_dist, _one_to_all(forward_adj, nxt))
+        return chosen
+
+    @classmethod
+    def build(
+            cls,
+            graph,
+            weight_type: str = "distance",
+            num_landmarks: int = 16,
+            G=None,
+            verbose: bool = True,
+    ) -> "ALTLandmarks":
+        """
+        Args:
+            graph: salida de build_simple_graph (dict o CSRGraph).
+            weight_type: "distance" o "duration".
+            num_landmarks: número de landmarks k.
+            G: grafo OSMnx opcional; sus coordenadas orientan el primer landmark hacia la periferia.
+            verbose: imprime progreso.
+        """
+        t0 = time.perf_counter()
+        csr = graph if isinstance(graph, CSRGraph) else CSRGraph.from_adjacency(graph, weight_type=weight_type)
+        forward_adj, backward_adj = _index_lists(csr)
+
+        coords = None
+        if G is not None:
+            coords = {n: (float(d["y"]), float(d["x"])) for n, d in G.nodes(data=True)}
+
+        landmarks = cls.select_landmarks(csr, forward_adj, num_landmarks, coords)
+        forward = np.vstack([_one_to_all(forward_adj, L) for L in landmarks])
+        backward = np.vstack([_one_to_all(backward_adj, L) for L in landmarks])
+
+        alt = cls(
+            csr.node_ids, csr.indptr, csr.indices, csr.weights,
+            landmarks=np.asarray(landmarks, dtype=np.int64),
+            forward=forward,
+            backward=backward,
+            weight_type=weight_type,
+            fingerprint=csr.fingerprint(),
+        )
+        if verbose:
+            print(
+                f"[INFO] ALT listo: {len(landmarks)} landmarks, {csr.num_nodes:,} nodos, "
+                f"tablas={(forward.nbytes + backward.nbytes) / 1e6:.1f} MB, {time.perf_counter() - t0:.1f}s"
+            )
+        return alt
+
+    def recustomize(self, graph, verbose: bool = False) -> "ALTLandmarks":
+        """
+        Tablas ALT para `graph` con la misma topología y pesos nuevos (tráfico).
+
+        Si ningún peso bajó, las tablas actuales siguen siendo cotas inferiores
+        admisibles (las distancias reales solo pueden crecer) y se reutilizan sin
+        recalcular; si alguno bajó, se recalculan las tablas con los mismos landmarks.
+        """
+        t0 = time.perf_counter()
+        csr = graph if isinstance(graph, CSRGraph) else CSRGraph.from_adjacency(graph, weight_type=self.weight_type)
+        if not (np.array_equal(csr.node_ids, self.csr.node_ids) and np.array_equal(csr.indptr, self.csr.indptr)
+                and np.array_equal(csr.indices, self.csr.indices)):
+            raise ValueError("recustomize requiere la misma topología con la que se construyeron las tablas.")
+
+        if np.all(csr.weights >= self.csr.weights):
+            forward, backward, reused = self.forward, self.backward, True
+        else:
+            forward_adj, backward_adj = _index_lists(csr)
+            landmarks = self.landmarks.tolist()
+            forward = np.vstack([_one_to_all(forward_adj, L) for L in landmarks])
+            backward = np.vstack([_one_to_all(backward_adj, L) for L in landmarks])
+            reused = False
+
+        alt = type(self)(
+            csr.node_ids, csr.indptr, csr.indices, csr.weights,
+            landmarks=self.landmarks,
+            forward=forward,
+            backward=backward,
+            weight_type=self.weight_type,
+        )
+        if verbose:
+            action = "reutilizadas (solo subieron pesos)" if reused else "recalculadas"
+            print(f"[INFO] Tablas ALT {action} en {time.perf_counter() - t0:.2f}s")
+        return alt
+
+    # ——— Persistencia ———
+    def save(self, path: str) -> str:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez_compressed(
+            path,
+            version=np.array(ALT_FORMAT_VERSION),
+            weight_type=np.array(self.weight_type),
+            fingerprint=np.array(self.fingerprint),
+            node_ids=self.csr.node_ids,
+            indptr=self.csr.indptr,
+            indices=self.csr.indices,
+            weights=self.csr.weights,
+            landmarks=self.landmarks,
+            forward=self.forward,
+            backward=self.backward,
+        )
+        print(f"[INFO] Tablas ALT guardadas en: {path}")
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "ALTLandmarks":
+        with np.load(path) as data:
+            if int(data["version"]) != ALT_FORMAT_VERSION:
+                raise ValueError(f"Versión de tablas ALT incompatible en {path}")
+            return cls(
+                data["node_ids"], data["indptr"], data["indices"], data["weights"],
+                landmarks=data["landmarks"],
+                forward=data["forward"],
+                backward=data["backward"],
+                weight_type=str(data["weight_type"]),
+                fingerprint=str(data["fingerprint"]),
+            )
+
+    @classmethod
+    def load_or_build(
+            cls,
+            graph,
+            place: str,
+            network_type: str = "drive",
+            weight_type: str = "distance",
+            num_landmarks: int = 16,
+            G=None,
+    ) -> "ALTLandmarks":
+        """Reutiliza las tablas en caché si corresponden al grafo actual; si no, las construye y guarda."""
+        path = alt_cache_path(place, network_type, weight_type, num_landmarks)
+        csr = graph if isinstance(graph, CSRGraph) else CSRGraph.from_adjacency(graph, weight_type=weight_type)
+        if os.path.exists(path):
+            try:
+                alt = cls.load(path)
+                if alt.fingerprint == csr.fingerprint():
+                    print(f"[INFO] Cargando tablas ALT en caché: {path}")
+                    return alt
+                print("[WARN] Las tablas ALT en caché no corresponden al grafo actual. Se reconstruirán.")
+            except (OSError, ValueError, KeyError):
+                print(f"[WARN] No se pudo leer el caché ALT: {path}. Se reconstruirá.")
+        alt = cls.build(csr, weight_type=weight_type, num_landmarks=num_landmarks, G=G)
+        alt.save(path)
+        return alt
+
+    # ——— Consulta ———
+    def query(self, source: int, target: int, stats: Optional[dict] = None) -> Tuple[list[int], float]:
+        """A* con cota ALT entre IDs OSM."""
+        s = self._index[source]
+        t = self._index[target]
+        inf = math.inf
+        fwd_t, bwd_t = self._fwd_t, self._bwd_t
+        ft = fwd_t[t].tolist()  # d(L, t)
+        bt = bwd_t[t].tolist()  # d(t, L)
+
+        def h(v: int) -> float:
+            best = 0.0
+            for lt, lv, vl, tl in zip(ft, fwd_t[v].tolist(), bwd_t[v].tolist(), bt):
+                # nan (inf - inf) nunca supera a best; inf indica que v no alcanza t
+                x = lt - lv
+                if x > best:
+                    best = x
+                y = vl - tl
+                if y > best:
+                    best = y
+            return best
+
+        cost = {s: 0.0}
+        previous = {}
+        visited = set()
+        queue = [(h(s), 0.0, s)]
+        adj = self._adj
+
+        while queue:
+            _f, current_cost, current = heapq.heappop(queue)
+            if current in visited:
+                continue
+            visited.add(current)
+            if current == t:
+                break
+            for neighbor, weight in adj[current]:
+                new_cost = current_cost + weight
+                if new_cost < cost.get(neighbor, inf):
+                    hv = h(neighbor)
+                    if hv == inf:
+                        continue  # el vecino no puede llegar al destino
+                    cost[neighbor] = new_cost
+                    previous[neighbor] = current
+                    heapq.heappush(queue, (new_cost + hv, new_cost, neighbor))
+
+        self.last_settled = len(visited)
+        if stats is not None:
+            stats["settled"] = len(visited)
+
+        path = []
+        node = t
+        while node in previous:
+            path.append(node)
+            node = previous[node]
+        ids = self._ids
+        path = [source] + [ids[i] for i in reversed(path)]
+        return path, cost.get(t, inf)
+
+    def __call__(self, graph, source, target, weight_type="distance", stats=None):
+        """
+        Firma compatible con dijkstra (`dijkstra_fn`).
+
+        Returns:
+            tuple: (path como lista de IDs de nodos, total_cost)
+        """
+        if weight_type != self.weight_type:
+            print(f"[WARN] Tablas ALT construidas para '{self.weight_type}', consulta pide '{weight_type}'.")
+        path, total_cost = self.query(source, target, stats=stats)
+        print(f"[INFO] Shortest path computed based on {weight_type} (ALT, settled={self.last_settled}).")
+        return path, total_cost
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import heapq
+import math
+from typing import Dict, Optional, Tuple
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Distancia de gran círculo en metros entre dos puntos (grados)."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    h = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(h)))
+
+
+def node_coordinates(G) -> Dict[int, Tuple[float, float]]:
+    """Extrae {nodo: (lat, lon)} desde los atributos y/x de un grafo OSMnx."""
+    return {n: (float(d["y"]), float(d["x"])) for n, d in G.nodes(data=True)}
+
+
+class AStarSearch:
+    """
+    A* con heurística de gran círculo sobre las coordenadas x/y de G.
+
+    - distance: h(v) = distancia haversine(v, destino) en metros.
+    - duration: h(v) = distancia haversine / velocidad máxima, de modo que
+      nunca sobreestima el tiempo restante (heurística admisible).
+
+    Si no se pasa max_speed_kph, la velocidad máxima se deriva del propio grafo
+    (máximo de distancia_recta / peso sobre todas las aristas), lo que garantiza
+    admisibilidad aunque los pesos vengan de Google o de estimaciones.
+
+    La instancia es invocable con la firma de dijkstra, así que se puede pasar
+    como `dijkstra_fn` a compute_route_async.
+    """
+
+    def __init__(self, G, max_speed_kph: Optional[float] = None):
+        self.coords = node_coordinates(G)
+        self.max_speed_kph = max_speed_kph
+        self._scale_graph = None
+        self._scale_weight_type = None
+        self._scale = 1.0
+
+    def _straight_m(self, u: int, v: int) -> float:
+        lat_u, lon_u = self.coords[u]
+        lat_v, lon_v = self.coords[v]
+        return haversine_m(lat_u, lon_u, lat_v, lon_v)
+
+    def heuristic_scale(self, graph, weight_type: str = "distance") -> float:
+        """
+        Factor que convierte metros en línea recta a unidades del peso (cota inferior).
+        Se calcula una vez por grafo y modo de peso.
+        """
+        if graph is self._scale_graph and weight_type == self._scale_weight_type:
+            return self._scale
+
+        if weight_type == "duration" and self.max_speed_kph:
+            scale = 3.6 / float(self.max_speed_kph)  # segundos por metro a velocidad máxima
+        else:
+            # Menor relación peso / distancia recta: cota válida para cualquier camino
+            scale = math.inf
+            for u, nbrs in graph.items():
+                if u not in self.coords:
+                    continue
+                for v, weight in nbrs:
+                    if v not in self.coords:
+                        continue
+                    d = self._straight_m(u, v)
+                    if d > 0:
+                        scale = min(scale, weight / d)
+            if not math.isfinite(scale):
+                scale = 0.0  # sin coordenadas utilizables: A* degenera en Dijkstra
+            if weight_type == "distance":
+                scale = min(scale, 1.0)
+
+        self._scale_graph = graph
+        self._scale_weight_type = weight_type
+        self._scale = scale
+        return scale
+
+    def __call__(self, graph, source, target, weight_type="distance", stats=None):
+        """
+        Args:
+            graph (dict | CSRGraph): lista de adyacencia {nodo: [(vecino, peso), ...]}
+            source (int): ID del nodo de inicio
+            target (int): ID del nodo de destino
+            weight_type (str): "distance" o "duration"
+            stats (dict, opcional): se llena con {"settled": nodos asentados}
+
+        Returns:
+            tuple: (path como lista de IDs de nodos, total_cost)
+        """
+        scale = self.heuristic_scale(graph, weight_type)
+        lat_t, lon_t = self.coords.get(target, (None, None))
+
+        h_cache: Dict[int, float] = {}
+
+        def h(node: int) -> float:
+            val = h_cache.get(node)
+            if val is None:
+                if lat_t is None or node not in self.coords:
+                    val = 0.0
+                else:
+                    lat, lon = self.coords[node]
+                    val = scale * haversine_m(lat, lon, lat_t, lon_t)
+                h_cache[node] = val
+            return val
+
+        cost = {source: 0.0}
+        previous = {}
+        visited = set()
+        queue = [(h(source), 0.0, source)]
+
+        while queue:
+            _f, current_cost, current_node = heapq.heappop(queue)
+            if current_node in visited:
+                continue
+            visited.add(current_node)
+
+            # Parada temprana: con heurística consistente el costo ya es óptimo
+            if current_node == target:
+                break
+
+            for neighbor, weight in graph.get(current_node, []):
+                new_cost = current_cost + weight
+                if new_cost < cost.get(neighbor, float("inf")):
+                    cost[neighbor] = new_cost
+                    previous[neighbor] = current_node
+                    heapq.heappush(queue, (new_cost + h(neighbor), new_cost, neighbor))
+
+        if stats is not None:
+            stats["settled"] = len(visited)
+
+        path = []
+        node = target
+        while node in previous:
+            path.append(node)
+            node = previous[node]
+        path.append(source)
+        path.reverse()
+
+        print(f"[INFO] Shortest path computed based on {weight_type} (A*).")
+        return path, cost.get(target, float("inf"))
@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import heapq
+from collections import defaultdict
+from typing import Dict, Tuple
+
+
+def reverse_adjacency(graph) -> Dict[int, list[Tuple[int, float]]]:
+    """
+    Construye la lista de adyacencia inversa {v: [(u, peso), ...]}
+    a partir de {u: [(v, peso), ...]} (dict o CSRGraph).
+    """
+    reverse: Dict[int, list[Tuple[int, float]]] = defaultdict(list)
+    for u, nbrs in graph.items():
+        for v, weight in nbrs:
+            reverse[v].append((u, weight))
+    return reverse
+
+
+class BidirectionalDijkstra:
+    """
+    Dijkstra bidireccional: búsqueda hacia adelante desde el origen y hacia atrás
+    desde el destino (sobre la adyacencia inversa), deteniéndose cuando
+    min_adelante + min_atrás >= mejor costo encontrado.
+
+    La adyacencia inversa se construye una sola vez por grafo y se reutiliza.
+    La instancia es invocable con la firma de dijkstra (`dijkstra_fn`).
+    """
+
+    def __init__(self, graph=None):
+        self._graph = None
+        self._reverse = None
+        if graph is not None:
+            self.prepare(graph)
+
+    def prepare(self, graph) -> None:
+        """Construye (o reconstruye) la adyacencia inversa para `graph`."""
+        self._graph = graph
+        self._reverse = reverse_adjacency(graph)
+
+    def __call__(self, graph, source, target, weight_type="distance", stats=None):
+        """
+        Args:
+            graph (dict | CSRGraph): lista de adyacencia {nodo: [(vecino, peso), ...]}
+            source (int): ID del nodo de inicio
+            target (int): ID del nodo de destino
+            weight_type (str): "distance" o "duration" (solo para claridad en los logs)
+            stats (dict, opcional): se llena con {"settled": nodos asentados (ambas direcciones)}
+
+        Returns:
+            tuple: (path como lista de IDs de nodos, total_cost)
+        """
+        if graph is not self._graph:
+            self.prepare(graph)
+        reverse = self._reverse
+
+        if source == target:
+            if stats is not None:
+                stats["settled"] = 0
+            print(f"[INFO] Shortest path computed based on {weight_type} (bidirectional).")
+            return [source], 0.0
+
+        inf = float("inf")
+        cost_f, cost_b = {source: 0.0}, {target: 0.0}
+        prev_f, prev_b = {}, {}
+        done_f, done_b = set(), set()
+        queue_f, queue_b = [(0.0, source)], [(0.0, target)]
+        best, meeting = inf, None
+
+        while queue_f and queue_b:
+            # Criterio de parada clásico
+            if queue_f[0][0] + queue_b[0][0] >= best:
+                break
+
+            # Expande el lado con la cola más pequeña
+            if len(queue_f) <= len(queue_b):
+                queue, cost, prev, done, other_cost, adj = queue_f, cost_f, prev_f, done_f, cost_b, graph
+            else:
+                queue, cost, prev, done, other_cost, adj = queue_b, cost_b, prev_b, done_b, cost_f, reverse
+
+            current_cost, current = heapq.heappop(queue)
+            if current in done:
+                continue
+            done.add(current)
+
+            for neighbor, weight in adj.get(current, []):
+                new_cost = current_cost + weight
+                if new_cost < cost.get(neighbor, inf):
+                    cost[neighbor] = new_cost
+                    prev[neighbor] = current
+                    heapq.heappush(queue, (new_cost, neighbor))
+                # ¿Se conectan ambas búsquedas por esta arista?
+                if neighbor in other_cost:
+                    total = cost.get(neighbor, inf) + other_cost[neighbor]
+                    if total < best:
+                        best, meeting = total, neighbor
+
+        if stats is not None:
+            stats["settled"] = len(done_f) + len(done_b)
+
+        if meeting is None:
+            print(f"[INFO] Shortest path computed based on {weight_type} (bidirectional).")
+            return [source], inf
+
+        # Reconstruir: origen -> meeting (adelante) + meeting -> destino (atrás)
+        path = []
+        node = meeting
+        while node in prev_f:
+            path.append(node)
+            node = prev_f[node]
+        path.append(source)
+        path.reverse()
+        node = meeting
+        while node in prev_b:
+            node = prev_b[node]
+            path.append(node)
+
+        print(f"[INFO] Shortest path computed based on {weight_type} (bidirectional).")
+        return path, best
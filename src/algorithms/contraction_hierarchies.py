@@ -0,0 +1,439 @@
+from __future__ import annotations
+
+# Contraction Hierarchies (CH): preprocesamiento una vez por grafo y consultas
+# bidireccionales "hacia arriba" con desempaquetado de atajos.
+# Comentarios en español, variables en inglés.
+import heapq
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from src.graph.csr import CSRGraph
+from src.graph.downloader import graph_cache_path
+
+CH_FORMAT_VERSION = 1
+
+
+def ch_cache_path(place: str, network_type: str = "drive", weight_type: str = "distance") -> str:
+    """Ruta del archivo de jerarquía junto al .graphml de download_city_graph."""
+    return graph_cache_path(place, network_type, suffix=f".{weight_type}.ch.npz")
+
+
+def _as_csr(graph, weight_type: str) -> CSRGraph:
+    if isinstance(graph, CSRGraph):
+        return graph
+    return CSRGraph.from_adjacency(graph, weight_type=weight_type)
+
+
+def _pack(n: int, adj: list[list[Tuple[int, float, int]]]):
+    """Lista de listas [(v, w, middle)] -> arreglos CSR (indptr, indices, weights, middle)."""
+    counts = np.fromiter((len(a) for a in adj), dtype=np.int64, count=n)
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    flat = [e for a in adj for e in a]
+    indices = np.fromiter((e[0] for e in flat), dtype=np.int32, count=len(flat))
+    weights = np.fromiter((e[1] for e in flat), dtype=np.float64, count=len(flat))
+    middle = np.fromiter((e[2] for e in flat), dtype=np.int32, count=len(flat))
+    return indptr, indices, weights, middle
+
+
+class ContractionHierarchy:
+    """
+    Jerarquía de contracción sobre la salida de build_simple_graph (dict o CSRGraph).
+
+    - build(graph): contrae nodos por orden de importancia (diferencia de aristas,
+      vecinos ya contraídos y profundidad) agregando atajos solo cuando una búsqueda de testigos
+      local no encuentra un camino alternativo igual o mejor.
+    - save(path) / load(path): persiste la jerarquía en .npz (arreglos CSR).
+    - La instancia es invocable con la firma de dijkstra, así que se pasa como
+      `dijkstra_fn` a compute_route_async; el argumento `graph` se ignora porque
+      la jerarquía ya codifica el grafo con el que se construyó.
+    """
+
+    def __init__(
+            self,
+            node_ids: np.ndarray,
+            rank: np.ndarray,
+            up: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+            down: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+            weight_type: str = "distance",
+            fingerprint: str = "",
+    ):
+        self.node_ids = node_ids
+        self.rank = rank
+        self.up = up        # aristas u->v con rank[v] > rank[u] (búsqueda desde el origen)
+        self.down = down    # aristas u->v con rank[u] > rank[v], guardadas en v como (u, w, mid)
+        self.weight_type = weight_type
+        self.fingerprint = fingerprint
+        self._prepare_query_lists()
+
+    def _prepare_query_lists(self) -> None:
+        """Convierte los CSR a listas Python por nodo (acceso rápido en consultas)."""
+        def to_lists(arrays):
+            indptr, indices, weights, middle = arrays
+            ind, wts, mid = indices.tolist(), weights.tolist(), middle.tolist()
+            ptr = indptr.tolist()
+            return [
+                list(zip(ind[ptr[i]:ptr[i + 1]], wts[ptr[i]:ptr[i + 1]], mid[ptr[i]:ptr[i + 1]]))
+                for i in range(len(ptr) - 1)
+            ]
+        self._up = to_lists(self.up)
+        self._down = to_lists(self.down)
+        self._ids = self.node_ids.tolist()
+        self._index = {node: i for i, node in enumerate(self._ids)}
+
+    # ——— Preprocesamiento ———
+    @classmethod
+    def build(
+            cls,
+            graph,
+            weight_type: str = "distance",
+            witness_settle_limit: int = 500,
+            verbose: bool = True,
+            order: Optional[np.ndarray] = None,
+    ) -> "ContractionHierarchy":
+        """
+        Contrae el grafo completo.
+
+        Args:
+            graph: salida de build_simple_graph (dict o CSRGraph).
+            weight_type: "distance" o "duration" (se guarda como metadato).
+            witness_settle_limit: nodos máximos asentados por búsqueda de testigos.
+                Límites bajos preprocesan más rápido a costa de más atajos.
+            verbose: imprime progreso.
+            order: rango fijo por nodo (p. ej. `rank` de una jerarquía previa). Si se
+                da, se contrae en ese orden sin calcular prioridades (ver recustomize).
+        """
+        csr = _as_csr(graph, weight_type)
+        n = csr.num_nodes
+        if order is not None and len(order) != n:
+            raise ValueError("order debe tener un rango por nodo.")
+        t0 = time.perf_counter()
+
+        # Grafo dinámico de trabajo: out_adj[u][v] = (w, middle), in_adj[v][u] = (w, middle)
+        out_adj: list[Dict[int, Tuple[float, int]]] = [dict() for _ in range(n)]
+        in_adj: list[Dict[int, Tuple[float, int]]] = [dict() for _ in range(n)]
+        indptr, indices, weights = csr.indptr.tolist(), csr.indices.tolist(), csr.weights.tolist()
+        for u in range(n):
+            for k in range(indptr[u], indptr[u + 1]):
+                v, w = indices[k], weights[k]
+                if u == v:
+                    continue
+                if w < out_adj[u].get(v, (float("inf"), -1))[0]:
+                    out_adj[u][v] = (w, -1)
+                    in_adj[v][u] = (w, -1)
+
+        def witness_costs(source: int, skip: int, max_cost: float, targets: set) -> Dict[int, float]:
+            """Dijkstra local desde `source` ignorando `skip`, acotado por costo y nodos asentados."""
+            dist = {source: 0.0}
+            queue = [(0.0, source)]
+            settled = 0
+            remaining = set(targets)
+            while queue and remaining and settled < witness_settle_limit:
+                d, x = heapq.heappop(queue)
+                if d > dist.get(x, float("inf")):
+                    continue
+                if d > max_cost:
+                    break
+                settled += 1
+                remaining.discard(x)
+                for y, (w, _m) in out_adj[x].items():
+                    if y == skip:
+                        continue
+                    nd = d + w
+                    if nd < dist.get(y, float("inf")):
+                        dist[y] = nd
+                        heapq.heappush(queue, (nd, y))
+            return dist
+
+        def shortcuts_for(v: int) -> list[Tuple[int, int, float]]:
+            """Atajos (u, x, w) necesarios si se contrae v."""
+            result = []
+            outs = out_adj[v]
+            if not outs:
+                return result
+            max_out = max(w for w, _m in outs.values())
+            for u, (w_uv, _m) in in_adj[v].items():
+                targets = {x for x in outs if x != u}
+                if not targets:
+                    continue
+                dist = witness_costs(u, v, w_uv + max_out, targets)
+                for x in targets:
+                    via_v = w_uv + outs[x][0]
+                    if dist.get(x, float("inf")) > via_v:
+                        result.append((u, x, via_v))
+            return result
+
+        contracted_neighbors = [0] * n
+        level = [0] * n  # profundidad en la jerarquía (favorece contracción uniforme)
+
+        def priority(v: int) -> int:
+            added = len(shortcuts_for(v))
+            removed = len(in_adj[v]) + len(out_adj[v])
+            return 2 * (added - removed) + contracted_neighbors[v] + level[v]
+
+        rank = np.full(n, -1, dtype=np.int64)
+
+        def contraction_order():
+            if order is not None:
+                # Orden fijo: solo cambian los pesos, no la importancia de los nodos
+                yield from np.argsort(order, kind="stable").tolist()
+                return
+            queue = [(priority(v), v) for v in range(n)]
+            heapq.heapify(queue)
+            while queue:
+                _prio, v = heapq.heappop(queue)
+                if rank[v] >= 0:
+                    continue
+                # Actualización perezosa de la prioridad
+                new_prio = priority(v)
+                if queue and new_prio > queue[0][0]:
+                    heapq.heappush(queue, (new_prio, v))
+                    continue
+                yield v
+
+        up_adj: list[list[Tuple[int, float, int]]] = [[] for _ in range(n)]
+        down_adj: list[list[Tuple[int, float, int]]] = [[] for _ in range(n)]
+        contracted = 0
+        total_shortcuts = 0
+
+        for v in contraction_order():
+            rank[v] = contracted
+            contracted += 1
+
+            # Las aristas restantes de v conectan con nodos de mayor rango
+            for x, (w, m) in out_adj[v].items():
+                up_adj[v].append((x, w, m))
+            for u, (w, m) in in_adj[v].items():
+                down_adj[v].append((u, w, m))
+
+            for u, x, w in shortcuts_for(v):
+                if w < out_adj[u].get(x, (float("inf"), -1))[0]:
+                    out_adj[u][x] = (w, v)
+                    in_adj[x][u] = (w, v)
+                    total_shortcuts += 1
+
+            # Retirar v del grafo de trabajo
+            for x in out_adj[v]:
+                in_adj[x].pop(v, None)
+                contracted_neighbors[x] += 1
+                level[x] = max(level[x], level[v] + 1)
+            for u in in_adj[v]:
+                out_adj[u].pop(v, None)
+                contracted_neighbors[u] += 1
+                level[u] = max(level[u], level[v] + 1)
+            out_adj[v] = {}
+            in_adj[v] = {}
+
+            if verbose and contracted % 20000 == 0:
+                print(f"[INFO] CH: {contracted:,}/{n:,} nodos contraídos ({time.perf_counter() - t0:.1f}s)")
+
+        ch = cls(
+            node_ids=csr.node_ids,
+            rank=rank,
+            up=_pack(n, up_adj),
+            down=_pack(n, down_adj),
+            weight_type=weight_type,
+            fingerprint=csr.fingerprint(),
+        )
+        if verbose:
+            print(
+                f"[INFO] Contraction Hierarchy lista: {n:,} nodos, {total_shortcuts:,} atajos, "
+                f"modo={weight_type}, {time.perf_counter() - t0:.1f}s"
+            )
+        return ch
+
+    def recustomize(self, graph, witness_settle_limit: int = 500, verbose: bool = False) -> "ContractionHierarchy":
+        """
+        Nueva jerarquía para `graph` con la misma topología y pesos nuevos (tráfico).
+
+        Conserva el orden de contracción (`rank`) y solo rehace las búsquedas de
+        testigos y los atajos, lo que evita recalcular prioridades (la parte más cara
+        de build). El resultado es exacto para los pesos nuevos; la calidad del orden
+        puede degradarse si los pesos cambian mucho, y entonces conviene un build completo.
+        """
+        csr = _as_csr(graph, self.weight_type)
+        if len(csr.node_ids) != len(self.node_ids) or not np.array_equal(csr.node_ids, self.node_ids):
+            raise ValueError("recustomize requiere el mismo conjunto de nodos de la jerarquía original.")
+        return type(self).build(
+            csr, weight_type=self.weight_type, witness_settle_limit=witness_settle_limit,
+            verbose=verbose, order=self.rank,
+        )
+
+    # ——— Persistencia ———
+    def save(self, path: str) -> str:
+        """Guarda la jerarquía en un .npz comprimido."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez_compressed(
+            path,
+            version=np.array(CH_FORMAT_VERSION),
+            weight_type=np.array(self.weight_type),
+            fingerprint=np.array(self.fingerprint),
+            node_ids=self.node_ids,
+            rank=self.rank,
+            up_indptr=self.up[0], up_indices=self.up[1], up_weights=self.up[2], up_middle=self.up[3],
+            down_indptr=self.down[0], down_indices=self.down[1], down_weights=self.down[2], down_middle=self.down[3],
+        )
+        print(f"[INFO] Jerarquía guardada en: {path}")
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "ContractionHierarchy":
+        """Carga una jerarquía guardada con save()."""
+        with np.load(path) as data:
+            if int(data["version"]) != CH_FORMAT_VERSION:
+                raise ValueError(f"Versión de jerarquía incompatible en {path}")
+            return cls(
+                node_ids=data["node_ids"],
+                rank=data["rank"],
+                up=(data["up_indptr"], data["up_indices"], data["up_weights"], data["up_middle"]),
+                down=(data["down_indptr"], data["down_indices"], data["down_weights"], data["down_middle"]),
+                weight_type=str(data["weight_type"]),
+                fingerprint=str(data["fingerprint"]),
+            )
+
+    @classmethod
+    def load_or_build(
+            cls,
+            graph,
+            place: str,
+            network_type: str = "drive",
+            weight_type: str = "distance",
+            **build_kwargs,
+    ) -> "ContractionHierarchy":
+        """
+        Reutiliza la jerarquía en caché si corresponde exactamente a `graph`
+        (mismo fingerprint); si no, la construye y la guarda junto al .graphml.
+        """
+        path = ch_cache_path(place, network_type, weight_type)
+        csr = _as_csr(graph, weight_type)
+        if os.path.exists(path):
+            try:
+                ch = cls.load(path)
+                if ch.fingerprint == csr.fingerprint():
+                    print(f"[INFO] Cargando jerarquía en caché: {path}")
+                    return ch
+                print("[WARN] La jerarquía en caché no corresponde al grafo actual. Se reconstruirá.")
+            except (OSError, ValueError, KeyError):
+                print(f"[WARN] No se pudo leer la jerarquía en caché: {path}. Se reconstruirá.")
+        ch = cls.build(csr, weight_type=weight_type, **build_kwargs)
+        ch.save(path)
+        return ch
+
+    # ——— Consulta ———
+    def _find_edge(self, a: int, b: int) -> Tuple[float, int]:
+        """(peso, middle) de la arista a->b en la jerarquía."""
+        if self.rank[a] < self.rank[b]:
+            candidates = [(w, m) for x, w, m in self._up[a] if x == b]
+        else:
+            candidates = [(w, m) for x, w, m in self._down[b] if x == a]
+        return min(candidates)
+
+    def _unpack(self, a: int, b: int, out: list[int]) -> None:
+        """Expande la arista a->b (posible atajo) agregando a `out` los nodos tras `a`."""
+        stack = [(a, b)]
+        while stack:
+            x, y = stack.pop()
+            _w, m = self._find_edge(x, y)
+            if m < 0:
+                out.append(y)
+            else:
+                # Orden LIFO: primero (x, m), luego (m, y)
+                stack.append((m, y))
+                stack.append((x, m))
+
+    def query(self, source: int, target: int, stats: Optional[dict] = None) -> Tuple[list[int], float]:
+        """Camino más corto entre IDs OSM usando la jerarquía."""
+        s = self._index[source]
+        t = self._index[target]
+        if s == t:
+            if stats is not None:
+                stats["settled"] = 0
+            return [source], 0.0
+
+        inf = float("inf")
+        dist_f, dist_b = {s: 0.0}, {t: 0.0}
+        prev_f, prev_b = {}, {}
+        queue_f, queue_b = [(0.0, s)], [(0.0, t)]
+        best, meeting = inf, -1
+        settled = 0
+        up, down = self._up, self._down
+
+        while queue_f or queue_b:
+            # Cada dirección se detiene cuando su mínimo supera al mejor costo
+            if queue_f and queue_f[0][0] >= best:
+                queue_f = []
+            if queue_b and queue_b[0][0] >= best:
+                queue_b = []
+
+            if queue_f:
+                d, x = heapq.heappop(queue_f)
+                if d <= dist_f[x]:
+                    settled += 1
+                    if x in dist_b and d + dist_b[x] < best:
+                        best, meeting = d + dist_b[x], x
+                    for y, w, _m in up[x]:
+                        nd = d + w
+                        if nd < dist_f.get(y, inf):
+                            dist_f[y] = nd
+                            prev_f[y] = x
+                            heapq.heappush(queue_f, (nd, y))
+
+            if queue_b:
+                d, x = heapq.heappop(queue_b)
+                if d <= dist_b[x]:
+                    settled += 1
+                    if x in dist_f and d + dist_f[x] < best:
+                        best, meeting = d + dist_f[x], x
+                    for y, w, _m in down[x]:
+                        nd = d + w
+                        if nd < dist_b.get(y, inf):
+                            dist_b[y] = nd
+                            prev_b[y] = x
+                            heapq.heappush(queue_b, (nd, y))
+
+        if stats is not None:
+            stats["settled"] = settled
+
+        if meeting < 0:
+            return [source], inf
+
+        # Cadena en la jerarquía: s -> ... -> meeting -> ... -> t
+        chain = [meeting]
+        x = meeting
+        while x in prev_f:
+            x = prev_f[x]
+            chain.append(x)
+        chain.reverse()
+        x = meeting
+        while x in prev_b:
+            x = prev_b[x]
+            chain.append(x)
+
+        # Desempaquetar atajos
+        nodes = [chain[0]]
+        for a, b in zip(chain, chain[1:]):
+            self._unpack(a, b, nodes)
+        ids = self._ids
+        return [ids[i] for i in nodes], best
+
+    def __call__(self, graph, source, target, weight_type="distance", stats=None):
+        """
+        Firma compatible con dijkstra (`dijkstra_fn`).
+
+        Returns:
+            tuple: (path como lista de IDs de nodos, total_cost)
+        """
+        if weight_type != self.weight_type:
+            print(f"[WARN] Jerarquía construida para '{self.weight_type}', consulta pide '{weight_type}'.")
+        path, total_cost = self.query(source, target, stats=stats)
+        print(f"[INFO] Shortest path computed based on {weight_type} (CH).")
+        return path, total_cost
+
+    def __repr__(self) -> str:
+        return (
+            f"ContractionHierarchy(nodes={len(self.node_ids):,}, up_edges={len(self.up[1]):,}, "
+            f"down_edges={len(self.down[1]):,}, weight_type={self.weight_type})"
+        )
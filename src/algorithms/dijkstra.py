@@ -1,19 +1,37 @@
 import heapq
 
-def dijkstra(graph, source, target, weight_type="distance"):
+from src.graph.csr import CSRGraph
+from src.graph.time_profiles import TimeDependentGraph
+
+def dijkstra(graph, source, target, weight_type="distance", stats=None, departure_time=None):
     """
     Algoritmo de Dijkstra para encontrar el camino más corto según distancia o tiempo.
 
     Args:
-        graph (dict): lista de adyacencia con la forma {nodo: [(vecino, peso), ...]}
+        graph (dict | CSRGraph): lista de adyacencia con la forma {nodo: [(vecino, peso), ...]}
+            o su versión compacta CSRGraph (se recorre por índices densos).
         source (int): ID del nodo de inicio
         target (int): ID del nodo de destino
         weight_type (str): "distance" o "time" (solo para claridad en los logs)
+        stats (dict, opcional): si se pasa, se llena con {"settled": nodos asentados}
+        departure_time (opcional): hora de salida; solo aplica a TimeDependentGraph
+            (perfiles por franja), con el que se usa Dijkstra dependiente del tiempo.
 
     Returns:
         tuple: (path como lista de IDs de nodos, total_cost)
     """
 
+    if isinstance(graph, TimeDependentGraph):
+        from src.algorithms.time_dependent import time_dependent_dijkstra
+        return time_dependent_dijkstra(graph, source, target, weight_type, stats, departure_time)
+    if departure_time is not None:
+        raise ValueError("departure_time requiere un TimeDependentGraph (src/graph/time_profiles.py).")
+
+    if isinstance(graph, CSRGraph):
+        path, total_cost = _dijkstra_csr(graph, source, target, stats)
+        print(f"[INFO] Shortest path computed based on {weight_type}.")
+        return path, total_cost
+
     # Se inicializan todas las distancias en infinito excepto el origen
     cost = {node: float("inf") for node in graph}
     cost[source] = 0
@@ -42,6 +60,9 @@ def dijkstra(graph, source, target, weight_type="distance"):
                 previous[neighbor] = current_node
                 heapq.heappush(queue, (new_cost, neighbor))
 
+    if stats is not None:
+        stats["settled"] = len(visited)
+
     # Reconstruir el camino mas corto
     path = []
     node = target
@@ -54,3 +75,111 @@ def dijkstra(graph, source, target, weight_type="distance"):
     print(f"[INFO] Shortest path computed based on {weight_type}.")
     return path, cost[target]
 
+
+def _dijkstra_csr(graph: CSRGraph, source, target, stats=None):
+    """
+    Dijkstra sobre CSRGraph: trabaja con índices densos y arreglos NumPy,
+    y solo traduce a IDs OSM al reconstruir el camino.
+    """
+    s = graph.index_of(source)
+    t = graph.index_of(target)
+    indptr, indices, weights = graph.indptr, graph.indices, graph.weights
+
+    # Costos dispersos: solo nodos alcanzados (evita inicializar todo el grafo)
+    cost = {s: 0.0}
+    previous = {}
+    visited = set()
+    queue = [(0.0, s)]
+
+    while queue:
+        current_cost, current = heapq.heappop(queue)
+        if current in visited:
+            continue
+        visited.add(current)
+        if current == t:
+            break
+
+        a, b = indptr[current], indptr[current + 1]
+        for neighbor, weight in zip(indices[a:b].tolist(), weights[a:b].tolist()):
+            new_cost = current_cost + weight
+            if new_cost < cost.get(neighbor, float("inf")):
+                cost[neighbor] = new_cost
+                previous[neighbor] = current
+                heapq.heappush(queue, (new_cost, neighbor))
+
+    if stats is not None:
+        stats["settled"] = len(visited)
+
+    path = []
+    node = t
+    while node in previous:
+        path.append(node)
+        node = previous[node]
+    path = [source] + [graph.node_at(i) for i in reversed(path)]
+    return path, cost.get(t, float("inf"))
+
+
+def dijkstra_one_to_many(graph, source, targets, stats=None):
+    """
+    Dijkstra uno-a-muchos: una sola búsqueda desde `source` que se detiene
+    cuando todos los `targets` alcanzables quedaron asentados.
+
+    Args:
+        graph (dict | CSRGraph): lista de adyacencia {nodo: [(vecino, peso), ...]}
+        source (int): ID del nodo de inicio
+        targets (iterable): IDs de nodos destino
+        stats (dict, opcional): se llena con {"settled": nodos asentados}
+
+    Returns:
+        tuple: (cost, previous) donde cost = {target: costo o inf} y
+        previous = {nodo: nodo_anterior} del árbol de caminos mínimos explorado.
+    """
+    is_csr = isinstance(graph, CSRGraph)
+    if is_csr:
+        s = graph.index_of(source)
+        pending = set()
+        lookup = {}
+        for t in targets:
+            if t in graph:
+                lookup[t] = graph.index_of(t)
+                pending.add(lookup[t])
+        indptr, indices, weights = graph.indptr, graph.indices, graph.weights
+    else:
+        s = source
+        pending = set(targets)
+
+    cost = {s: 0.0}
+    previous = {}
+    visited = set()
+    queue = [(0.0, s)]
+
+    while queue and pending:
+        current_cost, current = heapq.heappop(queue)
+        if current in visited:
+            continue
+        visited.add(current)
+        pending.discard(current)
+
+        if is_csr:
+            a, b = indptr[current], indptr[current + 1]
+            nbrs = zip(indices[a:b].tolist(), weights[a:b].tolist())
+        else:
+            nbrs = graph.get(current, [])
+        for neighbor, weight in nbrs:
+            new_cost = current_cost + weight
+            if new_cost < cost.get(neighbor, float("inf")):
+                cost[neighbor] = new_cost
+                previous[neighbor] = current
+                heapq.heappush(queue, (new_cost, neighbor))
+
+    if stats is not None:
+        stats["settled"] = len(visited)
+
+    inf = float("inf")
+    if is_csr:
+        # Traducir índices densos a IDs OSM
+        node_at = graph.node_at
+        target_cost = {t: cost.get(lookup[t], inf) if t in lookup else inf for t in targets}
+        previous = {node_at(v): node_at(u) for v, u in previous.items()}
+        return target_cost, previous
+    return {t: cost.get(t, inf) for t in targets}, previous
@@ -1,6 +1,18 @@
 import requests
 import unicodedata
 
+# Estados de Geocoding que sí describen la dirección; el resto (cuota, clave, error del
+# servidor) es transitorio o de configuración y se reporta con GeocodingError.
+GEOCODE_DEFINITIVE_STATUSES = ("OK", "ZERO_RESULTS")
+
+
+class GeocodingError(RuntimeError):
+    """Google no pudo geocodificar por cuota, clave o error propio (no por la dirección)."""
+
+    def __init__(self, status: str, address: str):
+        super().__init__(f"Google Geocoding status={status} para '{address}'")
+        self.status = status
+
 def google_key_sanity_check(google_api_key: str) -> bool:
     # ping muy barato: geocode “Bogotá, Colombia”
     url = "https://maps.googleapis.com/maps/api/geocode/json"
@@ -15,7 +27,9 @@ def google_key_sanity_check(google_api_key: str) -> bool:
 def compute_route_duration_seconds(google_maps_api_url, google_api_key, origin_lat, origin_lng, dest_lat, dest_lng,
                                    routing_preference="TRAFFIC_AWARE",
                                    departure_time=None,
-                                   traffic_model=None):
+                                   traffic_model=None,
+                                   session=None):
+    # session: requests.Session opcional para reutilizar conexiones (pool HTTP)
 
     headers = {
         "Content-Type": "application/json",
@@ -47,7 +61,7 @@ def compute_route_duration_seconds(google_maps_api_url, google_api_key, origin_l
         if routing_preference != "TRAFFIC_AWARE_OPTIMAL":
             body["routingPreference"] = "TRAFFIC_AWARE_OPTIMAL"
 
-    r = requests.post(google_maps_api_url, headers=headers, json=body, timeout=30)
+    r = (session or requests).post(google_maps_api_url, headers=headers, json=body, timeout=30)
     r.raise_for_status()
     data = r.json()
 
@@ -82,7 +96,9 @@ def get_coordinates_from_address(
         language: str = "es",
 ):
     """
-    Geocodifica con Google. Devuelve (lat, lng) en float o (None, None) si no hay resultados.
+    Geocodifica con Google. Devuelve (lat, lng) en float o (None, None) si no hay resultados
+    (ZERO_RESULTS). Con cualquier otro estado (OVER_QUERY_LIMIT, REQUEST_DENIED, UNKNOWN_ERROR...)
+    lanza GeocodingError, para que ni la caché ni el llamador lo tomen como "dirección inexistente".
     Acepta:
       - city_hint: texto agregado para sesgar la búsqueda (si no está ya en address)
       - bounds: ((sw_lat, sw_lng), (ne_lat, ne_lng)) para sesgo adicional
@@ -110,6 +126,9 @@ def get_coordinates_from_address(
     data = r.json()
 
     status = data.get("status", "UNKNOWN")
+    if status not in GEOCODE_DEFINITIVE_STATUSES:
+        print(f"[WARN] Google Geocoding status={status} addr='{addr}'")
+        raise GeocodingError(status, addr)
     if status != "OK" or not data.get("results"):
         print(f"[WARN] Google Geocoding status={status} results=0 addr='{addr}'")
         return None, None
@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+# Consulta concurrente de duraciones a Google Routes con sesión HTTP compartida,
+# limitador de tasa y backoff sin bloquear.
+# Comentarios en español, variables en inglés.
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Hashable, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.api.google_maps import compute_route_duration_seconds
+
+# (lat_u, lon_u, lat_v, lon_v) con las coordenadas exactas a consultar
+RouteRequest = Tuple[float, float, float, float]
+
+
+class AsyncRateLimiter:
+    """Token bucket para asyncio: como máximo `rate_per_sec` solicitudes por segundo (ráfagas hasta `burst`)."""
+
+    def __init__(self, rate_per_sec: float, burst: Optional[int] = None):
+        self.rate = float(rate_per_sec)
+        self.capacity = float(burst if burst is not None else max(1, int(rate_per_sec)))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+def make_session(pool_size: int = 16) -> requests.Session:
+    """Sesión HTTP con pool de conexiones keep-alive (sin reintentos propios: los manejamos aquí)."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+async def fetch_route_durations_async(
+        google_maps_api_url: str,
+        google_api_key: str,
+        requests_by_key: Dict[Hashable, RouteRequest],
+        concurrency: int = 8,
+        rate_limit_per_sec: float = 10.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.5,
+        session: Optional[requests.Session] = None,
+        stats: Optional[dict] = None,
+        departure_time: Optional[str] = None,
+        traffic_model: Optional[str] = None,
+) -> Dict[Hashable, Optional[float]]:
+    """
+    Resuelve en paralelo las duraciones (segundos) de varias consultas a Google Routes.
+
+    - Concurrencia acotada por semáforo; las llamadas HTTP corren en un pool de hilos
+      propio sobre una sesión compartida (reutiliza conexiones).
+    - Limitador de tasa del lado del cliente (token bucket).
+    - Backoff exponencial con asyncio.sleep: un reintento en espera no ocupa cupo.
+    - departure_time (RFC 3339, futuro) y traffic_model se pasan tal cual a cada consulta.
+
+    Returns:
+        {clave: duración en segundos o None si no se obtuvo tras los reintentos}
+    """
+    own_session = session is None
+    session = session or make_session(concurrency)
+    limiter = AsyncRateLimiter(rate_limit_per_sec)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="routes")
+    loop = asyncio.get_running_loop()
+    counters = {"requests": 0, "retries": 0, "failures": 0}
+
+    def _call(req: RouteRequest) -> Optional[float]:
+        lat_u, lon_u, lat_v, lon_v = req
+        dur_s, _dist_m, _raw = compute_route_duration_seconds(
+            google_maps_api_url=google_maps_api_url,
+            google_api_key=google_api_key,
+            origin_lat=lat_u,
+            origin_lng=lon_u,
+            dest_lat=lat_v,
+            dest_lng=lon_v,
+            routing_preference="TRAFFIC_AWARE_OPTIMAL",
+            departure_time=departure_time,
+            traffic_model=traffic_model,
+            session=session,
+        )
+        if dur_s is not None and dur_s > 0:
+            return float(dur_s)
+        return None
+
+    async def _one(key: Hashable, req: RouteRequest) -> Tuple[Hashable, Optional[float]]:
+        attempt = 0
+        while True:
+            async with semaphore:
+                await limiter.acquire()
+                counters["requests"] += 1
+                try:
+                    return key, await loop.run_in_executor(executor, _call, req)
+                except Exception:
+                    attempt += 1
+            if attempt > max_retries:
+                counters["failures"] += 1
+                return key, None
+            counters["retries"] += 1
+            # Backoff fuera del semáforo: libera el cupo mientras espera
+            await asyncio.sleep(backoff_base * (2 ** (attempt - 1)))
+
+    try:
+        results = await asyncio.gather(*[_one(k, r) for k, r in requests_by_key.items()])
+    finally:
+        executor.shutdown(wait=False)
+        if own_session:
+            session.close()
+
+    if stats is not None:
+        stats.update(counters)
+    return dict(results)
+
+
+def fetch_route_durations(
+        google_maps_api_url: str,
+        google_api_key: str,
+        requests_by_key: Dict[Hashable, RouteRequest],
+        **kwargs,
+) -> Dict[Hashable, Optional[float]]:
+    """
+    Versión síncrona de fetch_route_durations_async (para build_simple_graph).
+    Si el hilo actual ya tiene un event loop corriendo, ejecuta en un hilo aparte.
+    """
+    coro_args = (google_maps_api_url, google_api_key, requests_by_key)
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(fetch_route_durations_async(*coro_args, **kwargs))
+
+    box: dict = {}
+
+    def _runner():
+        try:
+            box["result"] = asyncio.run(fetch_route_durations_async(*coro_args, **kwargs))
+        except BaseException as e:  # se relanza en el hilo llamador
+            box["error"] = e
+
+    t = threading.Thread(target=_runner, daemon=True)
+    t.start()
+    t.join()
+    if "error" in box:
+        raise box["error"]
+    return box["result"]
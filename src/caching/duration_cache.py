@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+# Caché persistente de duraciones de Google Routes por par de coordenadas.
+# Comentarios en español, variables en inglés.
+import os
+from typing import Dict, Iterable, Optional, Tuple
+
+from src.caching.sqlite_store import SQLiteTTLCache
+
+DEFAULT_DURATION_CACHE = os.path.join(os.path.dirname(__file__), "../../data/cache/route_durations.sqlite")
+
+CoordPair = Tuple[float, float, float, float]  # (lat_u, lon_u, lat_v, lon_v)
+
+
+def duration_key(lat_u: float, lon_u: float, lat_v: float, lon_v: float, precision: int = 5) -> str:
+    """Clave estable con coordenadas redondeadas (mismo redondeo que build_simple_graph)."""
+    return (
+        f"{round(lat_u, precision):.{precision}f},{round(lon_u, precision):.{precision}f}->"
+        f"{round(lat_v, precision):.{precision}f},{round(lon_v, precision):.{precision}f}"
+    )
+
+
+class DurationCache:
+    """
+    Duraciones (segundos) de fetch_route_durations persistidas en SQLite,
+    para que reconstruir el grafo en modo "duration" no repita llamadas a Google.
+
+    Por defecto expiran a los 7 días (el tráfico cambia) y se limitan a 500.000
+    entradas con expulsión LRU.
+    """
+
+    def __init__(
+            self,
+            path: str = DEFAULT_DURATION_CACHE,
+            ttl_seconds: Optional[float] = 7 * 24 * 3600,
+            max_entries: Optional[int] = 500_000,
+            precision: int = 5,
+    ):
+        self.precision = precision
+        self.store = SQLiteTTLCache(path, table="durations", ttl_seconds=ttl_seconds, max_entries=max_entries)
+
+    def key(self, lat_u: float, lon_u: float, lat_v: float, lon_v: float) -> str:
+        return duration_key(lat_u, lon_u, lat_v, lon_v, self.precision)
+
+    def get(self, lat_u: float, lon_u: float, lat_v: float, lon_v: float) -> Optional[float]:
+        value = self.store.get(self.key(lat_u, lon_u, lat_v, lon_v))
+        return float(value) if value is not None else None
+
+    def set(self, lat_u: float, lon_u: float, lat_v: float, lon_v: float, seconds: float) -> None:
+        self.store.set(self.key(lat_u, lon_u, lat_v, lon_v), float(seconds))
+
+    def get_many(self, pairs: Iterable[CoordPair]) -> Dict[CoordPair, float]:
+        """{par: segundos} solo para los pares presentes y vigentes."""
+        by_key = {self.key(*p): p for p in pairs}
+        found = self.store.get_many(by_key.keys())
+        return {by_key[k]: float(v) for k, v in found.items()}
+
+    def set_many(self, items: Dict[CoordPair, float]) -> None:
+        self.store.set_many((self.key(*p), float(s)) for p, s in items.items())
+        self.store.flush()
+
+    def stats(self) -> Dict[str, float]:
+        return self.store.stats()
+
+    def close(self) -> None:
+        self.store.close()
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+# Caché de geocodificación en dos niveles: LRU en memoria + SQLite en disco.
+# Comentarios en español, variables en inglés.
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Callable, Dict, Optional, Tuple
+
+from src.api.google_maps import _normalize_address
+from src.caching.sqlite_store import SQLiteTTLCache
+
+DEFAULT_GEOCODE_CACHE = os.path.join(os.path.dirname(__file__), "../../data/cache/geocode.sqlite")
+
+LatLng = Tuple[Optional[float], Optional[float]]
+Bounds = Optional[Tuple[Tuple[float, float], Tuple[float, float]]]
+
+
+def geocode_key(
+        address: str,
+        city_hint: Optional[str] = "Bogotá, Colombia",
+        bounds: Bounds = None,
+        region: str = "co",
+        language: str = "es",
+) -> str:
+    """
+    Clave de caché a partir de _normalize_address + city_hint, región, idioma y bounds.
+    Los bounds se redondean a 3 decimales (~100 m) para que pequeñas variaciones
+    del grafo no invaliden la caché.
+    """
+    addr = re.sub(r"\s+", " ", _normalize_address(address)).strip().casefold()
+    hint = (city_hint or "").strip().casefold()
+    if bounds:
+        (sw_lat, sw_lng), (ne_lat, ne_lng) = bounds
+        b = f"{sw_lat:.3f},{sw_lng:.3f},{ne_lat:.3f},{ne_lng:.3f}"
+    else:
+        b = ""
+    return f"{addr}|{hint}|{region}|{language}|{b}"
+
+
+class GeocodeCache:
+    """
+    Caché de resultados de get_coordinates_from_address.
+
+    - Nivel 1: LRU en memoria (OrderedDict) con vencimiento por entrada.
+    - Nivel 2: SQLite en disco, compartido entre ejecuciones.
+    - Resultados negativos (sin coordenadas, ZERO_RESULTS) se guardan con un TTL propio,
+      más corto, para no repetir direcciones inválidas sin bloquearlas para siempre.
+      Los fallos de cuota o de clave llegan como GeocodingError y no se guardan.
+    """
+
+    def __init__(
+            self,
+            path: str = DEFAULT_GEOCODE_CACHE,
+            ttl_seconds: Optional[float] = 30 * 24 * 3600,
+            negative_ttl_seconds: Optional[float] = 24 * 3600,
+            memory_size: int = 10_000,
+            max_entries: Optional[int] = 200_000,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.memory_size = memory_size
+        self._memory: "OrderedDict[str, Tuple[LatLng, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._positive = SQLiteTTLCache(path, table="geocode", ttl_seconds=ttl_seconds, max_entries=max_entries)
+        self._negative = SQLiteTTLCache(path, table="geocode_negative", ttl_seconds=negative_ttl_seconds,
+                                        max_entries=max_entries)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.stores = 0
+
+    # ——— Nivel en memoria ———
+    def _memory_get(self, key: str) -> Optional[LatLng]:
+        with self._lock:
+            item = self._memory.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if time.time() > expires_at:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return value
+
+    def _memory_set(self, key: str, value: LatLng, ttl: Optional[float]) -> None:
+        expires_at = time.time() + ttl if ttl is not None else float("inf")
+        with self._lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    # ——— API ———
+    def get(self, key: str) -> Tuple[bool, LatLng]:
+        """(encontrado, (lat, lng)). Un negativo cacheado devuelve (True, (None, None))."""
+        value = self._memory_get(key)
+        if value is not None:
+            self.memory_hits += 1
+            if value[0] is None:
+                self.negative_hits += 1
+            return True, value
+
+        stored = self._positive.get(key)
+        if stored is not None:
+            value = (float(stored[0]), float(stored[1]))
+            self._memory_set(key, value, self.ttl_seconds)
+            self.disk_hits += 1
+            return True, value
+
+        if self._negative.get(key) is not None:
+            value = (None, None)
+            self._memory_set(key, value, self.negative_ttl_seconds)
+            self.disk_hits += 1
+            self.negative_hits += 1
+            return True, value
+
+        self.misses += 1
+        return False, (None, None)
+
+    def set(self, key: str, value: LatLng) -> None:
+        lat, lng = value
+        if lat is None or lng is None:
+            self._negative.set(key, 1)
+            self._memory_set(key, (None, None), self.negative_ttl_seconds)
+        else:
+            self._positive.set(key, [float(lat), float(lng)])
+            self._memory_set(key, (float(lat), float(lng)), self.ttl_seconds)
+        self.stores += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._memory.clear()
+        self._positive.clear()
+        self._negative.clear()
+
+    def metrics(self) -> Dict[str, float]:
+        """Métricas acumuladas del proceso (aciertos por nivel, negativos, fallos)."""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_ratio": ((self.memory_hits + self.disk_hits) / lookups) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+    def close(self) -> None:
+        self._positive.close()
+        self._negative.close()
+
+
+def cached_geocoder(geocode_fn: Callable[..., LatLng], cache: GeocodeCache) -> Callable[..., LatLng]:
+    """
+    Envuelve get_coordinates_from_address con la caché, conservando su firma,
+    de modo que se puede pasar directamente a compute_route_async. Si el geocoder lanza
+    (GeocodingError, error HTTP) no se guarda nada y la excepción sigue al llamador.
+    """
+    @wraps(geocode_fn)
+    def _geocode(
+            google_api_key: str,
+            address: str,
+            *,
+            city_hint: Optional[str] = "Bogotá, Colombia",
+            bounds: Bounds = None,
+            region: str = "co",
+            language: str = "es",
+    ) -> LatLng:
+        key = geocode_key(address, city_hint=city_hint, bounds=bounds, region=region, language=language)
+        found, value = cache.get(key)
+        if found:
+            return value
+        value = geocode_fn(
+            google_api_key, address, city_hint=city_hint, bounds=bounds, region=region, language=language
+        )
+        cache.set(key, value)
+        return value
+
+    _geocode.cache = cache
+    return _geocode
@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+# Caché de resultados de ruta (origen, destino, modo, versión del grafo) en dos niveles:
+# LRU en memoria con TTL + SQLite opcional compartido entre procesos.
+# Comentarios en español, variables en inglés.
+import hashlib
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from src.caching.sqlite_store import SQLiteTTLCache
+from src.graph.csr import CSRGraph
+from src.graph.time_profiles import TimeDependentGraph
+from src.observability import metrics
+
+
+@dataclass
+class CachedRoute:
+    path: list[int]
+    cost: float
+    compute_seconds: float  # lo que costó calcularla (tiempo ahorrado por cada acierto)
+
+
+def route_key(
+        origin_node: int,
+        dest_node: int,
+        weight_type: str,
+        graph_version: str,
+        slot: Optional[int] = None,
+) -> str:
+    """Clave de caché; `slot` es la franja horaria en ruteo dependiente del tiempo."""
+    base = f"{graph_version}|{weight_type}|{int(origin_node)}|{int(dest_node)}"
+    return base if slot is None else f"{base}|{int(slot)}"
+
+
+class RouteCache:
+    """
+    Caché de rutas calculadas.
+
+    - Nivel 1: LRU en memoria (OrderedDict) con `memory_size` entradas y TTL.
+    - Nivel 2 (opcional, `path`): SQLite compartido entre procesos/ejecuciones.
+    - La clave incluye la versión del grafo (fingerprint del CSR), así que un cambio de
+      pesos o de grafo nunca devuelve una ruta vieja; attach(VersionedGraph) además
+      vacía la memoria con cada versión nueva.
+    - metrics(): aciertos por nivel, hit ratio y segundos de cómputo ahorrados.
+    """
+
+    def __init__(
+            self,
+            memory_size: int = 50_000,
+            ttl_seconds: Optional[float] = 3600,
+            path: Optional[str] = None,
+            disk_ttl_seconds: Optional[float] = 24 * 3600,
+            max_disk_entries: Optional[int] = 500_000,
+    ):
+        self.memory_size = memory_size
+        self.ttl_seconds = ttl_seconds
+        self._memory: "OrderedDict[str, Tuple[CachedRoute, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk = (SQLiteTTLCache(path, table="routes", ttl_seconds=disk_ttl_seconds, max_entries=max_disk_entries)
+                      if path else None)
+        self._versions: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+        self._dict_version: Optional[Tuple[int, object, str]] = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.invalidations = 0
+        self.saved_seconds = 0.0
+
+    # ——— Versión del grafo ———
+    def graph_version(self, graph) -> str:
+        """
+        Huella del grafo de ruteo (se calcula una vez por objeto). Los CSRGraph son
+        inmutables en la práctica (VersionedGraph crea uno nuevo por versión) y un
+        TimeDependentGraph se recalcula cuando cambia su `revision`; un dict
+        modificado en el lugar requiere invalidate().
+        """
+        if isinstance(graph, (CSRGraph, TimeDependentGraph)):
+            revision = getattr(graph, "revision", 0)
+            memo = self._versions.get(graph)
+            if memo is None or memo[0] != revision:
+                if isinstance(graph, TimeDependentGraph):
+                    h = hashlib.sha1(graph.csr.fingerprint().encode())
+                    h.update(np.ascontiguousarray(graph.profile_ids).tobytes())
+                    h.update(np.ascontiguousarray(graph.factors).tobytes())
+                    version = h.hexdigest()[:16]
+                else:
+                    version = graph.fingerprint()[:16]
+                memo = self._versions[graph] = (revision, version)
+            return memo[1]
+        memo = self._dict_version
+        if memo is not None and memo[0] == id(graph) and memo[1] is graph:
+            return memo[2]
+        version = CSRGraph.from_adjacency(graph).fingerprint()[:16]
+        self._dict_version = (id(graph), graph, version)
+        return version
+
+    def key_for(self, graph, origin_node: int, dest_node: int, weight_type: str, slot: Optional[int] = None) -> str:
+        return route_key(origin_node, dest_node, weight_type, self.graph_version(graph), slot)
+
+    # ——— Nivel en memoria ———
+    def _memory_get(self, key: str) -> Optional[CachedRoute]:
+        with self._lock:
+            item = self._memory.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if time.time() > expires_at:
+                del self._memory[key]
+                return None
+            self._memory.move_to_end(key)
+            return value
+
+    def _memory_set(self, key: str, value: CachedRoute) -> None:
+        expires_at = time.time() + self.ttl_seconds if self.ttl_seconds is not None else float("inf")
+        with self._lock:
+            self._memory[key] = (value, expires_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.memory_size:
+                self._memory.popitem(last=False)
+
+    # ——— API ———
+    def get(self, key: str) -> Optional[CachedRoute]:
+        value = self._memory_get(key)
+        if value is not None:
+            self.memory_hits += 1
+        elif self._disk is not None:
+            stored = self._disk.get(key)
+            if stored is not None:
+                value = CachedRoute(path=list(stored[0]), cost=float(stored[1]), compute_seconds=float(stored[2]))
+                self._memory_set(key, value)
+                self.disk_hits += 1
+        if value is None:
+            self.misses += 1
+            metrics.inc("route_cache_total", result="miss")
+            return None
+        self.saved_seconds += value.compute_seconds
+        metrics.inc("route_cache_total", result="hit")
+        return value
+
+    def set(self, key: str, path: list[int], cost: float, compute_seconds: float) -> None:
+        value = CachedRoute(path=[int(n) for n in path], cost=float(cost), compute_seconds=float(compute_seconds))
+        self._memory_set(key, value)
+        if self._disk is not None:
+            # inf no es JSON válido: las rutas inexistentes se guardan solo en memoria
+            if np.isfinite(value.cost):
+                self._disk.set(key, [value.path, value.cost, value.compute_seconds])
+        self.stores += 1
+
+    def invalidate(self, disk: bool = False) -> None:
+        """Vacía la memoria (y el disco con disk=True). Necesario si se modifica un dict en el lugar."""
+        with self._lock:
+            self._memory.clear()
+        self._dict_version = None
+        if disk and self._disk is not None:
+            self._disk.clear()
+        self.invalidations += 1
+
+    def attach(self, versioned) -> "RouteCache":
+        """Vacía la memoria con cada versión nueva de un VersionedGraph (pesos en vivo)."""
+        versioned.subscribe(lambda _version, _graph, _changed: self.invalidate())
+        return self
+
+    def metrics(self) -> Dict[str, float]:
+        """Métricas acumuladas del proceso."""
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "invalidations": self.invalidations,
+            "hit_ratio": ((self.memory_hits + self.disk_hits) / lookups) if lookups else 0.0,
+            "saved_seconds": round(self.saved_seconds, 3),
+            "memory_entries": len(self._memory),
+        }
+
+    def close(self) -> None:
+        if self._disk is not None:
+            self._disk.close()
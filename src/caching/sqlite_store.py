@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+# Almacén clave-valor persistente en SQLite con TTL, expulsión LRU y contadores.
+# Comentarios en español, variables en inglés.
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+
+class SQLiteTTLCache:
+    """
+    Caché en disco (un archivo SQLite) con:
+      - marca de tiempo por entrada (created/accessed),
+      - expiración por TTL (las entradas vencidas cuentan como miss y se borran),
+      - tamaño máximo con expulsión LRU (menor `accessed` primero),
+      - contadores de hits/misses/expired/evictions.
+
+    Los valores se guardan como JSON. Es seguro usarla desde varios hilos.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            table: str = "cache",
+            ttl_seconds: Optional[float] = None,
+            max_entries: Optional[int] = None,
+            evict_check_every: int = 256,
+    ):
+        if not table.isidentifier():
+            raise ValueError(f"Nombre de tabla inválido: {table}")
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.evict_check_every = max(1, evict_check_every)
+
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._writes_since_check = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table}(accessed)")
+
+    # ——— Lectura ———
+    def _is_expired(self, created: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created > self.ttl_seconds
+
+    def get(self, key: str, default: Any = None) -> Any:
+        """Devuelve el valor si existe y no expiró; actualiza su marca LRU."""
+        found = self.get_many([key])
+        return found.get(key, default)
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Lectura por lotes: {key: valor} solo para las claves vigentes."""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        now = time.time()
+        result: Dict[str, Any] = {}
+        stale = []
+        with self._lock:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value, created FROM {self.table} WHERE key IN ({marks})", chunk
+                ).fetchall()
+                for key, value, created in rows:
+                    if self._is_expired(created, now):
+                        stale.append(key)
+                    else:
+                        result[key] = json.loads(value)
+            if stale:
+                self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", [(k,) for k in stale])
+            if result:
+                self._conn.executemany(
+                    f"UPDATE {self.table} SET accessed = ? WHERE key = ?", [(now, k) for k in result]
+                )
+            self.hits += len(result)
+            self.misses += len(keys) - len(result)
+            self.expired += len(stale)
+        return result
+
+    # ——— Escritura ———
+    def set(self, key: str, value: Any) -> None:
+        self.set_many([(key, value)])
+
+    def set_many(self, items: Iterable[Tuple[str, Any]]) -> None:
+        now = time.time()
+        rows = [(k, json.dumps(v), now, now) for k, v in items]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                f"INSERT INTO {self.table} (key, value, created, accessed) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value, "
+                "created = excluded.created, accessed = excluded.accessed",
+                rows,
+            )
+            self._writes_since_check += len(rows)
+            if self.max_entries is not None and self._writes_since_check >= self.evict_check_every:
+                self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        """Expulsa las entradas menos usadas hasta respetar max_entries."""
+        self._writes_since_check = 0
+        count = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY accessed ASC LIMIT ?)",
+                (excess,),
+            )
+            self.evictions += excess
+
+    # ——— Mantenimiento ———
+    def purge_expired(self) -> int:
+        """Borra todas las entradas vencidas. Devuelve cuántas se eliminaron."""
+        if self.ttl_seconds is None:
+            return 0
+        with self._lock:
+            cur = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE created < ?", (time.time() - self.ttl_seconds,)
+            )
+            self.expired += cur.rowcount
+            return cur.rowcount
+
+    def flush(self) -> None:
+        """Aplica la expulsión LRU pendiente (útil al terminar un lote de escrituras)."""
+        if self.max_entries is not None:
+            with self._lock:
+                self._evict_locked()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def stats(self) -> Dict[str, float]:
+        """Contadores acumulados desde que se abrió la caché."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            "entries": len(self),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,10 +1,16 @@
 from __future__ import annotations
 from collections import defaultdict
-from src.api.google_maps import compute_route_duration_seconds
+from src.graph.csr import CSRGraph
+from src.graph.speed_model import EdgeFeatures, SpeedModel
+from src.api.routes_batch import fetch_route_durations
+from src.caching.duration_cache import DurationCache
+from src.observability import metrics
 import hashlib
-from typing import Dict, Tuple, Optional
+from typing import Dict, Tuple, Optional, Union
 import time
 
+import numpy as np
+
 def _is_oneway(edge_data: dict) -> bool:
     """
     Determina si la arista es unidireccional según atributos de OSM.
@@ -31,45 +37,135 @@ def _deterministic_sample(u: int, v: int, ratio: float) -> bool:
     return val <= ratio
 
 
-def _call_duration_with_backoff(
-        google_maps_api_url: str,
-        google_api_key: str,
-        origin_lat: float,
-        origin_lng: float,
-        dest_lat: float,
-        dest_lng: float,
-        max_retries: int = 3,
-        backoff_base: float = 0.5,
-) -> Optional[float]:
-    """
-    Llama a Google Routes con reintentos/backoff exponencial.
-    Devuelve duración en segundos o None si no es posible obtenerla.
-    """
-    attempt = 0
-    while True:
-        try:
-            dur_s, dist_m, _raw = compute_route_duration_seconds(
-                origin_lat=origin_lat,
-                origin_lng=origin_lng,
-                dest_lat=dest_lat,
-                dest_lng=dest_lng,
-                routing_preference="TRAFFIC_AWARE_OPTIMAL",
-                departure_time=None,
-                traffic_model=None,
-                # parámetros propios
-                google_maps_api_url=google_maps_api_url,
-                google_api_key=google_api_key,
+def _deterministic_sample_mask(u: np.ndarray, v: np.ndarray, ratio: float) -> np.ndarray:
+    """
+    Versión en lote de _deterministic_sample: misma selección arista por arista.
+    Los digests MD5 se concatenan y sus primeros 4 bytes (big-endian, equivalentes a
+    h[:8] en hex) se leen de una vez con NumPy.
+    """
+    if ratio <= 0.0:
+        return np.zeros(len(u), dtype=bool)
+    if ratio >= 1.0:
+        return np.ones(len(u), dtype=bool)
+    md5 = hashlib.md5
+    digests = b"".join([md5(b"%d-%d" % (a, b)).digest() for a, b in zip(u.tolist(), v.tolist())])
+    head = np.frombuffer(digests, dtype=">u4").reshape(-1, 4)[:, 0]
+    return head / 0xFFFFFFFF <= ratio
+
+
+def _iter_edges(G):
+    """
+    (u, v, data) en el mismo orden que G.edges(data=True). En grafos dirigidos de
+    NetworkX recorre los dicts de adyacencia subyacentes (`_adj`), sin pasar por las
+    vistas de reportviews arista por arista.
+    """
+    adj = getattr(G, "_adj", None)
+    if adj is None or not G.is_directed():
+        yield from G.edges(data=True)
+    elif G.is_multigraph():
+        for u, nbrs in adj.items():
+            for v, keydict in nbrs.items():
+                for data in keydict.values():
+                    yield u, v, data
+    else:
+        for u, nbrs in adj.items():
+            for v, data in nbrs.items():
+                yield u, v, data
+
+
+def _edge_arrays(G) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, list]:
+    """
+    Extrae en una sola pasada (u, v, length_m, oneway, data) de las aristas de G, en el
+    orden de G.edges. Longitudes ausentes o <= 0 se reemplazan por 1.0.
+    """
+    src, dst, lengths, oneways, edge_data = [], [], [], [], []
+    for u, v, data in _iter_edges(G):
+        src.append(u)
+        dst.append(v)
+        lengths.append(float(data.get("length", 1.0)))
+        oneways.append(_is_oneway(data))
+        edge_data.append(data)
+    length = np.array(lengths, dtype=np.float64)
+    length[length <= 0] = 1.0
+    return (np.array(src, dtype=np.int64), np.array(dst, dtype=np.int64),
+            length, np.array(oneways, dtype=bool), edge_data)
+
+
+def _expand_directions(
+        u: np.ndarray, v: np.ndarray, weights: np.ndarray, oneway: np.ndarray,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Aristas dirigidas finales: u->v por cada arista y, justo después, v->u si no es
+    oneway (mismo orden en que se llenaban las listas de adyacencia).
+    """
+    keep = np.column_stack([np.ones(len(u), dtype=bool), ~oneway]).ravel()
+    src = np.column_stack([u, v]).ravel()[keep]
+    dst = np.column_stack([v, u]).ravel()[keep]
+    w = np.repeat(weights, 2)[keep]
+    return src, dst, w
+
+
+def _adjacency_from_arrays(
+        src: np.ndarray, dst: np.ndarray, w: np.ndarray,
+) -> Dict[int, list[Tuple[int, float]]]:
+    """
+    Lista de adyacencia {u: [(v, w), ...]} desde arreglos paralelos, con las claves en
+    orden de primera aparición y cada lista en el orden original de las aristas.
+    """
+    graph: Dict[int, list[Tuple[int, float]]] = defaultdict(list)
+    if not len(src):
+        return graph
+    nodes, first, codes = np.unique(src, return_index=True, return_inverse=True)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.zeros(len(nodes) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=len(nodes)), out=bounds[1:])
+
+    node_list, b = nodes.tolist(), bounds.tolist()
+    pairs = list(zip(dst[order].tolist(), w[order].tolist()))
+    for i in np.argsort(first, kind="stable").tolist():
+        graph[node_list[i]] = pairs[b[i]:b[i + 1]]
+    return graph
+
+
+def _estimate_durations(
+        edge_data: list,
+        length_m: np.ndarray,
+        durations: np.ndarray,
+        known: np.ndarray,
+        speed_model: Union[str, SpeedModel, None],
+        default_speed_mps: float,
+        min_speed_samples: int,
+        speed_report: Optional[dict],
+        weight_type: str,
+) -> np.ndarray:
+    """
+    Duración estimada (s) de todas las aristas: modelo de velocidad ajustado con las
+    muestras (`known`), modelo dado, o distancia / velocidad por defecto.
+    """
+    if speed_model is None:
+        return length_m / default_speed_mps
+
+    with metrics.span("build_stage_seconds", stage="speed_model", weight_type=weight_type):
+        model = speed_model
+        features = EdgeFeatures.from_edge_data(edge_data)
+        if isinstance(model, str):
+            sample_idx = np.flatnonzero(known)
+            if len(sample_idx) < min_speed_samples:
+                print(
+                    f"[WARN] Solo {len(sample_idx)} duraciones muestreadas (< {min_speed_samples}): "
+                    f"se usa la velocidad por defecto ({default_speed_mps * 3.6:.1f} km/h)."
+                )
+                return length_m / default_speed_mps
+            model = SpeedModel.fit(
+                features.take(sample_idx), length_m[sample_idx], durations[sample_idx],
+                default_speed_kph=default_speed_mps * 3.6,
             )
-            if dur_s is not None and dur_s > 0:
-                return float(dur_s)
-            return None
-        except Exception:
-            attempt += 1
-            if attempt > max_retries:
-                return None
-            # backoff exponencial simple
-            sleep_s = backoff_base * (2 ** (attempt - 1))
-            time.sleep(sleep_s)
+        for line in model.summary():
+            print(line)
+        if speed_report is not None:
+            speed_report.update(model.report)
+            speed_report["model"] = model
+        return model.predict_durations(features, length_m)
 
 
 def build_simple_graph(
@@ -81,7 +177,16 @@ def build_simple_graph(
         default_speed_kph: float = 25.0, # velocidad por defecto para estimar duración cuando no hay API/resultado
         max_retries: int = 3,
         backoff_base: float = 0.5,
-) -> Dict[int, list[Tuple[int, float]]]:
+        as_csr: bool = False,            # True -> devuelve CSRGraph (arreglos NumPy) en vez de dict
+        duration_store: Optional[DurationCache] = None,  # caché persistente de duraciones (SQLite)
+        concurrency: int = 8,            # consultas simultáneas a Google Routes
+        rate_limit_per_sec: float = 10.0,  # tope de solicitudes por segundo (lado cliente)
+        departure_time: Optional[str] = None,  # RFC 3339 (futuro): duraciones para esa hora de salida
+        traffic_model: Optional[str] = None,   # BEST_GUESS | PESSIMISTIC | OPTIMISTIC
+        speed_model: Union[str, SpeedModel, None] = "fit",  # "fit" | SpeedModel | None (velocidad plana)
+        min_speed_samples: int = 10,     # muestras mínimas para ajustar el modelo de velocidad
+        speed_report: Optional[dict] = None,  # si se pasa, recibe el modelo y la calidad del ajuste
+) -> Union[Dict[int, list[Tuple[int, float]]], CSRGraph]:
     """
     Construye un grafo simplificado (lista de adyacencia) para algoritmos de ruteo.
 
@@ -94,78 +199,139 @@ def build_simple_graph(
         default_speed_kph: velocidad por defecto para convertir metros -> segundos en modo "duration".
         max_retries: reintentos por arista para la consulta a Google.
         backoff_base: factor base para backoff exponencial.
+        as_csr: si es True, devuelve un CSRGraph compacto (mismo contenido, menos memoria).
+        duration_store: caché persistente (DurationCache) consultada antes de llamar a Google;
+            las duraciones obtenidas se guardan para reconstrucciones futuras.
+        concurrency: consultas simultáneas a Google (pool de hilos sobre una sesión HTTP compartida).
+        rate_limit_per_sec: límite de solicitudes por segundo del lado del cliente.
+        departure_time / traffic_model: se pasan a Google Routes para obtener duraciones de
+            una hora de salida concreta. El caché persistente no distingue horas, así que se
+            ignora en ese caso; para perfiles por franja ver src/graph/time_profiles.py.
+        speed_model: duración de las aristas no muestreadas (o sin resultado) en modo "duration".
+            "fit" ajusta velocidades por clase de vía (y maxspeed/lanes) con las aristas
+            muestreadas (src/graph/speed_model.py); una instancia de SpeedModel se aplica tal
+            cual; None usa default_speed_kph para todas. Con menos de `min_speed_samples`
+            muestras válidas, "fit" vuelve a la velocidad plana.
+        speed_report: dict que recibe "model" (SpeedModel) y la calidad del ajuste
+            (validación cruzada frente a la velocidad plana).
 
     Returns:
-        dict: {u: [(v, weight), ...]} usando pesos coherentes al modo escogido.
+        dict: {u: [(v, weight), ...]} usando pesos coherentes al modo escogido,
+        o CSRGraph equivalente si as_csr=True.
+
+    Métricas: etapas en `build_stage_seconds` (edges, durations, speed_model, adjacency, csr) y
+    contadores `build_api_requests_total`, `build_api_retries_total`,
+    `build_api_failures_total` y `build_duration_cache_total{result=hit|dedup|miss}`.
     """
-    graph: Dict[int, list[Tuple[int, float]]] = defaultdict(list)
-    edges = list(G.edges(data=True))
-    total_edges = len(edges)
+    if weight_type not in ("distance", "duration"):
+        raise ValueError("weight_type debe ser 'distance' o 'duration'")
+    if isinstance(speed_model, str) and speed_model != "fit":
+        raise ValueError("speed_model debe ser 'fit', un SpeedModel o None")
+    if departure_time and duration_store is not None:
+        print("[WARN] duration_store se ignora con departure_time (sus claves no incluyen la hora).")
+        duration_store = None
 
     # Caché local de duraciones entre coordenadas (reduce llamadas repetidas)
     duration_cache: Dict[Tuple[float, float, float, float], float] = {}
+    api_calls = 0
 
     # Conversión velocidad -> m/s para estimación de duración
     default_speed_mps = float(default_speed_kph) / 3.6 if default_speed_kph > 0 else 6.94  # ~25 km/h
 
-    for i, (u, v, data) in enumerate(edges):
-        # Coordenadas (OSMnx: y=lat, x=lon)
-        lat_u, lon_u = float(G.nodes[u]["y"]), float(G.nodes[u]["x"])
-        lat_v, lon_v = float(G.nodes[v]["y"]), float(G.nodes[v]["x"])
-
-        # Longitud base en metros (si falta, asume 1.0 para no romper)
-        length_m = float(data.get("length", 1.0))
-        if length_m <= 0:
-            length_m = 1.0
-
-        if weight_type == "distance":
-            # Peso = metros (consistente para todo el grafo)
-            weight = length_m
-
-        elif weight_type == "duration":
-            # Peso = segundos (consistente). Si no hay consulta/resultado, convierte por velocidad por defecto.
-            # Muestreo determinista para decidir si se llama a Google por esta arista:
-            if _deterministic_sample(u, v, sample_ratio):
-                # Redondeo leve de coord para mejorar tasa de acierto en caché (reduce claves “casi iguales”)
-                key = (round(lat_u, 5), round(lon_u, 5), round(lat_v, 5), round(lon_v, 5))
-                if key in duration_cache:
-                    dur_s = duration_cache[key]
-                else:
-                    dur_s = _call_duration_with_backoff(
-                        google_maps_api_url=google_maps_api_url,
-                        google_api_key=google_api_key,
-                        origin_lat=lat_u,
-                        origin_lng=lon_u,
-                        dest_lat=lat_v,
-                        dest_lng=lon_v,
-                        max_retries=max_retries,
-                        backoff_base=backoff_base,
-                    )
-                    if dur_s is not None and dur_s > 0:
-                        duration_cache[key] = dur_s
-
-                if dur_s is not None and dur_s > 0:
-                    weight = dur_s
-                else:
-                    # Fallback: estimar tiempo = distancia / velocidad
-                    weight = length_m / default_speed_mps
-            else:
-                # No consultada: estimación por velocidad
-                weight = length_m / default_speed_mps
-
-        else:
-            raise ValueError("weight_type debe ser 'distance' o 'duration'")
-
-        # Agrega arista u->v
-        graph[u].append((v, weight))
-
-        # Si la vía NO es oneway, agrega la arista inversa v->u con el mismo peso
-        if not _is_oneway(data):
-            graph[v].append((u, weight))
+    # 1) Arreglos de aristas (u, v, longitud, sentido) y, en modo duration, selección de muestreo
+    t_stage = time.perf_counter()
+    u_arr, v_arr, length_m, oneway, edge_data = _edge_arrays(G)
+    total_edges = len(u_arr)
+
+    to_fetch: Dict[Tuple[float, float, float, float], Tuple[float, float, float, float]] = {}
+    sampled_idx = np.zeros(0, dtype=np.int64)
+    sampled_keys: list[Tuple[float, float, float, float]] = []
+    if weight_type == "duration":
+        # Muestreo determinista (mismo hash MD5 por arista) para decidir qué aristas consultar a Google
+        sampled_idx = np.flatnonzero(_deterministic_sample_mask(u_arr, v_arr, sample_ratio))
+        nodes = G.nodes
+        for u, v in zip(u_arr[sampled_idx].tolist(), v_arr[sampled_idx].tolist()):
+            # Coordenadas (OSMnx: y=lat, x=lon)
+            lat_u, lon_u = float(nodes[u]["y"]), float(nodes[u]["x"])
+            lat_v, lon_v = float(nodes[v]["y"]), float(nodes[v]["x"])
+            # Redondeo leve de coord para mejorar tasa de acierto en caché (reduce claves “casi iguales”)
+            key = (round(lat_u, 5), round(lon_u, 5), round(lat_v, 5), round(lon_v, 5))
+            to_fetch.setdefault(key, (lat_u, lon_u, lat_v, lon_v))
+            sampled_keys.append(key)
+    sampled = len(sampled_keys)
+    metrics.observe("build_stage_seconds", time.perf_counter() - t_stage, stage="edges", weight_type=weight_type)
+
+    # 2) Resolver duraciones muestreadas: caché persistente y luego Google en paralelo
+    if to_fetch:
+        with metrics.span("build_stage_seconds", stage="durations", weight_type=weight_type):
+            if duration_store is not None:
+                duration_cache.update(duration_store.get_many(to_fetch.keys()))
+            missing = {k: req for k, req in to_fetch.items() if k not in duration_cache}
+            metrics.inc("build_duration_cache_total", len(to_fetch) - len(missing), result="hit")
+            metrics.inc("build_duration_cache_total", sampled - len(to_fetch), result="dedup")
+            metrics.inc("build_duration_cache_total", len(missing), result="miss")
+            if missing:
+                fetch_stats: dict = {}
+                fetched = fetch_route_durations(
+                    google_maps_api_url,
+                    google_api_key,
+                    missing,
+                    concurrency=concurrency,
+                    rate_limit_per_sec=rate_limit_per_sec,
+                    max_retries=max_retries,
+                    backoff_base=backoff_base,
+                    stats=fetch_stats,
+                    departure_time=departure_time,
+                    traffic_model=traffic_model,
+                )
+                api_calls = fetch_stats.get("requests", len(missing))
+                metrics.inc("build_api_requests_total", api_calls)
+                metrics.inc("build_api_retries_total", fetch_stats.get("retries", 0))
+                metrics.inc("build_api_failures_total", fetch_stats.get("failures", 0))
+                ok = {k: d for k, d in fetched.items() if d is not None and d > 0}
+                duration_cache.update(ok)
+                if duration_store is not None and ok:
+                    duration_store.set_many(ok)
+
+    # 3) Pesos (operaciones sobre arreglos) y aristas dirigidas en lote
+    t_stage = time.perf_counter()
+    if weight_type == "distance":
+        # Peso = metros (consistente para todo el grafo)
+        weights = length_m
+    else:
+        # Peso = segundos: duración consultada donde la hay y estimación en el resto
+        durations = np.full(total_edges, np.nan)
+        for i, key in zip(sampled_idx.tolist(), sampled_keys):
+            dur_s = duration_cache.get(key)
+            if dur_s is not None and dur_s > 0:
+                durations[i] = dur_s
+        known = ~np.isnan(durations)
+        weights = _estimate_durations(
+            edge_data, length_m, durations, known, speed_model, default_speed_mps, min_speed_samples,
+            speed_report, weight_type,
+        )
+        weights[known] = durations[known]
 
+    # u->v siempre; v->u con el mismo peso si la vía NO es oneway
+    src, dst, w = _expand_directions(u_arr, v_arr, weights, oneway)
+    graph = None if as_csr else _adjacency_from_arrays(src, dst, w)
+    num_nodes = len(graph) if graph is not None else len(np.unique(src))
+    metrics.observe("build_stage_seconds", time.perf_counter() - t_stage, stage="adjacency", weight_type=weight_type)
 
     print(
-        f"Grafo simplificado con {len(graph)} nodos (listas de adyacencia), "
-        f"modo={weight_type}, edges={total_edges}, cache_durations={len(duration_cache)}"
+        f"Grafo simplificado con {num_nodes} nodos (listas de adyacencia), "
+        f"modo={weight_type}, edges={total_edges}, cache_durations={len(duration_cache)}, "
+        f"api_calls={api_calls}"
     )
+    if duration_store is not None:
+        st = duration_store.stats()
+        print(
+            f"[INFO] Caché persistente de duraciones: hits={st['hits']}, misses={st['misses']}, "
+            f"expired={st['expired']}, evictions={st['evictions']}, entries={st['entries']}"
+        )
+    if as_csr:
+        with metrics.span("build_stage_seconds", stage="csr", weight_type=weight_type):
+            if not len(src):
+                return CSRGraph.from_adjacency({}, weight_type=weight_type)
+            return CSRGraph.from_arrays(src, dst, w, weight_type=weight_type)
     return graph
\ No newline at end of file
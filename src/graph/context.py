@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+# Contexto del grafo: metadatos precalculados una vez al cargar el grafo
+# (bounds, GeoDataFrames, índice espacial, modo de peso) y reutilizados por
+# ruteo y visualización. Comentarios en español, variables en inglés.
+import threading
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+import osmnx as ox
+
+from src.graph.spatial_index import SnappingIndex
+
+WEIGHT_UNITS = {"distance": "m", "duration": "s"}
+
+
+class GraphContext:
+    """
+    Todo lo que las consultas necesitan saber del grafo, calculado una sola vez.
+
+    - bounds: ((sw_lat, sw_lng), (ne_lat, ne_lng)), calculado al construir.
+    - snapping_index: SnappingIndex (perezoso; se construye en el primer uso) sobre
+      `snap_nodes` si se indicaron (p. ej. la componente fuertemente conexa más grande
+      de src/graph/reduction.py), para no ajustar puntos a islas sin camino.
+    - nodes_gdf / edges_gdf: GeoDataFrames de OSMnx (perezosos; solo los pide el
+      visualizador cuando dibuja la red).
+    - graph_simple / weight_type / weight_unit: grafo de ruteo y su modo de peso.
+
+    Los atributos perezosos se construyen bajo un lock, así que el contexto se puede
+    compartir entre hilos (GUI, servicio).
+    """
+
+    def __init__(
+            self,
+            G,
+            graph_simple=None,
+            weight_type: str = "distance",
+            place: Optional[str] = None,
+            index_edges: bool = False,
+            snap_nodes=None,
+    ):
+        t0 = time.perf_counter()
+        self.G = G
+        self.place = place
+        self.index_edges = index_edges
+        self.graph_simple = None
+        self.weight_type = weight_type
+        self.snap_nodes = None
+        self._lock = threading.Lock()
+        self._snapping_index: Optional[SnappingIndex] = None
+        self.set_routing_graph(graph_simple, weight_type, snap_nodes)
+
+        xs = np.fromiter((float(d["x"]) for _n, d in G.nodes(data=True)), dtype=np.float64)  # lon
+        ys = np.fromiter((float(d["y"]) for _n, d in G.nodes(data=True)), dtype=np.float64)  # lat
+        self.bounds: Tuple[Tuple[float, float], Tuple[float, float]] = (
+            (float(ys.min()), float(xs.min())),
+            (float(ys.max()), float(xs.max())),
+        )
+        self.num_nodes = G.number_of_nodes()
+        self.num_edges = G.number_of_edges()
+
+        self._gdfs = None
+        self._background = None
+        print(f"[INFO] Contexto del grafo listo en {time.perf_counter() - t0:.2f}s")
+
+    def set_routing_graph(self, graph_simple, weight_type: str, snap_nodes=None) -> None:
+        """
+        Asocia (o reemplaza) el grafo de ruteo sin recalcular bounds/índices de G.
+        Con `snap_nodes` el índice espacial se reconstruye (perezoso) solo con esos nodos.
+        """
+        if weight_type not in WEIGHT_UNITS:
+            raise ValueError("weight_type debe ser 'distance' o 'duration'")
+        self.graph_simple = graph_simple
+        self.weight_type = weight_type
+        if snap_nodes is not None:
+            with self._lock:
+                self.snap_nodes = snap_nodes
+                self._snapping_index = None
+
+    @property
+    def weight_unit(self) -> str:
+        return WEIGHT_UNITS[self.weight_type]
+
+    @property
+    def snapping_index(self) -> SnappingIndex:
+        with self._lock:
+            if self._snapping_index is None:
+                self._snapping_index = SnappingIndex.from_graph(
+                    self.G, nodes=self.snap_nodes, with_edges=self.index_edges
+                )
+            return self._snapping_index
+
+    def _ensure_gdfs(self):
+        with self._lock:
+            if self._gdfs is None:
+                t0 = time.perf_counter()
+                self._gdfs = ox.graph_to_gdfs(self.G, nodes=True, edges=True)
+                print(f"[INFO] GeoDataFrames del grafo listos en {time.perf_counter() - t0:.2f}s")
+            return self._gdfs
+
+    @property
+    def nodes_gdf(self):
+        return self._ensure_gdfs()[0]
+
+    @property
+    def edges_gdf(self):
+        return self._ensure_gdfs()[1]
+
+    def network_background(self, cache_path: Optional[str] = None):
+        """Fondo simplificado de la red para plot_routes_fast (una vez por grafo; opcionalmente en disco)."""
+        from src.graph.visualizer import NetworkBackground
+
+        with self._lock:
+            if self._background is None:
+                self._background = NetworkBackground.load_or_build(self.G, cache_path)
+            return self._background
+
+    def warm_up(self, gdfs: bool = False) -> "GraphContext":
+        """Construye de una vez los atributos perezosos (p. ej. al arrancar un servicio)."""
+        _ = self.snapping_index
+        if gdfs:
+            self._ensure_gdfs()
+        return self
+
+    def __repr__(self) -> str:
+        return (
+            f"GraphContext(place={self.place!r}, nodes={self.num_nodes}, edges={self.num_edges}, "
+            f"weight_type={self.weight_type!r})"
+        )
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+# Representación compacta CSR (Compressed Sparse Row) del grafo simplificado.
+# Comentarios en español, variables en inglés.
+import hashlib
+from typing import Dict, Iterable, Iterator, Tuple
+
+import numpy as np
+
+
+class CSRGraph:
+    """
+    Grafo dirigido compacto en formato CSR.
+
+    - node_ids: IDs OSM (int64) ordenados; la posición es el índice denso del nodo.
+    - indptr:   offsets (n+1) de las aristas salientes de cada nodo.
+    - indices:  índice denso del nodo destino de cada arista.
+    - weights:  peso de cada arista (metros o segundos según weight_type).
+
+    Expone además la interfaz de un dict {u: [(v, w), ...]} (get, in, iteración, len)
+    para que el código que hoy recibe la lista de adyacencia lo acepte sin cambios.
+    """
+
+    def __init__(
+            self,
+            node_ids: np.ndarray,
+            indptr: np.ndarray,
+            indices: np.ndarray,
+            weights: np.ndarray,
+            weight_type: str = "distance",
+    ):
+        if len(indptr) != len(node_ids) + 1:
+            raise ValueError("indptr debe tener len(node_ids) + 1 posiciones.")
+        if len(indices) != len(weights):
+            raise ValueError("indices y weights deben tener la misma longitud.")
+        self.node_ids = node_ids
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.weight_type = weight_type
+
+    # ——— Construcción ———
+    @classmethod
+    def from_arrays(
+            cls,
+            src_ids: Iterable[int],
+            dst_ids: Iterable[int],
+            weights: Iterable[float],
+            weight_type: str = "distance",
+    ) -> "CSRGraph":
+        """Construye el CSR a partir de arreglos paralelos (u, v, peso), conservando el orden por nodo."""
+        src = np.asarray(src_ids, dtype=np.int64)
+        dst = np.asarray(dst_ids, dtype=np.int64)
+        w = np.asarray(weights, dtype=np.float64)
+
+        # Remapeo denso: IDs OSM ordenados -> 0..n-1
+        node_ids = np.unique(np.concatenate([src, dst]))
+        src_idx = np.searchsorted(node_ids, src)
+        dst_idx = np.searchsorted(node_ids, dst).astype(np.int32)
+
+        # Orden estable por nodo origen para respetar el orden original de las listas
+        order = np.argsort(src_idx, kind="stable")
+        counts = np.bincount(src_idx, minlength=len(node_ids))
+        indptr = np.zeros(len(node_ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+
+        return cls(node_ids, indptr, dst_idx[order], w[order], weight_type=weight_type)
+
+    @classmethod
+    def from_adjacency(
+            cls,
+            graph: Dict[int, list[Tuple[int, float]]],
+            weight_type: str = "distance",
+    ) -> "CSRGraph":
+        """Convierte la lista de adyacencia {u: [(v, w), ...]} de build_simple_graph a CSR."""
+        src, dst, w = [], [], []
+        for u, nbrs in graph.items():
+            for v, weight in nbrs:
+                src.append(u)
+                dst.append(v)
+                w.append(weight)
+        if not src:
+            empty = np.zeros(0, dtype=np.int64)
+            return cls(empty, np.zeros(1, dtype=np.int64), empty.astype(np.int32), empty.astype(np.float64), weight_type)
+        return cls.from_arrays(src, dst, w, weight_type=weight_type)
+
+    def with_weights(self, weights: np.ndarray) -> "CSRGraph":
+        """Copia con otros pesos que comparte node_ids/indptr/indices (misma topología)."""
+        weights = np.asarray(weights, dtype=np.float64)
+        if len(weights) != len(self.indices):
+            raise ValueError("weights debe tener una posición por arista.")
+        return CSRGraph(self.node_ids, self.indptr, self.indices, weights, weight_type=self.weight_type)
+
+    def to_adjacency(self) -> Dict[int, list[Tuple[int, float]]]:
+        """Devuelve la lista de adyacencia equivalente {u: [(v, w), ...]} (solo nodos con salidas)."""
+        return {u: nbrs for u, nbrs in self.items() if nbrs}
+
+    # ——— Consultas por índice ———
+    @property
+    def num_nodes(self) -> int:
+        return int(len(self.node_ids))
+
+    @property
+    def num_edges(self) -> int:
+        return int(len(self.indices))
+
+    def index_of(self, node_id: int) -> int:
+        """Índice denso del nodo; KeyError si el ID no existe en el grafo."""
+        i = int(np.searchsorted(self.node_ids, node_id))
+        if i >= len(self.node_ids) or int(self.node_ids[i]) != int(node_id):
+            raise KeyError(node_id)
+        return i
+
+    def node_at(self, index: int) -> int:
+        """ID OSM del nodo en la posición densa `index`."""
+        return int(self.node_ids[index])
+
+    def neighbors_idx(self, index: int) -> Tuple[list[int], list[float]]:
+        """Vecinos (índices) y pesos de las aristas salientes del nodo `index`."""
+        a, b = self.indptr[index], self.indptr[index + 1]
+        return self.indices[a:b].tolist(), self.weights[a:b].tolist()
+
+    def neighbors(self, node_id: int) -> list[Tuple[int, float]]:
+        """Aristas salientes de `node_id` como [(v, w), ...] con IDs OSM."""
+        idx, w = self.neighbors_idx(self.index_of(node_id))
+        return list(zip(self.node_ids[idx].tolist(), w))
+
+    def fingerprint(self) -> str:
+        """Hash SHA-1 del contenido (topología + pesos); identifica el grafo en cachés derivadas."""
+        h = hashlib.sha1()
+        for arr in (self.node_ids, self.indptr, self.indices, self.weights):
+            h.update(np.ascontiguousarray(arr).tobytes())
+        h.update(self.weight_type.encode())
+        return h.hexdigest()
+
+    def memory_bytes(self) -> int:
+        """Memoria ocupada por los arreglos NumPy del grafo."""
+        return int(self.node_ids.nbytes + self.indptr.nbytes + self.indices.nbytes + self.weights.nbytes)
+
+    # ——— Interfaz compatible con dict {u: [(v, w), ...]} ———
+    def __contains__(self, node_id) -> bool:
+        try:
+            self.index_of(node_id)
+        except (KeyError, TypeError, ValueError):
+            return False
+        return True
+
+    def __getitem__(self, node_id: int) -> list[Tuple[int, float]]:
+        return self.neighbors(node_id)
+
+    def get(self, node_id: int, default=None):
+        try:
+            return self.neighbors(node_id)
+        except (KeyError, TypeError, ValueError):
+            return default
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(self.node_ids.tolist())
+
+    def __len__(self) -> int:
+        return self.num_nodes
+
+    def keys(self):
+        return self.node_ids.tolist()
+
+    def items(self) -> Iterator[Tuple[int, list[Tuple[int, float]]]]:
+        ids = self.node_ids.tolist()
+        for i, u in enumerate(ids):
+            idx, w = self.neighbors_idx(i)
+            yield u, [(ids[j], wj) for j, wj in zip(idx, w)]
+
+    def __repr__(self) -> str:
+        return (
+            f"CSRGraph(nodes={self.num_nodes:,}, edges={self.num_edges:,}, "
+            f"weight_type={self.weight_type}, memory={self.memory_bytes() / 1e6:.1f} MB)"
+        )
@@ -2,6 +2,22 @@ import os
 import osmnx as ox
 from datetime import datetime, timedelta
 
+from src.graph.snapshot import load_graph_snapshot, save_graph_snapshot, snapshot_age_days
+
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "../../data/cache")
+
+
+def graph_cache_path(place: str, network_type: str = "drive", suffix: str = ".graphml") -> str:
+    """
+    Ruta de un archivo de caché asociado al grafo de `place`.
+    Con el sufijo por defecto es el .graphml de download_city_graph; otros sufijos
+    (p. ej. ".distance.ch.npz") permiten guardar artefactos derivados junto a él.
+    """
+    safe_name = place.lower().replace(",", "").replace(" ", "_")
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, f"{safe_name}_{network_type}{suffix}")
+
+
 def download_city_graph(place: str, network_type: str = "drive", use_cache: bool = True, max_age_days: int = 30):
     """
     Descarga o carga desde caché el grafo vial de una ciudad usando OSMnx.
@@ -16,11 +32,19 @@ def download_city_graph(place: str, network_type: str = "drive", use_cache: bool
         networkx.MultiDiGraph: Grafo vial de la ciudad con nodos y aristas.
     """
 
-    # === Preparar ruta del archivo de caché ===
-    safe_name = place.lower().replace(",", "").replace(" ", "_")
-    cache_dir = os.path.join(os.path.dirname(__file__), "../../data/cache")
-    os.makedirs(cache_dir, exist_ok=True)
-    cache_file = os.path.join(cache_dir, f"{safe_name}_{network_type}.graphml")
+    # === Preparar rutas de caché (snapshot binario + GraphML de intercambio) ===
+    cache_file = graph_cache_path(place, network_type)
+    snapshot_dir = graph_cache_path(place, network_type, suffix=".snapshot")
+
+    # === Preferir el snapshot binario (carga con mmap, sin parseo XML) ===
+    if use_cache:
+        snapshot_age = snapshot_age_days(snapshot_dir)
+        if snapshot_age is not None and snapshot_age <= max_age_days:
+            try:
+                print(f"[INFO] Cargando snapshot en caché: {snapshot_dir} (edad: {int(snapshot_age)} días)")
+                return load_graph_snapshot(snapshot_dir)
+            except (OSError, ValueError, KeyError):
+                print(f"[WARN] No se pudo leer el snapshot: {snapshot_dir}. Se usará el GraphML.")
 
     # === Verificar si el grafo ya existe en caché ===
     if use_cache and os.path.exists(cache_file):
@@ -28,6 +52,7 @@ def download_city_graph(place: str, network_type: str = "drive", use_cache: bool
         if file_age_days <= max_age_days:
             print(f"[INFO] Cargando grafo en caché: {cache_file} (edad: {file_age_days} días)")
             G = ox.load_graphml(cache_file)
+            save_graph_snapshot(G, snapshot_dir)  # las próximas cargas usan el snapshot
             return G
         else:
             print(f"[WARN] El grafo tiene {file_age_days} días. Se descargará uno nuevo.")
@@ -39,6 +64,7 @@ def download_city_graph(place: str, network_type: str = "drive", use_cache: bool
 
     # === Guardar el grafo en caché ===
     ox.save_graphml(G, cache_file)
+    save_graph_snapshot(G, snapshot_dir)
     print(f"[INFO] Grafo guardado en caché en: {cache_file}")
 
     return G
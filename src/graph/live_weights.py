@@ -0,0 +1,301 @@
+from __future__ import annotations
+
+# Actualización incremental de pesos (tráfico en vivo) sobre el grafo de ruteo CSR,
+# con versiones inmutables para que las consultas en curso vean un estado consistente
+# y re-personalización de las estructuras derivadas (CH, ALT).
+# Comentarios en español, variables en inglés.
+import csv
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.api.routes_batch import fetch_route_durations
+from src.caching.duration_cache import DurationCache
+from src.graph.csr import CSRGraph
+from src.observability import metrics
+
+# (u, v, nuevo_peso) con IDs OSM; el peso va en la unidad del grafo (m o s)
+WeightDelta = Tuple[int, int, float]
+# listener(version, graph, changed_edge_positions)
+UpdateListener = Callable[[int, CSRGraph, np.ndarray], None]
+
+
+@dataclass
+class UpdateResult:
+    """Resumen de un lote de deltas aplicado con VersionedGraph.apply."""
+    version: int
+    applied: int                # deltas aplicados (cada uno puede tocar varias aristas paralelas)
+    edges_changed: int          # posiciones CSR cuyo peso cambió
+    unknown: List[Tuple[int, int]] = field(default_factory=list)  # (u, v) sin arista u->v
+    invalid: int = 0            # pesos NaN o <= 0
+    seconds: float = 0.0
+
+
+class VersionedGraph:
+    """
+    Grafo de ruteo con versiones: cada lote de deltas produce un CSRGraph nuevo.
+
+    - Copia al escribir: los pesos se copian (un arreglo float64 por versión) y la
+      topología (node_ids, indptr, indices) se comparte entre versiones.
+    - `graph` / `snapshot()` devuelven la versión vigente; quien la toma al iniciar una
+      consulta la usa completa aunque entre una actualización a mitad de camino.
+    - Los listeners (p. ej. LiveEngine o SharedGraphPublisher.publish) se llaman tras
+      cada versión nueva con (version, graph, posiciones de aristas cambiadas).
+    - Un peso `inf` cierra la arista (vía cerrada).
+    """
+
+    def __init__(self, graph, weight_type: Optional[str] = None):
+        if not isinstance(graph, CSRGraph):
+            graph = CSRGraph.from_adjacency(graph, weight_type=weight_type or "distance")
+        self._graph = graph
+        self.version = 0
+        self._lock = threading.Lock()
+        self._listeners: List[UpdateListener] = []
+
+        # Claves ordenadas src*n + dst para ubicar aristas en lote (la topología no cambia)
+        n = graph.num_nodes
+        edge_src = np.repeat(np.arange(n, dtype=np.int64), np.diff(graph.indptr))
+        keys = edge_src * n + graph.indices.astype(np.int64)
+        self._edge_order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[self._edge_order]
+
+    @property
+    def graph(self) -> CSRGraph:
+        return self._graph
+
+    @property
+    def weight_type(self) -> str:
+        return self._graph.weight_type
+
+    def snapshot(self) -> Tuple[int, CSRGraph]:
+        """(versión, grafo) leídos juntos."""
+        with self._lock:
+            return self.version, self._graph
+
+    def subscribe(self, listener: UpdateListener) -> None:
+        self._listeners.append(listener)
+
+    def edge_positions(self, u_ids: Sequence[int], v_ids: Sequence[int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Posiciones CSR de las aristas u->v (todas las paralelas) para cada par.
+
+        Returns:
+            (positions, owner, found): posiciones de aristas, índice del par al que
+            pertenece cada posición y máscara de pares con al menos una arista.
+        """
+        g = self._graph
+        n = g.num_nodes
+        u = np.asarray(u_ids, dtype=np.int64)
+        v = np.asarray(v_ids, dtype=np.int64)
+        ui = np.clip(np.searchsorted(g.node_ids, u), 0, max(n - 1, 0))
+        vi = np.clip(np.searchsorted(g.node_ids, v), 0, max(n - 1, 0))
+        known = (g.node_ids[ui] == u) & (g.node_ids[vi] == v) if n else np.zeros(len(u), dtype=bool)
+
+        keys = ui * n + vi
+        left = np.searchsorted(self._sorted_keys, keys, side="left")
+        right = np.searchsorted(self._sorted_keys, keys, side="right")
+        counts = np.where(known, right - left, 0)
+        found = counts > 0
+
+        owner = np.repeat(np.arange(len(u)), counts)
+        starts = np.repeat(left, counts)
+        offsets = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+        positions = self._edge_order[starts + offsets]
+        return positions, owner, found
+
+    def apply(self, deltas: Iterable[WeightDelta]) -> UpdateResult:
+        """
+        Aplica un lote de deltas (u, v, nuevo_peso) y publica una versión nueva.
+
+        Pares sin arista u->v se reportan en `unknown` y pesos NaN o <= 0 en `invalid`;
+        ninguno de los dos interrumpe el lote. Si hay varios deltas para el mismo par,
+        gana el último.
+        """
+        t0 = time.perf_counter()
+        rows = list(deltas)
+        u = np.fromiter((int(d[0]) for d in rows), dtype=np.int64, count=len(rows))
+        v = np.fromiter((int(d[1]) for d in rows), dtype=np.int64, count=len(rows))
+        w = np.fromiter((float(d[2]) for d in rows), dtype=np.float64, count=len(rows))
+
+        valid = ~np.isnan(w) & (w > 0)
+        invalid = int((~valid).sum())
+        u, v, w = u[valid], v[valid], w[valid]
+
+        with self._lock:
+            positions, owner, found = self.edge_positions(u, v)
+            weights = self._graph.weights.copy()
+            old = weights[positions]
+            weights[positions] = w[owner]  # asignación en orden: el último delta del par gana
+            changed = np.unique(positions[old != weights[positions]])
+            if len(changed):
+                self._graph = self._graph.with_weights(weights)
+                self.version += 1
+            version, graph = self.version, self._graph
+
+        unknown = [(int(a), int(b)) for a, b in zip(u[~found], v[~found])]
+        result = UpdateResult(
+            version=version,
+            applied=int(found.sum()),
+            edges_changed=int(len(changed)),
+            unknown=unknown,
+            invalid=invalid,
+        )
+        if len(changed):
+            for listener in list(self._listeners):
+                listener(version, graph, changed)
+        result.seconds = time.perf_counter() - t0
+
+        metrics.inc("live_weight_deltas_total", result.applied, result="applied")
+        metrics.inc("live_weight_deltas_total", len(unknown), result="unknown")
+        metrics.inc("live_weight_deltas_total", invalid, result="invalid")
+        metrics.observe("live_update_seconds", result.seconds)
+        if unknown:
+            print(f"[WARN] {len(unknown)} delta(s) sin arista en el grafo (p. ej. {unknown[0]}).")
+        print(
+            f"[INFO] Pesos actualizados: versión {version}, {result.applied} deltas, "
+            f"{result.edges_changed} aristas cambiadas, {result.seconds:.3f}s"
+        )
+        return result
+
+
+class LiveEngine:
+    """
+    Motor derivado (CH, ALT, ...) que se re-personaliza con cada versión del grafo.
+
+    Es invocable con la firma de dijkstra (`dijkstra_fn`). Cada consulta usa el motor
+    completo de una sola versión; mientras se re-personaliza, las consultas siguen
+    con la versión anterior. Con background=True la re-personalización corre en un
+    hilo y, si llegan varias versiones seguidas, solo se procesa la última.
+
+    Ejemplo:
+        live = VersionedGraph(graph_simple)
+        ch = LiveEngine(live, ContractionHierarchy.build(live.graph, "duration"))
+        live.apply(load_delta_feed("traffic.csv"))
+    """
+
+    def __init__(
+            self,
+            versioned: VersionedGraph,
+            engine,
+            recustomize: Optional[Callable] = None,
+            background: bool = False,
+    ):
+        self.versioned = versioned
+        self.engine = engine
+        self.version = versioned.version
+        self._recustomize = recustomize or (lambda engine, graph: engine.recustomize(graph))
+        self.background = background
+        self._lock = threading.Lock()
+        self._pending: Optional[Tuple[int, CSRGraph]] = None
+        self._worker: Optional[threading.Thread] = None
+        versioned.subscribe(self._on_update)
+
+    def _on_update(self, version: int, graph: CSRGraph, _changed: np.ndarray) -> None:
+        if not self.background:
+            self._rebuild(version, graph)
+            return
+        with self._lock:
+            self._pending = (version, graph)
+            if self._worker is not None and self._worker.is_alive():
+                return
+            self._worker = threading.Thread(target=self._drain, daemon=True)
+            self._worker.start()
+
+    def _drain(self) -> None:
+        while True:
+            with self._lock:
+                job, self._pending = self._pending, None
+                if job is None:
+                    return
+            self._rebuild(*job)
+
+    def _rebuild(self, version: int, graph: CSRGraph) -> None:
+        if version <= self.version:
+            return
+        t0 = time.perf_counter()
+        engine = self._recustomize(self.engine, graph)
+        with self._lock:
+            if version > self.version:
+                self.engine, self.version = engine, version
+        elapsed = time.perf_counter() - t0
+        metrics.observe("live_recustomize_seconds", elapsed, engine=type(engine).__name__)
+        print(f"[INFO] {type(engine).__name__} re-personalizado a la versión {version} en {elapsed:.2f}s")
+
+    def wait(self, timeout: Optional[float] = None) -> None:
+        """Espera a que termine la re-personalización en segundo plano (si hay)."""
+        worker = self._worker
+        if worker is not None:
+            worker.join(timeout)
+
+    def __call__(self, graph, source, target, weight_type="distance", stats=None):
+        return self.engine(graph, source, target, weight_type, stats=stats)
+
+
+# ——— Fuentes de deltas ———
+
+def load_delta_feed(path: str, both_directions: bool = False) -> List[WeightDelta]:
+    """
+    Lee un feed CSV con columnas `u,v,weight` (IDs OSM y peso en la unidad del grafo).
+
+    Una columna opcional `both_directions` (1/true/yes), o el argumento del mismo
+    nombre, agrega también el delta v->u. Las filas mal formadas se ignoran con aviso.
+    """
+    deltas: List[WeightDelta] = []
+    skipped = 0
+    with open(path, newline="", encoding="utf-8") as fh:
+        for row in csv.DictReader(fh):
+            try:
+                u, v, w = int(row["u"]), int(row["v"]), float(row["weight"])
+            except (KeyError, TypeError, ValueError):
+                skipped += 1
+                continue
+            deltas.append((u, v, w))
+            flag = str(row.get("both_directions") or "").strip().lower() in ("1", "true", "yes")
+            if both_directions or flag:
+                deltas.append((v, u, w))
+    if skipped:
+        print(f"[WARN] {skipped} fila(s) del feed {path} ignoradas (formato inválido).")
+    return deltas
+
+
+def deltas_from_routes(
+        G,
+        edges: Iterable[Tuple[int, int]],
+        google_maps_api_url: str,
+        google_api_key: str,
+        duration_store: Optional[DurationCache] = None,
+        both_directions: bool = False,
+        **fetch_kwargs,
+) -> List[WeightDelta]:
+    """
+    Duraciones frescas de Google Routes para aristas (u, v) de G (modo 'duration').
+
+    Usa el mismo cliente concurrente que build_simple_graph (fetch_kwargs: concurrency,
+    rate_limit_per_sec, max_retries, backoff_base). Si se pasa `duration_store`, las
+    duraciones nuevas lo sobrescriben para que una reconstrucción futura las reutilice.
+    """
+    requests_by_key = {}
+    for u, v in edges:
+        nu, nv = G.nodes[u], G.nodes[v]
+        requests_by_key[(u, v)] = (float(nu["y"]), float(nu["x"]), float(nv["y"]), float(nv["x"]))
+    if not requests_by_key:
+        return []
+
+    fetched = fetch_route_durations(google_maps_api_url, google_api_key, requests_by_key, **fetch_kwargs)
+    deltas: List[WeightDelta] = []
+    fresh = {}
+    for (u, v), dur in fetched.items():
+        if dur is None or dur <= 0:
+            continue
+        deltas.append((u, v, float(dur)))
+        if both_directions:
+            deltas.append((v, u, float(dur)))
+        lat_u, lon_u, lat_v, lon_v = requests_by_key[(u, v)]
+        fresh[(round(lat_u, 5), round(lon_u, 5), round(lat_v, 5), round(lon_v, 5))] = float(dur)
+    if duration_store is not None and fresh:
+        duration_store.set_many(fresh)
+    print(f"[INFO] Routes: {len(deltas)} deltas de {len(requests_by_key)} aristas consultadas")
+    return deltas
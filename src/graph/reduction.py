@@ -0,0 +1,434 @@
+from __future__ import annotations
+
+# Reducción del grafo de ruteo antes de buscar: componente fuertemente conexa más grande
+# (descarta islas donde un nodo ajustado no tendría camino) y contracción de cadenas de
+# nodos de grado 2 en aristas únicas, con el mapa para expandir los caminos a los nodos
+# originales. Comentarios en español, variables en inglés.
+import contextlib
+import io
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import connected_components
+
+from src.graph.csr import CSRGraph
+
+
+# ——— Componente fuertemente conexa ———
+
+def largest_scc_nodes(graph) -> np.ndarray:
+    """IDs (ordenados) de los nodos de la componente fuertemente conexa más grande."""
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph.from_adjacency(graph)
+    n = graph.num_nodes
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    matrix = csr_matrix((np.ones(graph.num_edges, dtype=np.int8), graph.indices, graph.indptr), shape=(n, n))
+    _count, labels = connected_components(matrix, directed=True, connection="strong")
+    largest = np.argmax(np.bincount(labels))
+    return graph.node_ids[labels == largest]
+
+
+def induced_subgraph(graph: CSRGraph, node_ids: np.ndarray) -> CSRGraph:
+    """Subgrafo con las aristas cuyos dos extremos están en `node_ids` (orden por nodo conservado)."""
+    keep = np.zeros(graph.num_nodes, dtype=bool)
+    keep[np.searchsorted(graph.node_ids, node_ids)] = True
+    src = np.repeat(np.arange(graph.num_nodes), np.diff(graph.indptr))
+    mask = keep[src] & keep[graph.indices]
+    new_index = np.cumsum(keep) - 1
+    counts = np.bincount(new_index[src[mask]], minlength=int(keep.sum()))
+    indptr = np.zeros(len(counts) + 1, dtype=np.int64)
+    np.cumsum(counts, out=indptr[1:])
+    return CSRGraph(
+        graph.node_ids[keep],
+        indptr,
+        new_index[graph.indices[mask]].astype(np.int32),
+        graph.weights[mask],
+        weight_type=graph.weight_type,
+    )
+
+
+# ——— Contracción de cadenas ———
+
+def _contractible(graph: CSRGraph, protect: np.ndarray) -> np.ndarray:
+    """
+    Nodos de paso: entra una arista y sale una hacia otro vecino (vía en un sentido), o
+    entran y salen exactamente dos aristas con los mismos dos vecinos (vía doble).
+    """
+    n = graph.num_nodes
+    out_deg = np.diff(graph.indptr)
+    in_deg = np.bincount(graph.indices, minlength=n)
+    rev_order = np.argsort(graph.indices, kind="stable")
+    rev_src = np.repeat(np.arange(n), out_deg)[rev_order]
+    rev_ptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(in_deg, out=rev_ptr[1:])
+
+    result = np.zeros(n, dtype=bool)
+    indptr, indices = graph.indptr, graph.indices
+    candidates = np.flatnonzero(((out_deg == 1) & (in_deg == 1)) | ((out_deg == 2) & (in_deg == 2)))
+    for x in candidates.tolist():
+        outs = indices[indptr[x]:indptr[x + 1]].tolist()
+        ins = rev_src[rev_ptr[x]:rev_ptr[x + 1]].tolist()
+        if x in outs or x in ins:
+            continue
+        if len(outs) == 1:
+            result[x] = outs[0] != ins[0]
+        else:
+            result[x] = outs[0] != outs[1] and set(outs) == set(ins)
+    result[protect] = False
+    return result
+
+
+@dataclass
+class ReducedGraph:
+    """
+    Grafo de ruteo reducido y lo necesario para volver al grafo original.
+
+    - graph: CSRGraph con los nodos conservados (intersecciones, extremos, protegidos).
+    - via_indptr / via_nodes: por cada arista del CSR reducido, los nodos originales
+      que contrajo (en orden), y via_offsets el costo acumulado hasta cada uno.
+    - snap_nodes: nodos de la componente fuertemente conexa más grande (todos, también
+      los contraídos); son los candidatos para ajustar puntos.
+    - stats: nodos/aristas antes y después de cada etapa, reducción y tiempos.
+    """
+
+    graph: CSRGraph
+    via_indptr: np.ndarray
+    via_nodes: np.ndarray
+    via_offsets: np.ndarray
+    snap_nodes: np.ndarray
+    stats: Dict[str, float] = field(default_factory=dict)
+
+    def __post_init__(self):
+        g = self.graph
+        self._via_edge = np.repeat(np.arange(g.num_edges), np.diff(self.via_indptr))
+        self._via_order = np.argsort(self.via_nodes, kind="stable")
+        self._via_sorted = self.via_nodes[self._via_order]
+        # Arista más barata por par (u, v) con clave u*n+v, para expandir caminos en lote
+        n = g.num_nodes
+        keys = np.repeat(np.arange(n, dtype=np.int64), np.diff(g.indptr)) * n + g.indices.astype(np.int64)
+        order = np.lexsort((g.weights, keys))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = keys[order][1:] != keys[order][:-1]
+        self._pair_keys = keys[order][first]
+        self._pair_edge = order[first]
+
+    # ——— Expansión ———
+    def expand_path(self, path: List[int]) -> List[int]:
+        """Camino del grafo reducido -> camino con todos los nodos originales (en lote)."""
+        if len(path) < 2 or not len(self.via_nodes):
+            return [int(x) for x in path]
+        g = self.graph
+        ids = np.asarray(path, dtype=np.int64)
+        idx = np.searchsorted(g.node_ids, ids)
+        keys = idx[:-1] * g.num_nodes + idx[1:]
+        k = np.minimum(np.searchsorted(self._pair_keys, keys), len(self._pair_keys) - 1)
+        if not np.array_equal(self._pair_keys[k], keys):
+            raise KeyError("El camino usa aristas que no están en el grafo reducido.")
+        edges = self._pair_edge[k]
+
+        # Cada paso aporta su nodo de origen seguido de los nodos de la cadena
+        starts = self.via_indptr[edges]
+        counts = self.via_indptr[edges + 1] - starts
+        seg_start = np.cumsum(counts + 1) - (counts + 1)
+        out = np.empty(int(counts.sum()) + len(ids), dtype=np.int64)
+        out[seg_start] = ids[:-1]
+        step = np.repeat(np.arange(len(edges)), counts)
+        within = np.arange(int(counts.sum())) - np.repeat(np.cumsum(counts) - counts, counts)
+        out[seg_start[step] + 1 + within] = self.via_nodes[starts[step] + within]
+        out[-1] = ids[-1]
+        return out.tolist()
+
+    def contains(self, node_id: int) -> bool:
+        """True si el nodo sigue en el grafo reducido (conservado o dentro de una cadena)."""
+        node_ids = self.graph.node_ids
+        i = np.searchsorted(node_ids, node_id)
+        return bool(i < len(node_ids) and node_ids[i] == node_id) or self.is_contracted(node_id)
+
+    def is_contracted(self, node_id: int) -> bool:
+        i = np.searchsorted(self._via_sorted, node_id)
+        return bool(i < len(self._via_sorted) and self._via_sorted[i] == node_id)
+
+    def _chain_positions(self, node_id: int) -> List[int]:
+        """Posiciones en via_nodes de un nodo contraído (una por sentido de la vía)."""
+        lo = np.searchsorted(self._via_sorted, node_id, side="left")
+        hi = np.searchsorted(self._via_sorted, node_id, side="right")
+        return self._via_order[lo:hi].tolist()
+
+    def _exits(self, node_id: int) -> List[Tuple[int, float, List[int]]]:
+        """(nodo conservado, costo, nodos intermedios) alcanzables desde `node_id` sin desvío."""
+        if not self.is_contracted(node_id):
+            return [(int(node_id), 0.0, [])]
+        g = self.graph
+        exits = []
+        for k in self._chain_positions(node_id):
+            e = int(self._via_edge[k])
+            end = int(self.via_indptr[e + 1])
+            dst = g.node_at(int(g.indices[e]))
+            exits.append((dst, float(g.weights[e] - self.via_offsets[k]), self.via_nodes[k + 1:end].tolist()))
+        return exits
+
+    def _entries(self, node_id: int) -> List[Tuple[int, float, List[int]]]:
+        """(nodo conservado, costo, nodos intermedios) desde los que se llega a `node_id`."""
+        if not self.is_contracted(node_id):
+            return [(int(node_id), 0.0, [])]
+        g = self.graph
+        entries = []
+        for k in self._chain_positions(node_id):
+            e = int(self._via_edge[k])
+            start = int(self.via_indptr[e])
+            src = g.node_at(int(np.searchsorted(g.indptr, e, side="right") - 1))
+            entries.append((src, float(self.via_offsets[k]), self.via_nodes[start:k].tolist()))
+        return entries
+
+    def route(self, engine: Callable, source: int, target: int, weight_type: str = "distance",
+              stats: Optional[dict] = None) -> Tuple[List[int], float]:
+        """
+        Camino source->target en IDs originales usando `engine` (firma de dijkstra) sobre
+        el grafo reducido. Si un extremo quedó dentro de una cadena contraída, se prueban
+        las salidas/entradas de su cadena (a lo sumo 2 x 2 búsquedas) y el tramo directo
+        cuando ambos están en la misma cadena.
+        """
+        source, target = int(source), int(target)
+        best_path, best_cost = [source], float("inf")
+        if not (self.contains(source) and self.contains(target)):
+            return best_path, best_cost  # fuera de la SCC conservada: sin camino
+        if source == target:
+            return [source], 0.0
+
+        # Ambos en la misma cadena, en el sentido de la vía
+        if self.is_contracted(source) and self.is_contracted(target):
+            for ks in self._chain_positions(source):
+                for kt in self._chain_positions(target):
+                    if self._via_edge[ks] == self._via_edge[kt] and ks < kt:
+                        cost = float(self.via_offsets[kt] - self.via_offsets[ks])
+                        if cost < best_cost:
+                            best_path, best_cost = self.via_nodes[ks:kt + 1].tolist(), cost
+
+        searched: Dict[Tuple[int, int], Tuple[List[int], float]] = {}
+        for exit_node, exit_cost, exit_via in self._exits(source):
+            for entry_node, entry_cost, entry_via in self._entries(target):
+                key = (exit_node, entry_node)
+                if key not in searched:
+                    searched[key] = ([exit_node], 0.0) if exit_node == entry_node else \
+                        engine(self.graph, exit_node, entry_node, weight_type, stats=stats)
+                mid_path, mid_cost = searched[key]
+                cost = exit_cost + mid_cost + entry_cost
+                if cost < best_cost and np.isfinite(mid_cost):
+                    head = [source] + exit_via if exit_node != source else []
+                    tail = entry_via + [target] if entry_node != target else []
+                    best_path, best_cost = head + self.expand_path(list(mid_path)) + tail, cost
+        return best_path, best_cost
+
+    def memory_bytes(self) -> int:
+        return int(self.graph.memory_bytes() + self.via_indptr.nbytes + self.via_nodes.nbytes
+                   + self.via_offsets.nbytes + self.snap_nodes.nbytes)
+
+
+class ReducedEngine:
+    """
+    Motor con la firma de dijkstra (`dijkstra_fn`) que busca en el grafo reducido y
+    devuelve el camino expandido a los nodos originales. El argumento `graph` se
+    ignora (como en LiveEngine): se usa siempre `reduced.graph`.
+
+    Ejemplo:
+        reduced = reduce_graph(graph_simple)
+        engine = ReducedEngine(reduced)                   # dijkstra por defecto
+        engine = ReducedEngine(reduced, ContractionHierarchy.build(reduced.graph, "duration"))
+    """
+
+    def __init__(self, reduced: ReducedGraph, engine: Optional[Callable] = None):
+        if engine is None:
+            from src.algorithms.dijkstra import dijkstra as engine
+        self.reduced = reduced
+        self.engine = engine
+
+    def __call__(self, graph, source, target, weight_type="distance", stats=None):
+        return self.reduced.route(self.engine, source, target, weight_type, stats=stats)
+
+
+def contract_chains(graph: CSRGraph, protect: Iterable[int] = ()) -> Tuple[CSRGraph, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Contrae cadenas de nodos de paso en aristas únicas (peso = suma de la cadena).
+
+    Los caminos mínimos entre nodos conservados no cambian: por una cadena solo hay un
+    recorrido posible. Un ciclo formado solo por nodos de paso conserva uno de ellos.
+
+    Returns:
+        (grafo reducido, via_indptr, via_nodes, via_offsets) alineados con sus aristas.
+    """
+    n = graph.num_nodes
+    protect_ids = np.asarray(list(protect), dtype=np.int64)
+    protect_idx = np.searchsorted(graph.node_ids, protect_ids)
+    found = protect_idx < n
+    found[found] = graph.node_ids[protect_idx[found]] == protect_ids[found]
+    protect_idx = protect_idx[found]
+    contractible = _contractible(graph, protect_idx)
+    visited = np.zeros(n, dtype=bool)
+
+    indptr, indices, weights = graph.indptr, graph.indices.tolist(), graph.weights.tolist()
+    ptr = indptr.tolist()
+    is_chain = contractible.tolist()
+    edge_src, edge_dst, edge_w, via_lists, offset_lists = [], [], [], [], []
+
+    def walk_from(k: int) -> None:
+        for p in range(ptr[k], ptr[k + 1]):
+            prev, cur, total = k, indices[p], weights[p]
+            visited_now: Dict[int, bool] = {}
+            via, offsets = [], []
+            while is_chain[cur] and not visited_now.get(cur):
+                visited_now[cur] = True
+                visited[cur] = True
+                via.append(cur)
+                offsets.append(total)
+                lo, hi = ptr[cur], ptr[cur + 1]
+                q = lo if hi - lo == 1 or indices[lo] != prev else lo + 1
+                prev, cur = cur, indices[q]
+                total += weights[q]
+            # Un lazo k -> ... -> k se conserva: sus nodos intermedios siguen siendo alcanzables
+            edge_src.append(k)
+            edge_dst.append(cur)
+            edge_w.append(total)
+            via_lists.append(via)
+            offset_lists.append(offsets)
+
+    for k in np.flatnonzero(~contractible).tolist():
+        walk_from(k)
+    # Ciclos sin ningún nodo conservado: se conserva uno por ciclo
+    while True:
+        pending = np.flatnonzero(contractible & ~visited)
+        if not len(pending):
+            break
+        k = int(pending[0])
+        contractible[k] = False
+        is_chain[k] = False
+        visited[k] = True
+        walk_from(k)
+
+    # Aristas agrupadas por origen (orden estable) y cadenas alineadas con ese orden
+    src = np.asarray(edge_src, dtype=np.int64)
+    order = np.argsort(src, kind="stable")
+    kept = np.flatnonzero(~contractible)
+    new_index = np.full(n, -1, dtype=np.int64)
+    new_index[kept] = np.arange(len(kept))
+    counts = np.bincount(new_index[src[order]], minlength=len(kept)) if len(src) else np.zeros(len(kept), np.int64)
+    new_indptr = np.zeros(len(kept) + 1, dtype=np.int64)
+    np.cumsum(counts, out=new_indptr[1:])
+    dst = np.asarray(edge_dst, dtype=np.int64)[order]
+    reduced = CSRGraph(
+        graph.node_ids[kept],
+        new_indptr,
+        new_index[dst].astype(np.int32),
+        np.asarray(edge_w, dtype=np.float64)[order],
+        weight_type=graph.weight_type,
+    )
+
+    via_counts = np.array([len(via_lists[i]) for i in order.tolist()], dtype=np.int64)
+    via_indptr = np.zeros(len(order) + 1, dtype=np.int64)
+    np.cumsum(via_counts, out=via_indptr[1:])
+    via_idx = [x for i in order.tolist() for x in via_lists[i]]
+    via_nodes = graph.node_ids[np.asarray(via_idx, dtype=np.int64)] if via_idx else np.zeros(0, dtype=np.int64)
+    via_offsets = np.asarray([c for i in order.tolist() for c in offset_lists[i]], dtype=np.float64)
+    return reduced, via_indptr, via_nodes, via_offsets
+
+
+def reduce_graph(
+        graph,
+        weight_type: Optional[str] = None,
+        largest_scc: bool = True,
+        contract: bool = True,
+        protect: Iterable[int] = (),
+) -> ReducedGraph:
+    """
+    Reduce el grafo de ruteo (salida de build_simple_graph, dict o CSRGraph).
+
+    Args:
+        largest_scc: conserva solo la componente fuertemente conexa más grande (todo par
+            de nodos ajustados tiene camino).
+        contract: contrae cadenas de nodos de paso.
+        protect: IDs que nunca se contraen (p. ej. depósitos o nodos de interés).
+    """
+    t0 = time.perf_counter()
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph.from_adjacency(graph, weight_type=weight_type or "distance")
+    stats: Dict[str, float] = {"nodes_in": graph.num_nodes, "edges_in": graph.num_edges}
+
+    work = graph
+    if largest_scc:
+        scc = largest_scc_nodes(graph)
+        if len(scc) < graph.num_nodes:
+            work = induced_subgraph(graph, scc)
+    stats["nodes_scc"], stats["edges_scc"] = work.num_nodes, work.num_edges
+    stats["scc_seconds"] = round(time.perf_counter() - t0, 4)
+
+    t1 = time.perf_counter()
+    if contract and work.num_nodes:
+        reduced, via_indptr, via_nodes, via_offsets = contract_chains(work, protect)
+    else:
+        reduced = work
+        via_indptr = np.zeros(work.num_edges + 1, dtype=np.int64)
+        via_nodes = np.zeros(0, dtype=np.int64)
+        via_offsets = np.zeros(0, dtype=np.float64)
+    stats["contract_seconds"] = round(time.perf_counter() - t1, 4)
+    stats["nodes_out"], stats["edges_out"] = reduced.num_nodes, reduced.num_edges
+    stats["contracted_nodes"] = stats["nodes_scc"] - stats["nodes_out"]
+    stats["node_reduction"] = round(1 - stats["nodes_out"] / max(stats["nodes_in"], 1), 4)
+    stats["edge_reduction"] = round(1 - stats["edges_out"] / max(stats["edges_in"], 1), 4)
+
+    print(
+        f"[INFO] Grafo reducido: nodos {stats['nodes_in']:,} -> {stats['nodes_scc']:,} (SCC) -> "
+        f"{stats['nodes_out']:,}, aristas {stats['edges_in']:,} -> {stats['edges_out']:,} "
+        f"(-{stats['node_reduction']:.0%} nodos, -{stats['edge_reduction']:.0%} aristas) "
+        f"en {time.perf_counter() - t0:.2f}s"
+    )
+    return ReducedGraph(reduced, via_indptr, via_nodes, via_offsets, snap_nodes=work.node_ids, stats=stats)
+
+
+def measure_query_speedup(
+        original,
+        reduced: ReducedGraph,
+        engine: Optional[Callable] = None,
+        queries: int = 100,
+        seed: int = 0,
+        weight_type: str = "distance",
+) -> Dict[str, float]:
+    """
+    Compara el tiempo de consulta del grafo original y del reducido con pares aleatorios
+    de snap_nodes; verifica que los costos coincidan. El resultado se agrega a `reduced.stats`.
+    """
+    if engine is None:
+        from src.algorithms.dijkstra import dijkstra as engine
+    rnd = random.Random(seed)
+    nodes = reduced.snap_nodes.tolist()
+    pairs = [(rnd.choice(nodes), rnd.choice(nodes)) for _ in range(queries)]
+    wrapped = ReducedEngine(reduced, engine)
+    t_orig = t_red = 0.0
+    mismatches = 0
+    with contextlib.redirect_stdout(io.StringIO()):
+        for s, t in pairs:
+            t0 = time.perf_counter()
+            _p1, c1 = engine(original, s, t, weight_type)
+            t1 = time.perf_counter()
+            _p2, c2 = wrapped(None, s, t, weight_type)
+            t2 = time.perf_counter()
+            t_orig += t1 - t0
+            t_red += t2 - t1
+            if not np.isclose(c1, c2, rtol=1e-9, atol=1e-6) and not (np.isinf(c1) and np.isinf(c2)):
+                mismatches += 1
+    result = {
+        "queries": queries,
+        "original_ms": round(1000 * t_orig / max(queries, 1), 3),
+        "reduced_ms": round(1000 * t_red / max(queries, 1), 3),
+        "speedup": round(t_orig / t_red, 2) if t_red > 0 else float("inf"),
+        "mismatches": mismatches,
+    }
+    reduced.stats.update(result)
+    print(
+        f"[INFO] Consultas: {result['original_ms']:.2f} ms -> {result['reduced_ms']:.2f} ms "
+        f"(x{result['speedup']:.2f}), {mismatches} diferencias de costo en {queries} pares"
+    )
+    return result
@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+# Grafo de ruteo compartido entre procesos vía archivos mapeados en memoria (mmap).
+# Un proceso publica versiones; los workers se adjuntan en solo lectura y cambian
+# de versión sin reiniciarse. Comentarios en español, variables en inglés.
+import os
+import shutil
+import time
+from typing import Dict, Optional, Tuple
+
+import networkx as nx
+import numpy as np
+
+from src.graph.csr import CSRGraph
+from src.graph.snapshot import _read_arrays, _write_snapshot, read_snapshot_meta
+
+CURRENT_FILE = "CURRENT"
+VERSIONS_DIR = "versions"
+
+
+def _as_csr(graph, weight_type: str) -> CSRGraph:
+    if isinstance(graph, CSRGraph):
+        return graph
+    return CSRGraph.from_adjacency(graph, weight_type=weight_type)
+
+
+class SharedGraphPublisher:
+    """
+    Publica el grafo simplificado (CSR) y las coordenadas de sus nodos en
+    `root/versions/<versión>/` y apunta `root/CURRENT` a la versión activa.
+
+    - Cada versión es inmutable: se escribe completa en un directorio temporal y se renombra.
+    - CURRENT se reemplaza con os.replace (atómico): un worker ve la versión anterior
+      o la nueva, nunca una mezcla.
+    - gc() borra versiones viejas; en Linux/macOS los workers que aún las tengan
+      mapeadas siguen leyéndolas hasta soltarlas.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        os.makedirs(os.path.join(self.root, VERSIONS_DIR), exist_ok=True)
+
+    def publish(self, graph, G=None, weight_type: Optional[str] = None) -> str:
+        """
+        Publica una nueva versión y la activa.
+
+        Args:
+            graph: salida de build_simple_graph (dict o CSRGraph).
+            G: grafo OSMnx para tomar las coordenadas (y/x) de los nodos; opcional.
+            weight_type: requerido si `graph` es un dict.
+
+        Returns:
+            Identificador de la versión publicada.
+        """
+        csr = _as_csr(graph, weight_type or getattr(graph, "weight_type", "distance"))
+        arrays = {
+            "node_ids": csr.node_ids,
+            "indptr": csr.indptr,
+            "indices": csr.indices,
+            "weights": csr.weights,
+        }
+        if G is not None:
+            # Coordenadas alineadas con node_ids (NaN si el nodo no está en G)
+            nodes = G.nodes
+            lat = np.full(csr.num_nodes, np.nan)
+            lon = np.full(csr.num_nodes, np.nan)
+            for i, n in enumerate(csr.node_ids.tolist()):
+                if n in nodes:
+                    lat[i], lon[i] = float(nodes[n]["y"]), float(nodes[n]["x"])
+            arrays["lat"], arrays["lon"] = lat, lon
+
+        fingerprint = csr.fingerprint()
+        version = f"{time.time_ns()}-{fingerprint[:10]}"
+        meta = {
+            "kind": "shared_csr",
+            "weight_type": csr.weight_type,
+            "num_nodes": csr.num_nodes,
+            "num_edges": csr.num_edges,
+            "fingerprint": fingerprint,
+            "crs": (G.graph.get("crs") if G is not None else None),
+        }
+        _write_snapshot(os.path.join(self.root, VERSIONS_DIR, version), arrays, meta)
+
+        tmp = os.path.join(self.root, f"{CURRENT_FILE}.tmp-{os.getpid()}")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(version)
+        os.replace(tmp, os.path.join(self.root, CURRENT_FILE))
+        print(f"[INFO] Grafo compartido publicado: versión {version} ({csr.num_nodes:,} nodos)")
+        return version
+
+    def versions(self) -> list[str]:
+        """Versiones en disco, de la más antigua a la más reciente."""
+        base = os.path.join(self.root, VERSIONS_DIR)
+        return sorted(d for d in os.listdir(base) if ".tmp-" not in d and ".old-" not in d)
+
+    def gc(self, keep: int = 2) -> list[str]:
+        """Borra versiones antiguas conservando las `keep` más recientes y la activa."""
+        current = current_version(self.root)
+        removed = []
+        for version in self.versions()[:-keep] if keep > 0 else self.versions():
+            if version == current:
+                continue
+            try:
+                shutil.rmtree(os.path.join(self.root, VERSIONS_DIR, version))
+                removed.append(version)
+            except OSError:
+                # p. ej. Windows con el archivo aún mapeado: se reintenta en el próximo gc()
+                print(f"[WARN] No se pudo borrar la versión {version}; se reintentará.")
+        return removed
+
+
+def current_version(root: str) -> Optional[str]:
+    """Versión activa según root/CURRENT (None si aún no se ha publicado nada)."""
+    try:
+        with open(os.path.join(root, CURRENT_FILE), encoding="utf-8") as fh:
+            return fh.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+class SharedGraphHandle:
+    """
+    Vista de solo lectura, sin copias, del grafo publicado por SharedGraphPublisher.
+
+    Los arreglos se abren con mmap: todos los procesos del host comparten las mismas
+    páginas del caché del sistema operativo. `maybe_refresh()` revisa CURRENT como
+    mucho cada `check_interval_s` segundos y se adjunta a la nueva versión si cambió.
+
+    Uso típico en un pool de procesos:
+
+        handle = SharedGraphHandle("data/shared/bogota_distance")
+        path, cost = dijkstra(handle.graph, source, target, handle.weight_type)
+    """
+
+    def __init__(self, root: str, check_interval_s: float = 1.0):
+        self.root = os.path.abspath(root)
+        self.check_interval_s = check_interval_s
+        self.version: Optional[str] = None
+        self.meta: dict = {}
+        self._graph: Optional[CSRGraph] = None
+        self._coords: Optional[Tuple[np.ndarray, np.ndarray]] = None
+        self._nodes_graph = None
+        self._last_check = 0.0
+        if not self.refresh():
+            raise FileNotFoundError(f"No hay un grafo publicado en {self.root}")
+
+    def refresh(self) -> bool:
+        """Se adjunta a la versión activa si cambió. Devuelve True si hay una versión cargada."""
+        self._last_check = time.monotonic()
+        version = current_version(self.root)
+        if version is None:
+            return self._graph is not None
+        if version == self.version:
+            return True
+
+        directory = os.path.join(self.root, VERSIONS_DIR, version)
+        meta = read_snapshot_meta(directory)
+        # np.asarray quita la subclase memmap (más barata de indexar) sin copiar los datos
+        a = {k: np.asarray(v) for k, v in _read_arrays(directory, meta, mmap=True).items()}
+        self._graph = CSRGraph(a["node_ids"], a["indptr"], a["indices"], a["weights"],
+                               weight_type=meta["weight_type"])
+        self._coords = (a["lat"], a["lon"]) if "lat" in a else None
+        self._nodes_graph = None
+        previous, self.version, self.meta = self.version, version, meta
+        if previous is not None:
+            print(f"[INFO] Grafo compartido actualizado: {previous} -> {version}")
+        return True
+
+    def maybe_refresh(self) -> bool:
+        """refresh() con límite de frecuencia; pensado para llamarse antes de cada consulta."""
+        if time.monotonic() - self._last_check >= self.check_interval_s:
+            self.refresh()
+        return self._graph is not None
+
+    @property
+    def graph(self) -> CSRGraph:
+        """CSRGraph de la versión actual (revisa si hay una nueva)."""
+        self.maybe_refresh()
+        return self._graph
+
+    @property
+    def weight_type(self) -> str:
+        return self.meta["weight_type"]
+
+    @property
+    def coords(self) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """(lat, lon) alineados con graph.node_ids, o None si se publicó sin G."""
+        self.maybe_refresh()
+        return self._coords
+
+    def node_coordinates(self) -> Dict[int, Tuple[float, float]]:
+        """{nodo: (lat, lon)} como node_coordinates(G) de astar.py."""
+        lat, lon = self.coords
+        return {n: (la, lo) for n, la, lo in zip(self._graph.node_ids.tolist(), lat.tolist(), lon.tolist())}
+
+    def nodes_graph(self):
+        """
+        MultiDiGraph liviano (solo nodos con x/y y crs) para las funciones que esperan `G`,
+        como compute_route_async (bounds y nearest_nodes). Se cachea por versión.
+        """
+        self.maybe_refresh()
+        if self._nodes_graph is None:
+            if self._coords is None:
+                raise ValueError("La versión publicada no incluye coordenadas (publish(..., G=None)).")
+            lat, lon = self._coords
+            Gn = nx.MultiDiGraph(crs=self.meta.get("crs") or "epsg:4326")
+            Gn.add_nodes_from(
+                (n, {"x": lo, "y": la})
+                for n, la, lo in zip(self._graph.node_ids.tolist(), lat.tolist(), lon.tolist())
+                if la == la  # omite NaN
+            )
+            self._nodes_graph = Gn
+        return self._nodes_graph
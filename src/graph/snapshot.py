@@ -0,0 +1,273 @@
+from __future__ import annotations
+
+# Snapshot binario (NumPy + mmap) del grafo OSMnx completo y del grafo de ruteo CSR.
+# Reemplaza las cargas en frío desde GraphML (parseo XML + coerción de tipos).
+# Comentarios en español, variables en inglés.
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Dict, Optional
+
+import networkx as nx
+import numpy as np
+
+from src.graph.builder import _is_oneway
+from src.graph.csr import CSRGraph
+
+SNAPSHOT_FORMAT_VERSION = 2  # v2: oneway normalizado con _is_oneway ("False"/"no" -> 0)
+
+# Atributos de texto de las aristas que se conservan (como categorías: códigos + vocabulario).
+# Los valores lista de OSMnx (p. ej. highway=["primary", "secondary"]) se unen con LIST_SEP.
+EDGE_STR_ATTRS = ("highway", "name", "maxspeed", "lanes", "ref")
+LIST_SEP = "|"
+
+
+def _content_hash(arrays: Dict[str, np.ndarray], extra: str = "") -> str:
+    """sha1 sobre los bytes de los arreglos (en orden de nombre) y metadatos extra."""
+    h = hashlib.sha1()
+    for name in sorted(arrays):
+        arr = np.ascontiguousarray(arrays[name])
+        h.update(name.encode())
+        h.update(str(arr.dtype).encode())
+        h.update(arr.tobytes())
+    h.update(extra.encode())
+    return h.hexdigest()
+
+
+def _write_snapshot(directory: str, arrays: Dict[str, np.ndarray], meta: dict) -> str:
+    """
+    Escribe los .npy y meta.json en un directorio temporal y lo renombra al final,
+    de modo que un lector nunca ve un snapshot a medio escribir.
+    """
+    directory = os.path.abspath(directory)
+    tmp = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for name, arr in arrays.items():
+        np.save(os.path.join(tmp, f"{name}.npy"), np.ascontiguousarray(arr), allow_pickle=False)
+    meta = dict(meta, version=SNAPSHOT_FORMAT_VERSION, created=time.time(),
+                arrays=sorted(arrays), content_hash=_content_hash(arrays, json.dumps(meta, sort_keys=True)))
+    with open(os.path.join(tmp, "meta.json"), "w", encoding="utf-8") as fh:
+        json.dump(meta, fh, ensure_ascii=False, indent=1)
+
+    if os.path.isdir(directory):
+        old = f"{directory}.old-{os.getpid()}"
+        os.replace(directory, old)
+        os.replace(tmp, directory)
+        shutil.rmtree(old, ignore_errors=True)
+    else:
+        os.replace(tmp, directory)
+    return directory
+
+
+def read_snapshot_meta(directory: str) -> dict:
+    """Lee meta.json y valida la versión del formato."""
+    with open(os.path.join(directory, "meta.json"), encoding="utf-8") as fh:
+        meta = json.load(fh)
+    if meta.get("version") != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Versión de snapshot incompatible en {directory}")
+    return meta
+
+
+def _read_arrays(directory: str, meta: dict, mmap: bool) -> Dict[str, np.ndarray]:
+    mode = "r" if mmap else None
+    return {
+        name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode, allow_pickle=False)
+        for name in meta["arrays"]
+    }
+
+
+def _encode_categories(values: list) -> tuple[np.ndarray, list[str]]:
+    """Convierte valores de texto (o listas, o None) en códigos int32 + vocabulario; -1 = ausente."""
+    vocab: Dict[str, int] = {}
+    codes = np.full(len(values), -1, dtype=np.int32)
+    for i, val in enumerate(values):
+        if val is None:
+            continue
+        if isinstance(val, (list, tuple)):
+            val = LIST_SEP.join(str(x) for x in val)
+        else:
+            val = str(val)
+        codes[i] = vocab.setdefault(val, len(vocab))
+    return codes, list(vocab)
+
+
+def _decode_category(code: int, vocab: list[str]):
+    val = vocab[code]
+    return val.split(LIST_SEP) if LIST_SEP in val else val
+
+
+# ——— Grafo OSMnx completo ———
+def save_graph_snapshot(G, directory: str) -> str:
+    """
+    Guarda un MultiDiGraph de OSMnx como snapshot binario.
+
+    Nodos: node_ids (int64), x/y (float64), street_count (int32, -1 si falta).
+    Aristas: u/v (int64), key (int32), length (float64), oneway (int8: 1/0/-1 si falta; con la
+    misma regla que builder._is_oneway, así "False"/"no" quedan en 0),
+    atributos de texto de EDGE_STR_ATTRS como categorías, y geometría como coordenadas
+    planas (geom_coords, (m, 2)) con offsets por arista (geom_offsets, e+1).
+    """
+    t0 = time.perf_counter()
+    nodes = list(G.nodes(data=True))
+    node_ids = np.fromiter((n for n, _d in nodes), dtype=np.int64, count=len(nodes))
+    x = np.fromiter((float(d["x"]) for _n, d in nodes), dtype=np.float64, count=len(nodes))
+    y = np.fromiter((float(d["y"]) for _n, d in nodes), dtype=np.float64, count=len(nodes))
+    street_count = np.fromiter((int(d.get("street_count", -1)) for _n, d in nodes), dtype=np.int32,
+                               count=len(nodes))
+
+    edges = list(G.edges(keys=True, data=True))
+    m = len(edges)
+    u = np.fromiter((e[0] for e in edges), dtype=np.int64, count=m)
+    v = np.fromiter((e[1] for e in edges), dtype=np.int64, count=m)
+    key = np.fromiter((e[2] for e in edges), dtype=np.int32, count=m)
+    length = np.fromiter((float(e[3].get("length", np.nan)) for e in edges), dtype=np.float64, count=m)
+    oneway = np.fromiter(
+        (-1 if e[3].get("oneway") is None else int(_is_oneway(e[3])) for e in edges), dtype=np.int8, count=m
+    )
+
+    arrays = {
+        "node_ids": node_ids, "x": x, "y": y, "street_count": street_count,
+        "u": u, "v": v, "key": key, "length": length, "oneway": oneway,
+    }
+    vocabularies = {}
+    for attr in EDGE_STR_ATTRS:
+        codes, vocab = _encode_categories([e[3].get(attr) for e in edges])
+        if vocab:
+            arrays[f"attr_{attr}"] = codes
+            vocabularies[attr] = vocab
+
+    # Geometrías (LineString) en un solo arreglo plano
+    offsets = np.zeros(m + 1, dtype=np.int64)
+    chunks = []
+    for i, e in enumerate(edges):
+        geom = e[3].get("geometry")
+        if geom is not None:
+            coords = np.asarray(geom.coords, dtype=np.float64)
+            chunks.append(coords)
+            offsets[i + 1] = len(coords)
+    np.cumsum(offsets, out=offsets)
+    arrays["geom_offsets"] = offsets
+    arrays["geom_coords"] = np.vstack(chunks) if chunks else np.zeros((0, 2), dtype=np.float64)
+
+    graph_attrs = {k: val for k, val in G.graph.items() if isinstance(val, (str, int, float, bool))}
+    meta = {
+        "kind": "osmnx",
+        "num_nodes": len(nodes),
+        "num_edges": m,
+        "graph_attrs": graph_attrs,
+        "vocabularies": vocabularies,
+    }
+    _write_snapshot(directory, arrays, meta)
+    print(f"[INFO] Snapshot del grafo guardado en: {directory} ({time.perf_counter() - t0:.2f}s)")
+    return directory
+
+
+class GraphSnapshot:
+    """
+    Arreglos de un snapshot abiertos con mmap (sin copiar a memoria).
+    Sirve para leer coordenadas/aristas directamente o para reconstruir el MultiDiGraph.
+    """
+
+    def __init__(self, directory: str, mmap: bool = True):
+        self.directory = directory
+        self.meta = read_snapshot_meta(directory)
+        if self.meta.get("kind") != "osmnx":
+            raise ValueError(f"{directory} no es un snapshot de grafo OSMnx")
+        self.arrays = _read_arrays(directory, self.meta, mmap)
+
+    @property
+    def content_hash(self) -> str:
+        return self.meta["content_hash"]
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self.arrays[name]
+
+    def to_networkx(self, with_geometry: bool = True):
+        """Reconstruye el MultiDiGraph con los atributos que usa el resto del código."""
+        a = self.arrays
+        G = nx.MultiDiGraph()
+        G.graph.update(self.meta["graph_attrs"])
+
+        node_ids, xs, ys, sc = a["node_ids"].tolist(), a["x"].tolist(), a["y"].tolist(), a["street_count"].tolist()
+        G.add_nodes_from(
+            (n, {"x": x, "y": y, "street_count": c} if c >= 0 else {"x": x, "y": y})
+            for n, x, y, c in zip(node_ids, xs, ys, sc)
+        )
+
+        m = self.meta["num_edges"]
+        attrs = [{} for _ in range(m)]
+        for i, (length, oneway) in enumerate(zip(a["length"].tolist(), a["oneway"].tolist())):
+            if length == length:  # no NaN
+                attrs[i]["length"] = length
+            if oneway >= 0:
+                attrs[i]["oneway"] = bool(oneway)
+        for attr, vocab in self.meta["vocabularies"].items():
+            for i, code in enumerate(a[f"attr_{attr}"].tolist()):
+                if code >= 0:
+                    attrs[i][attr] = _decode_category(code, vocab)
+
+        if with_geometry and len(a["geom_coords"]):
+            import shapely
+            offsets = np.asarray(a["geom_offsets"])
+            counts = np.diff(offsets)
+            has_geom = np.flatnonzero(counts > 0)
+            # Las geometrías están contiguas en geom_coords: construcción vectorizada (shapely 2)
+            part = np.repeat(np.arange(len(has_geom)), counts[has_geom])
+            lines = shapely.linestrings(np.asarray(a["geom_coords"]), indices=part)
+            for i, line in zip(has_geom.tolist(), lines):
+                attrs[i]["geometry"] = line
+
+        G.add_edges_from(zip(a["u"].tolist(), a["v"].tolist(), a["key"].tolist(), attrs))
+        return G
+
+
+def load_graph_snapshot(directory: str, mmap: bool = True, with_geometry: bool = True):
+    """Carga un snapshot guardado con save_graph_snapshot() como MultiDiGraph de OSMnx."""
+    t0 = time.perf_counter()
+    G = GraphSnapshot(directory, mmap=mmap).to_networkx(with_geometry=with_geometry)
+    print(
+        f"[INFO] Snapshot cargado: {G.number_of_nodes():,} nodos, {G.number_of_edges():,} aristas "
+        f"({time.perf_counter() - t0:.2f}s)"
+    )
+    return G
+
+
+# ——— Grafo de ruteo (CSR) ———
+def save_csr_snapshot(graph: CSRGraph, directory: str) -> str:
+    """Guarda un CSRGraph (salida de build_simple_graph(as_csr=True)) como snapshot binario."""
+    arrays = {
+        "node_ids": graph.node_ids,
+        "indptr": graph.indptr,
+        "indices": graph.indices,
+        "weights": graph.weights,
+    }
+    meta = {
+        "kind": "csr",
+        "weight_type": graph.weight_type,
+        "num_nodes": graph.num_nodes,
+        "num_edges": graph.num_edges,
+        "fingerprint": graph.fingerprint(),
+    }
+    _write_snapshot(directory, arrays, meta)
+    print(f"[INFO] Snapshot CSR guardado en: {directory}")
+    return directory
+
+
+def load_csr_snapshot(directory: str, mmap: bool = True) -> CSRGraph:
+    """Abre un snapshot CSR; con mmap=True los arreglos se leen del disco bajo demanda."""
+    meta = read_snapshot_meta(directory)
+    if meta.get("kind") != "csr":
+        raise ValueError(f"{directory} no es un snapshot CSR")
+    a = _read_arrays(directory, meta, mmap)
+    return CSRGraph(a["node_ids"], a["indptr"], a["indices"], a["weights"], weight_type=meta["weight_type"])
+
+
+def snapshot_age_days(directory: str) -> Optional[float]:
+    """Edad en días del snapshot según meta.json (None si no existe o no es legible)."""
+    try:
+        return (time.time() - float(read_snapshot_meta(directory)["created"])) / 86400.0
+    except (OSError, ValueError, KeyError):
+        return None
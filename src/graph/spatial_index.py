@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+# Índice espacial (KD-tree) para ajustar puntos lat/lon a nodos y aristas del grafo.
+# Se construye una vez por grafo y se reutiliza en cada consulta.
+# Comentarios en español, variables en inglés.
+import math
+import time
+from dataclasses import dataclass
+from typing import Iterable, Optional, Sequence, Tuple
+
+import numpy as np
+from sklearn.neighbors import KDTree
+
+from src.algorithms.astar import EARTH_RADIUS_M, haversine_m
+
+# Los segmentos más largos que esto se parten al indexar aristas, para acotar
+# el radio de búsqueda de candidatos (ver nearest_edges).
+MAX_SEGMENT_M = 50.0
+
+
+def _unit_vectors(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Convierte grados a vectores unitarios 3D: la distancia euclídea es la cuerda."""
+    phi, lmb = np.radians(lat), np.radians(lon)
+    cos_phi = np.cos(phi)
+    return np.column_stack([cos_phi * np.cos(lmb), cos_phi * np.sin(lmb), np.sin(phi)])
+
+
+def _chord_to_m(chord: np.ndarray) -> np.ndarray:
+    return 2.0 * EARTH_RADIUS_M * np.arcsin(np.clip(chord / 2.0, 0.0, 1.0))
+
+
+def _m_to_chord(meters: np.ndarray) -> np.ndarray:
+    return 2.0 * np.sin(np.minimum(np.asarray(meters, dtype=np.float64), math.pi * EARTH_RADIUS_M)
+                        / (2.0 * EARTH_RADIUS_M))
+
+
+@dataclass
+class EdgeSnapResult:
+    """Ajuste de puntos a aristas (arreglos alineados con los puntos de entrada)."""
+    u: np.ndarray            # nodo inicial de la arista (-1 si se rechazó)
+    v: np.ndarray            # nodo final
+    key: np.ndarray          # clave de la arista en el MultiDiGraph
+    fraction: np.ndarray     # posición a lo largo de la arista, 0 (u) .. 1 (v)
+    lat: np.ndarray          # punto proyectado sobre la geometría
+    lon: np.ndarray
+    distance_m: np.ndarray   # distancia del punto original a la arista (inf si se rechazó)
+
+    def nearest_endpoint(self) -> np.ndarray:
+        """Nodo extremo más cercano al punto proyectado (u si fraction < 0.5, si no v)."""
+        return np.where(self.fraction < 0.5, self.u, self.v)
+
+
+class SnappingIndex:
+    """
+    KD-tree (scikit-learn) sobre las coordenadas de los nodos, en vectores unitarios 3D
+    para que la distancia sea de gran círculo y no se deforme con la latitud.
+
+    - nearest_nodes: ajuste vectorizado de miles de puntos en una sola llamada.
+    - nearest_edges: proyección sobre la geometría de las aristas (si se indexaron),
+      con rechazo opcional por distancia máxima.
+    """
+
+    def __init__(self, node_ids: np.ndarray, lat: np.ndarray, lon: np.ndarray, leaf_size: int = 40):
+        self.node_ids = np.asarray(node_ids, dtype=np.int64)
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        self._tree = KDTree(_unit_vectors(self.lat, self.lon), leaf_size=leaf_size)
+        self._segments = None  # se llenan con index_edges()
+        self._edges = None
+        self._segment_tree = None
+        self._max_half_segment_m = 0.0
+
+    # ——— Construcción ———
+    @classmethod
+    def from_graph(cls, G, nodes: Optional[Iterable[int]] = None, with_edges: bool = True) -> "SnappingIndex":
+        """
+        Construye el índice a partir de un grafo OSMnx.
+
+        Args:
+            G: MultiDiGraph con atributos x/y (y opcionalmente geometry en las aristas).
+            nodes: subconjunto de nodos a indexar (p. ej. solo los del grafo de ruteo);
+                por defecto todos.
+            with_edges: si es True, indexa también los segmentos de las aristas.
+        """
+        t0 = time.perf_counter()
+        node_set = None if nodes is None else set(nodes)
+        data = [(n, d) for n, d in G.nodes(data=True) if node_set is None or n in node_set]
+        node_ids = np.fromiter((n for n, _d in data), dtype=np.int64, count=len(data))
+        lat = np.fromiter((float(d["y"]) for _n, d in data), dtype=np.float64, count=len(data))
+        lon = np.fromiter((float(d["x"]) for _n, d in data), dtype=np.float64, count=len(data))
+        index = cls(node_ids, lat, lon)
+        if with_edges:
+            index.index_edges(G, node_set)
+        print(f"[INFO] Índice espacial listo: {len(node_ids):,} nodos en {time.perf_counter() - t0:.2f}s")
+        return index
+
+    @classmethod
+    def from_shared(cls, handle) -> "SnappingIndex":
+        """Índice de nodos a partir de un SharedGraphHandle publicado con coordenadas."""
+        lat, lon = handle.coords
+        ok = ~np.isnan(lat)
+        return cls(handle.graph.node_ids[ok], lat[ok], lon[ok])
+
+    def index_edges(self, G, node_set: Optional[set] = None) -> None:
+        """
+        Parte cada arista en segmentos (de su geometry o de la recta u-v), divide los que
+        superan MAX_SEGMENT_M y construye un KD-tree sobre sus puntos medios.
+        """
+        nodes = G.nodes
+        edge_u, edge_v, edge_k = [], [], []
+        seg_edge, a_lat, a_lon, b_lat, b_lon, seg_offset, edge_len = [], [], [], [], [], [], []
+        for u, v, k, d in G.edges(keys=True, data=True):
+            if node_set is not None and (u not in node_set or v not in node_set):
+                continue
+            geom = d.get("geometry")
+            if geom is not None:
+                pts = [(float(y), float(x)) for x, y in geom.coords]
+            else:
+                pts = [(float(nodes[u]["y"]), float(nodes[u]["x"])), (float(nodes[v]["y"]), float(nodes[v]["x"]))]
+            e = len(edge_u)
+            edge_u.append(u)
+            edge_v.append(v)
+            edge_k.append(k)
+            offset = 0.0
+            for (la1, lo1), (la2, lo2) in zip(pts[:-1], pts[1:]):
+                seg_len = haversine_m(la1, lo1, la2, lo2)
+                parts = max(1, int(math.ceil(seg_len / MAX_SEGMENT_M)))
+                for p in range(parts):
+                    t1, t2 = p / parts, (p + 1) / parts
+                    seg_edge.append(e)
+                    a_lat.append(la1 + (la2 - la1) * t1)
+                    a_lon.append(lo1 + (lo2 - lo1) * t1)
+                    b_lat.append(la1 + (la2 - la1) * t2)
+                    b_lon.append(lo1 + (lo2 - lo1) * t2)
+                    seg_offset.append(offset + seg_len * t1)
+                offset += seg_len
+            edge_len.append(offset)
+
+        seg = {
+            "edge": np.asarray(seg_edge, dtype=np.int64),
+            "a_lat": np.asarray(a_lat), "a_lon": np.asarray(a_lon),
+            "b_lat": np.asarray(b_lat), "b_lon": np.asarray(b_lon),
+            "offset": np.asarray(seg_offset),
+        }
+        seg["length"] = _haversine_vec(seg["a_lat"], seg["a_lon"], seg["b_lat"], seg["b_lon"])
+        self._edges = (
+            np.asarray(edge_u, dtype=np.int64),
+            np.asarray(edge_v, dtype=np.int64),
+            np.asarray(edge_k, dtype=np.int64),
+            np.asarray(edge_len, dtype=np.float64),
+        )
+        mid_lat = (seg["a_lat"] + seg["b_lat"]) / 2.0
+        mid_lon = (seg["a_lon"] + seg["b_lon"]) / 2.0
+        self._segment_tree = KDTree(_unit_vectors(mid_lat, mid_lon))
+        self._max_half_segment_m = float(seg["length"].max() / 2.0) if len(seg["length"]) else 0.0
+        self._segments = seg
+
+    def __len__(self) -> int:
+        return len(self.node_ids)
+
+    # ——— Consultas ———
+    def nearest_nodes(
+            self,
+            lats: Sequence[float],
+            lons: Sequence[float],
+            max_distance_m: Optional[float] = None,
+            return_distance: bool = False,
+    ):
+        """
+        Nodo más cercano a cada punto (vectorizado).
+
+        Returns:
+            node_ids (int64; -1 donde el nodo más cercano supera max_distance_m)
+            y, si return_distance=True, también las distancias en metros.
+        """
+        lats, lons = np.atleast_1d(np.asarray(lats, dtype=np.float64)), np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        chord, idx = self._tree.query(_unit_vectors(lats, lons), k=1)
+        dist = _chord_to_m(chord[:, 0])
+        nodes = self.node_ids[idx[:, 0]]
+        if max_distance_m is not None:
+            nodes = np.where(dist <= max_distance_m, nodes, -1)
+        return (nodes, dist) if return_distance else nodes
+
+    def nearest_edges(
+            self,
+            lats: Sequence[float],
+            lons: Sequence[float],
+            max_distance_m: Optional[float] = None,
+    ) -> EdgeSnapResult:
+        """
+        Proyecta cada punto sobre la arista más cercana (según su geometría).
+
+        Candidatos: primero el segmento con punto medio más cercano da una cota d0; luego
+        se revisan todos los segmentos con punto medio a menos de d0 + media longitud máxima,
+        lo que garantiza encontrar el óptimo (los segmentos largos se partieron al indexar).
+        """
+        if self._segments is None:
+            raise ValueError("El índice se construyó sin aristas (with_edges=False).")
+        seg = self._segments
+        lats, lons = np.atleast_1d(np.asarray(lats, dtype=np.float64)), np.atleast_1d(np.asarray(lons, dtype=np.float64))
+        xyz = _unit_vectors(lats, lons)
+
+        # Cota inicial con el segmento del punto medio más cercano
+        _chord, first = self._segment_tree.query(xyz, k=1)
+        d0, _t = _project(lats, lons, seg, first[:, 0])
+        radius = d0 + self._max_half_segment_m + 1e-6
+        if max_distance_m is not None:
+            radius = np.minimum(radius, max_distance_m + self._max_half_segment_m)
+        candidates = self._segment_tree.query_radius(xyz, r=_m_to_chord(radius))
+
+        n = len(lats)
+        counts = np.fromiter((len(c) for c in candidates), dtype=np.int64, count=n)
+        point_idx = np.repeat(np.arange(n), counts)
+        seg_idx = np.concatenate(candidates).astype(np.int64) if n else np.zeros(0, dtype=np.int64)
+        dist, t = _project(lats[point_idx], lons[point_idx], seg, seg_idx)
+
+        # Mejor candidato por punto
+        best_seg = first[:, 0].copy()
+        best_dist, best_t = _project(lats, lons, seg, best_seg)
+        order = np.lexsort((dist, point_idx))
+        start = np.searchsorted(point_idx[order], np.arange(n))
+        has = counts > 0
+        pick = order[start[has]]
+        better = dist[pick] < best_dist[has]
+        rows = np.flatnonzero(has)[better]
+        best_seg[rows] = seg_idx[pick[better]]
+        best_dist[rows] = dist[pick[better]]
+        best_t[rows] = t[pick[better]]
+
+        edge_u, edge_v, edge_k, edge_len = self._edges
+        e = seg["edge"][best_seg]
+        proj_lat = seg["a_lat"][best_seg] + (seg["b_lat"][best_seg] - seg["a_lat"][best_seg]) * best_t
+        proj_lon = seg["a_lon"][best_seg] + (seg["b_lon"][best_seg] - seg["a_lon"][best_seg]) * best_t
+        along = seg["offset"][best_seg] + seg["length"][best_seg] * best_t
+        fraction = np.where(edge_len[e] > 0, along / np.where(edge_len[e] > 0, edge_len[e], 1.0), 0.0)
+
+        u, v, k = edge_u[e].copy(), edge_v[e].copy(), edge_k[e].copy()
+        if max_distance_m is not None:
+            rejected = best_dist > max_distance_m
+            u[rejected], v[rejected], k[rejected] = -1, -1, -1
+            best_dist = np.where(rejected, np.inf, best_dist)
+        return EdgeSnapResult(u=u, v=v, key=k, fraction=np.clip(fraction, 0.0, 1.0),
+                              lat=proj_lat, lon=proj_lon, distance_m=best_dist)
+
+
+def _haversine_vec(lat1, lon1, lat2, lon2) -> np.ndarray:
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = np.radians(np.asarray(lon2) - np.asarray(lon1))
+    h = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.minimum(1.0, np.sqrt(h)))
+
+
+def _project(lats: np.ndarray, lons: np.ndarray, seg: dict, seg_idx: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Distancia (m) de cada punto a su segmento y parámetro t en [0, 1] de la proyección,
+    en una proyección equirectangular local centrada en el punto (precisa a escala urbana).
+    """
+    k = np.radians(1.0) * EARTH_RADIUS_M
+    cos_lat = np.cos(np.radians(lats))
+    ax = (seg["a_lon"][seg_idx] - lons) * cos_lat * k
+    ay = (seg["a_lat"][seg_idx] - lats) * k
+    bx = (seg["b_lon"][seg_idx] - lons) * cos_lat * k
+    by = (seg["b_lat"][seg_idx] - lats) * k
+    dx, dy = bx - ax, by - ay
+    len2 = dx * dx + dy * dy
+    t = np.where(len2 > 0, -(ax * dx + ay * dy) / np.where(len2 > 0, len2, 1.0), 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    px, py = ax + t * dx, ay + t * dy
+    return np.hypot(px, py), t
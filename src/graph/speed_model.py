@@ -0,0 +1,357 @@
+from __future__ import annotations
+
+# Modelo de velocidad por clase de vía (highway) y, opcionalmente, maxspeed/lanes,
+# ajustado con las aristas muestreadas en Google Routes; reemplaza la velocidad plana
+# (default_speed_kph) en las aristas no muestreadas. Comentarios en español, variables en inglés.
+import json
+import math
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+SPEED_MODEL_FORMAT_VERSION = 1
+MPH_TO_KPH = 1.609344
+UNKNOWN_CLASS = ""
+
+
+# ——— Atributos OSM ———
+
+def _first(value):
+    if isinstance(value, (list, tuple)):
+        return value[0] if value else None
+    return value
+
+
+def normalize_highway(value) -> str:
+    """Clase de vía: primer valor si OSMnx fusionó varias, sin sufijo `_link`."""
+    hw = _first(value)
+    return UNKNOWN_CLASS if hw is None else str(hw).strip().lower().replace("_link", "")
+
+
+def parse_maxspeed(value) -> float:
+    """
+    Límite de velocidad en km/h ('50', '30 mph', '40;60', ['30', '50']); con varios
+    valores toma el menor. Códigos no numéricos ('CO:urban', 'none', 'walk') -> NaN.
+    """
+    items = value if isinstance(value, (list, tuple)) else [value]
+    speeds = []
+    for item in items:
+        if item is None:
+            continue
+        for part in str(item).split(";"):
+            text = part.strip().lower()
+            factor = MPH_TO_KPH if text.endswith("mph") else 1.0
+            text = text.replace("mph", "").replace("km/h", "").replace("kph", "").strip()
+            try:
+                kph = float(text) * factor
+            except ValueError:
+                continue
+            if kph > 0:
+                speeds.append(kph)
+    return min(speeds) if speeds else float("nan")
+
+
+def parse_lanes(value) -> float:
+    """Número de carriles ('2', '2;3', ['2', '3']); con varios valores toma el menor. Inválido -> NaN."""
+    items = value if isinstance(value, (list, tuple)) else [value]
+    lanes = []
+    for item in items:
+        if item is None:
+            continue
+        for part in str(item).split(";"):
+            try:
+                n = float(part.strip())
+            except ValueError:
+                continue
+            if n > 0:
+                lanes.append(n)
+    return min(lanes) if lanes else float("nan")
+
+
+def _lane_bucket(lanes: np.ndarray) -> np.ndarray:
+    """0 = desconocido, 1, 2 y 3 (= tres o más carriles)."""
+    bucket = np.zeros(len(lanes), dtype=np.int8)
+    known = np.isfinite(lanes)
+    bucket[known] = np.clip(np.round(lanes[known]), 1, 3).astype(np.int8)
+    return bucket
+
+
+def _memo(parse, values: Iterable) -> list:
+    """Aplica `parse` una vez por valor distinto (los atributos OSM se repiten mucho)."""
+    cache: dict = {}
+    out = []
+    for value in values:
+        key = tuple(value) if isinstance(value, list) else value
+        try:
+            parsed = cache[key]
+        except KeyError:
+            parsed = cache[key] = parse(value)
+        except TypeError:  # valor no hashable
+            parsed = parse(value)
+        out.append(parsed)
+    return out
+
+
+@dataclass
+class EdgeFeatures:
+    """Atributos de cada arista alineados con los arreglos de build_simple_graph."""
+    highway: np.ndarray       # str (object)
+    maxspeed_kph: np.ndarray  # float64, NaN = sin dato
+    lanes: np.ndarray         # float64, NaN = sin dato
+
+    @classmethod
+    def from_edge_data(cls, edge_data: Sequence[dict]) -> "EdgeFeatures":
+        return cls(
+            highway=np.array(_memo(normalize_highway, (d.get("highway") for d in edge_data)), dtype=object),
+            maxspeed_kph=np.array(_memo(parse_maxspeed, (d.get("maxspeed") for d in edge_data)), dtype=np.float64),
+            lanes=np.array(_memo(parse_lanes, (d.get("lanes") for d in edge_data)), dtype=np.float64),
+        )
+
+    def take(self, idx: np.ndarray) -> "EdgeFeatures":
+        return EdgeFeatures(self.highway[idx], self.maxspeed_kph[idx], self.lanes[idx])
+
+
+# ——— Modelo ———
+
+@dataclass
+class SpeedModel:
+    """
+    Velocidad estimada (m/s) por arista:
+
+        v = v_clase                    (sin maxspeed)
+        v = r_clase * maxspeed         (con maxspeed, si use_maxspeed)
+        v *= f_carriles                (si use_lanes; 1, 2 o 3+ carriles)
+
+    - v_clase es la razón Σlongitud / Σduración de las muestras de la clase, encogida
+      hacia la velocidad global con `prior_weight` muestras equivalentes; las clases sin
+      muestras usan la global.
+    - r_clase es la mediana de velocidad observada / maxspeed, encogida hacia la global.
+    - f_carriles es la mediana del residuo observado / predicho por grupo de carriles.
+
+    fit() calcula además la calidad del ajuste con validación cruzada (`report`).
+    """
+
+    global_speed_mps: float
+    class_speed_mps: Dict[str, float] = field(default_factory=dict)
+    class_samples: Dict[str, int] = field(default_factory=dict)
+    global_maxspeed_ratio: Optional[float] = None
+    class_maxspeed_ratio: Dict[str, float] = field(default_factory=dict)
+    lane_factors: Dict[int, float] = field(default_factory=dict)
+    report: Dict[str, object] = field(default_factory=dict)
+
+    # ——— Ajuste ———
+    @classmethod
+    def fit(
+            cls,
+            features: EdgeFeatures,
+            length_m: np.ndarray,
+            duration_s: np.ndarray,
+            default_speed_kph: float = 25.0,
+            prior_weight: float = 5.0,
+            use_maxspeed: bool = True,
+            use_lanes: bool = True,
+            min_group_samples: int = 5,
+            folds: int = 5,
+    ) -> "SpeedModel":
+        """
+        Ajusta el modelo con muestras (una por arista muestreada) y calcula `report`:
+        error porcentual medio/mediano y RMSE (s) por validación cruzada de `folds`
+        particiones, frente a la velocidad plana `default_speed_kph`.
+        """
+        length_m = np.asarray(length_m, dtype=np.float64)
+        duration_s = np.asarray(duration_s, dtype=np.float64)
+        ok = np.isfinite(length_m) & np.isfinite(duration_s) & (length_m > 0) & (duration_s > 0)
+        features = features.take(np.flatnonzero(ok))
+        length_m, duration_s = length_m[ok], duration_s[ok]
+
+        model = cls._fit_core(features, length_m, duration_s, default_speed_kph, prior_weight,
+                              use_maxspeed, use_lanes, min_group_samples)
+        model.report = model._fit_report(features, length_m, duration_s, default_speed_kph, prior_weight,
+                                         use_maxspeed, use_lanes, min_group_samples, folds)
+        return model
+
+    @classmethod
+    def _fit_core(
+            cls,
+            features: EdgeFeatures,
+            length_m: np.ndarray,
+            duration_s: np.ndarray,
+            default_speed_kph: float,
+            prior_weight: float,
+            use_maxspeed: bool,
+            use_lanes: bool,
+            min_group_samples: int,
+    ) -> "SpeedModel":
+        n = len(length_m)
+        if n == 0:
+            return cls(global_speed_mps=default_speed_kph / 3.6)
+
+        # Ritmo (s/m) global y por clase, encogido hacia el global
+        global_pace = float(duration_s.sum() / length_m.sum())
+        classes, inverse = np.unique(features.highway.astype(str), return_inverse=True)
+        sum_d = np.bincount(inverse, weights=duration_s, minlength=len(classes))
+        sum_l = np.bincount(inverse, weights=length_m, minlength=len(classes))
+        counts = np.bincount(inverse, minlength=len(classes))
+        pace = (counts * (sum_d / sum_l) + prior_weight * global_pace) / (counts + prior_weight)
+        model = cls(
+            global_speed_mps=1.0 / global_pace,
+            class_speed_mps={str(c): float(1.0 / p) for c, p in zip(classes, pace)},
+            class_samples={str(c): int(k) for c, k in zip(classes, counts)},
+        )
+
+        observed = length_m / duration_s
+        if use_maxspeed:
+            has_max = np.isfinite(features.maxspeed_kph)
+            if int(has_max.sum()) >= min_group_samples:
+                ratio = observed[has_max] / (features.maxspeed_kph[has_max] / 3.6)
+                global_ratio = float(np.median(ratio))
+                model.global_maxspeed_ratio = global_ratio
+                hw = features.highway[has_max]
+                for c in np.unique(hw.astype(str)):
+                    r = ratio[hw == c]
+                    model.class_maxspeed_ratio[str(c)] = float(
+                        (len(r) * np.median(r) + prior_weight * global_ratio) / (len(r) + prior_weight)
+                    )
+
+        if use_lanes:
+            bucket = _lane_bucket(features.lanes)
+            residual = observed / model.predict_speed_mps(features)
+            for b in (1, 2, 3):
+                r = residual[bucket == b]
+                if len(r) >= min_group_samples:
+                    model.lane_factors[b] = float((len(r) * np.median(r) + prior_weight) / (len(r) + prior_weight))
+        return model
+
+    def _fit_report(
+            self,
+            features: EdgeFeatures,
+            length_m: np.ndarray,
+            duration_s: np.ndarray,
+            default_speed_kph: float,
+            prior_weight: float,
+            use_maxspeed: bool,
+            use_lanes: bool,
+            min_group_samples: int,
+            folds: int,
+    ) -> Dict[str, object]:
+        n = len(length_m)
+        report: Dict[str, object] = {
+            "samples": n,
+            "classes": {c: {"samples": self.class_samples[c], "speed_kph": round(v * 3.6, 2)}
+                        for c, v in sorted(self.class_speed_mps.items())},
+            "global_speed_kph": round(self.global_speed_mps * 3.6, 2),
+            "maxspeed_ratio": None if self.global_maxspeed_ratio is None else round(self.global_maxspeed_ratio, 3),
+            "lane_factors": {str(b): round(f, 3) for b, f in sorted(self.lane_factors.items())},
+        }
+        if n < 2 * folds or folds < 2:
+            report["cv"] = None
+            return report
+
+        # Validación cruzada: particiones deterministas por posición
+        predicted = np.empty(n, dtype=np.float64)
+        fold_of = np.arange(n) % folds
+        for k in range(folds):
+            test = fold_of == k
+            train = np.flatnonzero(~test)
+            sub = type(self)._fit_core(features.take(train), length_m[train], duration_s[train], default_speed_kph,
+                                       prior_weight, use_maxspeed, use_lanes, min_group_samples)
+            predicted[test] = sub.predict_durations(features.take(np.flatnonzero(test)), length_m[test])
+        baseline = length_m / (default_speed_kph / 3.6)
+        report["cv"] = {"folds": folds, "model": _errors(predicted, duration_s), "flat": _errors(baseline, duration_s)}
+        return report
+
+    # ——— Predicción ———
+    def predict_speed_mps(self, features: EdgeFeatures) -> np.ndarray:
+        """Velocidad estimada (m/s) para cada arista de `features`."""
+        classes, inverse = np.unique(features.highway.astype(str), return_inverse=True)
+        base = np.array([self.class_speed_mps.get(str(c), self.global_speed_mps) for c in classes], dtype=np.float64)
+        speed = base[inverse]
+
+        if self.global_maxspeed_ratio is not None:
+            ratios = np.array([self.class_maxspeed_ratio.get(str(c), self.global_maxspeed_ratio) for c in classes],
+                              dtype=np.float64)
+            has_max = np.isfinite(features.maxspeed_kph)
+            speed = np.where(has_max, ratios[inverse] * features.maxspeed_kph / 3.6, speed)
+
+        if self.lane_factors:
+            lane_table = np.ones(4, dtype=np.float64)
+            for b, f in self.lane_factors.items():
+                lane_table[int(b)] = f
+            speed = speed * lane_table[_lane_bucket(features.lanes)]
+        return speed
+
+    def predict_durations(self, features: EdgeFeatures, length_m: np.ndarray) -> np.ndarray:
+        """Duración estimada (s) = longitud / velocidad estimada, en lote."""
+        return np.asarray(length_m, dtype=np.float64) / self.predict_speed_mps(features)
+
+    # ——— Persistencia (JSON) ———
+    def to_dict(self) -> dict:
+        return {
+            "format_version": SPEED_MODEL_FORMAT_VERSION,
+            "global_speed_mps": self.global_speed_mps,
+            "class_speed_mps": self.class_speed_mps,
+            "class_samples": self.class_samples,
+            "global_maxspeed_ratio": self.global_maxspeed_ratio,
+            "class_maxspeed_ratio": self.class_maxspeed_ratio,
+            "lane_factors": {str(b): f for b, f in self.lane_factors.items()},
+            "report": self.report,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SpeedModel":
+        if data.get("format_version") != SPEED_MODEL_FORMAT_VERSION:
+            raise ValueError(f"Versión de modelo de velocidad no soportada: {data.get('format_version')}")
+        return cls(
+            global_speed_mps=float(data["global_speed_mps"]),
+            class_speed_mps={str(k): float(v) for k, v in data.get("class_speed_mps", {}).items()},
+            class_samples={str(k): int(v) for k, v in data.get("class_samples", {}).items()},
+            global_maxspeed_ratio=data.get("global_maxspeed_ratio"),
+            class_maxspeed_ratio={str(k): float(v) for k, v in data.get("class_maxspeed_ratio", {}).items()},
+            lane_factors={int(k): float(v) for k, v in data.get("lane_factors", {}).items()},
+            report=data.get("report", {}),
+        )
+
+    def save(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(self.to_dict(), fh, ensure_ascii=False, indent=2)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "SpeedModel":
+        with open(path, encoding="utf-8") as fh:
+            return cls.from_dict(json.load(fh))
+
+    def summary(self) -> List[str]:
+        """Líneas legibles con las velocidades por clase y la calidad del ajuste."""
+        lines = [
+            f"[INFO] Modelo de velocidad: {self.report.get('samples', 0)} muestras, "
+            f"global={self.global_speed_mps * 3.6:.1f} km/h"
+        ]
+        classes = ", ".join(f"{c or '?'}={v * 3.6:.1f} ({self.class_samples.get(c, 0)})"
+                            for c, v in sorted(self.class_speed_mps.items()))
+        if classes:
+            lines.append(f"[INFO]   km/h por clase (muestras): {classes}")
+        cv = self.report.get("cv")
+        if cv:
+            m, f = cv["model"], cv["flat"]
+            lines.append(
+                f"[INFO]   validación cruzada ({cv['folds']} particiones): MAPE {m['mape']:.1%} "
+                f"(plano {f['mape']:.1%}), mediana {m['median_ape']:.1%} (plano {f['median_ape']:.1%}), "
+                f"RMSE {m['rmse_s']:.1f}s (plano {f['rmse_s']:.1f}s)"
+            )
+        elif self.report:
+            lines.append("[WARN]   muy pocas muestras para validación cruzada; calidad del ajuste sin estimar")
+        return lines
+
+
+def _errors(predicted: np.ndarray, actual: np.ndarray) -> Dict[str, float]:
+    ape = np.abs(predicted - actual) / actual
+    return {
+        "mape": float(ape.mean()),
+        "median_ape": float(np.median(ape)),
+        "rmse_s": float(math.sqrt(float(np.mean((predicted - actual) ** 2)))),
+        "bias": float(np.mean(predicted - actual) / np.mean(actual)),
+    }
@@ -0,0 +1,567 @@
+from __future__ import annotations
+
+# Almacenamiento del grafo de ruteo en teselas (cuadrícula lat/lon) para regiones grandes:
+# cada tesela es un snapshot CSR en disco con sus nodos frontera, más un grafo overlay
+# (aristas de corte + atajos entre nodos frontera) para viajes largos. Las consultas
+# cargan solo las teselas que necesitan y las frías se expulsan con un presupuesto LRU.
+# Comentarios en español, variables en inglés.
+import heapq
+import json
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra as sparse_dijkstra
+
+from src.graph.csr import CSRGraph
+from src.graph.snapshot import _read_arrays, _write_snapshot, read_snapshot_meta
+from src.graph.spatial_index import SnappingIndex
+from src.observability import metrics
+
+TILE_STORE_FORMAT_VERSION = 1
+DEFAULT_TILE_DEG = 0.05  # ~5.5 km en el ecuador
+MANIFEST_FILE = "manifest.json"
+TILES_DIR = "tiles"
+NODES_DIR = "nodes"
+OVERLAY_DIR = "overlay"
+STAGING_DIR = "_staging"
+MIN_WEIGHT = 1e-9  # scipy.sparse ignora pesos 0: se elevan a este mínimo al calcular atajos
+
+
+def tile_of(lat, lon, tile_deg: float = DEFAULT_TILE_DEG) -> Tuple[np.ndarray, np.ndarray]:
+    """Índices (ix, iy) de la tesela de cada punto: floor(lon / tile_deg), floor(lat / tile_deg)."""
+    ix = np.floor(np.asarray(lon, dtype=np.float64) / tile_deg).astype(np.int32)
+    iy = np.floor(np.asarray(lat, dtype=np.float64) / tile_deg).astype(np.int32)
+    return ix, iy
+
+
+def tile_key(ix: int, iy: int) -> str:
+    return f"{int(ix)}_{int(iy)}"
+
+
+def _csr_with_payload(src: np.ndarray, dst: np.ndarray, w: np.ndarray, payload: np.ndarray,
+                      weight_type: str) -> Tuple[CSRGraph, np.ndarray]:
+    """CSRGraph.from_arrays y un arreglo por arista reordenado igual que las aristas."""
+    node_ids = np.unique(np.concatenate([src, dst]))
+    src_idx = np.searchsorted(node_ids, src)
+    order = np.argsort(src_idx, kind="stable")
+    return CSRGraph.from_arrays(src, dst, w, weight_type=weight_type), payload[order]
+
+
+def _dedupe_edges(src: np.ndarray, dst: np.ndarray, w: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Quita aristas repetidas exactas (u, v, peso); aparecen donde dos lugares se solapan."""
+    if not len(src):
+        return src, dst, w
+    rows = np.empty(len(src), dtype=[("u", np.int64), ("v", np.int64), ("w", np.float64)])
+    rows["u"], rows["v"], rows["w"] = src, dst, w
+    _unique, first = np.unique(rows, return_index=True)
+    first.sort()
+    return src[first], dst[first], w[first]
+
+
+# ——— Construcción ———
+
+class TileStoreBuilder:
+    """
+    Construye un almacén de teselas a partir de uno o varios grafos de ruteo (p. ej. los
+    municipios de Cundinamarca descargados por separado), sin tenerlos todos en memoria:
+    add() deja cada parte en disco (staging) y finalize() arma teselas, nodos frontera y
+    overlay tesela por tesela.
+
+    Ejemplo:
+        builder = TileStoreBuilder("data/tiles/cundinamarca", weight_type="distance")
+        for place in places:
+            G = download_city_graph(place)
+            builder.add(build_simple_graph(url, key, G, as_csr=True), G)
+        builder.finalize()
+    """
+
+    def __init__(self, root: str, tile_deg: float = DEFAULT_TILE_DEG, weight_type: str = "distance"):
+        self.root = os.path.abspath(root)
+        self.tile_deg = float(tile_deg)
+        self.weight_type = weight_type
+        self._staging = os.path.join(self.root, STAGING_DIR)
+        shutil.rmtree(self._staging, ignore_errors=True)
+        os.makedirs(self._staging)
+        self._parts = 0
+
+    def add(self, graph, G) -> None:
+        """Agrega un grafo de ruteo (dict o CSRGraph) con las coordenadas (y/x) de sus nodos en G."""
+        if not isinstance(graph, CSRGraph):
+            graph = CSRGraph.from_adjacency(graph, weight_type=self.weight_type)
+        if graph.weight_type != self.weight_type:
+            raise ValueError(f"weight_type '{graph.weight_type}' != '{self.weight_type}' del almacén")
+        node_ids = graph.node_ids
+        nodes = G.nodes
+        lat = np.fromiter((float(nodes[n]["y"]) for n in node_ids.tolist()), dtype=np.float64, count=len(node_ids))
+        lon = np.fromiter((float(nodes[n]["x"]) for n in node_ids.tolist()), dtype=np.float64, count=len(node_ids))
+        src = np.repeat(node_ids, np.diff(graph.indptr))
+        np.savez(
+            os.path.join(self._staging, f"part_{self._parts:05d}.npz"),
+            node_ids=node_ids, lat=lat, lon=lon,
+            src=src, dst=node_ids[graph.indices], weights=graph.weights,
+        )
+        self._parts += 1
+        print(f"[INFO] Teselas: parte {self._parts} agregada ({graph.num_nodes:,} nodos, {graph.num_edges:,} aristas)")
+
+    def _load_parts(self, names: Sequence[str]) -> Dict[str, np.ndarray]:
+        chunks: Dict[str, List[np.ndarray]] = {name: [] for name in names}
+        for fname in sorted(os.listdir(self._staging)):
+            with np.load(os.path.join(self._staging, fname)) as part:
+                for name in names:
+                    chunks[name].append(part[name])
+        return {name: np.concatenate(arrs) if arrs else np.zeros(0) for name, arrs in chunks.items()}
+
+    def finalize(self) -> dict:
+        """Escribe nodos, teselas, overlay y manifest.json; borra el staging. Devuelve el manifest."""
+        t0 = time.perf_counter()
+        if not self._parts:
+            raise ValueError("No se agregó ningún grafo al almacén de teselas.")
+
+        # 1) Índice global de nodos: ID -> coordenadas y tesela
+        nodes = self._load_parts(("node_ids", "lat", "lon"))
+        node_ids, first = np.unique(nodes["node_ids"].astype(np.int64), return_index=True)
+        lat, lon = nodes["lat"][first], nodes["lon"][first]
+        ix, iy = tile_of(lat, lon, self.tile_deg)
+        cells, node_tile = np.unique(np.column_stack([ix, iy]), axis=0, return_inverse=True)
+        node_tile = node_tile.reshape(-1).astype(np.int32)
+        del nodes
+
+        # 2) Aristas agrupadas por la tesela de su origen
+        edges = self._load_parts(("src", "dst", "weights"))
+        src, dst, w = _dedupe_edges(edges["src"].astype(np.int64), edges["dst"].astype(np.int64), edges["weights"])
+        del edges
+        src_tile = node_tile[np.searchsorted(node_ids, src)]
+        dst_tile = node_tile[np.searchsorted(node_ids, dst)]
+        cut = src_tile != dst_tile
+        entries_all = np.unique(dst[cut])  # reciben una arista desde otra tesela
+        exits_all = np.unique(src[cut])    # salen hacia otra tesela
+
+        tiles_dir = os.path.join(self.root, TILES_DIR)
+        os.makedirs(tiles_dir, exist_ok=True)
+        order = np.argsort(src_tile, kind="stable")
+        bounds = np.searchsorted(src_tile[order], np.arange(len(cells) + 1))
+        tiles_meta = []
+        sc_src, sc_dst, sc_w, sc_tile = [], [], [], []
+        for tid in range(len(cells)):
+            sel = order[bounds[tid]:bounds[tid + 1]]
+            own = node_ids[node_tile == tid]
+            entries = own[np.isin(own, entries_all, assume_unique=True)]
+            exits = own[np.isin(own, exits_all, assume_unique=True)]
+            key = tile_key(*cells[tid])
+            if len(sel):
+                graph = CSRGraph.from_arrays(src[sel], dst[sel], w[sel], weight_type=self.weight_type)
+            else:
+                graph = CSRGraph(own, np.zeros(len(own) + 1, dtype=np.int64), np.zeros(0, dtype=np.int32),
+                                 np.zeros(0, dtype=np.float64), weight_type=self.weight_type)
+            _write_snapshot(
+                os.path.join(tiles_dir, key),
+                {"node_ids": graph.node_ids, "indptr": graph.indptr, "indices": graph.indices,
+                 "weights": graph.weights, "entries": entries, "exits": exits},
+                {"kind": "tile", "key": key, "tile_id": tid, "weight_type": self.weight_type},
+            )
+            # Atajos entrada -> salida dentro de la tesela (solo aristas internas)
+            inner = sel[~cut[sel]]
+            s, d, c = self._shortcuts(own, src[inner], dst[inner], w[inner], entries, exits)
+            sc_src.append(s)
+            sc_dst.append(d)
+            sc_w.append(c)
+            sc_tile.append(np.full(len(s), tid, dtype=np.int32))
+            tiles_meta.append({
+                "key": key, "ix": int(cells[tid][0]), "iy": int(cells[tid][1]),
+                "nodes": int(len(own)), "edges": int(len(sel)),
+                "entries": int(len(entries)), "exits": int(len(exits)), "shortcuts": int(len(s)),
+                "bytes": int(graph.memory_bytes() + entries.nbytes + exits.nbytes),
+            })
+
+        # 3) Overlay: aristas de corte + atajos; payload = tesela del atajo (-1 = arista real)
+        o_src = np.concatenate([src[cut]] + sc_src)
+        o_dst = np.concatenate([dst[cut]] + sc_dst)
+        o_w = np.concatenate([w[cut]] + sc_w)
+        o_tile = np.concatenate([np.full(int(cut.sum()), -1, dtype=np.int32)] + sc_tile)
+        if len(o_src):
+            overlay, via_tile = _csr_with_payload(o_src, o_dst, o_w, o_tile, self.weight_type)
+        else:
+            overlay = CSRGraph(np.zeros(0, dtype=np.int64), np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32),
+                               np.zeros(0, dtype=np.float64), weight_type=self.weight_type)
+            via_tile = np.zeros(0, dtype=np.int32)
+        _write_snapshot(
+            os.path.join(self.root, OVERLAY_DIR),
+            {"node_ids": overlay.node_ids, "indptr": overlay.indptr, "indices": overlay.indices,
+             "weights": overlay.weights, "via_tile": via_tile},
+            {"kind": "overlay", "weight_type": self.weight_type},
+        )
+        _write_snapshot(
+            os.path.join(self.root, NODES_DIR),
+            {"node_ids": node_ids, "lat": lat, "lon": lon, "tile": node_tile},
+            {"kind": "tile_nodes"},
+        )
+
+        manifest = {
+            "version": TILE_STORE_FORMAT_VERSION,
+            "created": time.time(),
+            "tile_deg": self.tile_deg,
+            "weight_type": self.weight_type,
+            "parts": self._parts,
+            "nodes": int(len(node_ids)),
+            "edges": int(len(src)),
+            "cut_edges": int(cut.sum()),
+            "overlay_nodes": overlay.num_nodes,
+            "overlay_edges": overlay.num_edges,
+            "tiles": tiles_meta,
+        }
+        tmp = os.path.join(self.root, f"{MANIFEST_FILE}.tmp-{os.getpid()}")
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(manifest, fh, ensure_ascii=False, indent=1)
+        os.replace(tmp, os.path.join(self.root, MANIFEST_FILE))
+        shutil.rmtree(self._staging, ignore_errors=True)
+        print(
+            f"[INFO] Almacén de teselas listo en {self.root}: {len(cells)} teselas, {len(node_ids):,} nodos, "
+            f"{len(src):,} aristas, overlay {overlay.num_nodes:,} nodos / {overlay.num_edges:,} aristas "
+            f"({time.perf_counter() - t0:.1f}s)"
+        )
+        return manifest
+
+    @staticmethod
+    def _shortcuts(own: np.ndarray, src: np.ndarray, dst: np.ndarray, w: np.ndarray,
+                   entries: np.ndarray, exits: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Distancias mínimas internas de cada nodo de entrada a cada nodo de salida."""
+        empty = (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float64))
+        if not len(entries) or not len(exits) or not len(src):
+            return empty
+        n = len(own)
+        u = np.searchsorted(own, src)
+        v = np.searchsorted(own, dst)
+        # Paralelas: la más barata (csr_matrix sumaría los duplicados)
+        keys = u.astype(np.int64) * n + v
+        order = np.lexsort((w, keys))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = keys[order][1:] != keys[order][:-1]
+        pick = order[first]
+        matrix = csr_matrix((np.maximum(w[pick], MIN_WEIGHT), (u[pick], v[pick])), shape=(n, n))
+        dist = sparse_dijkstra(matrix, directed=True, indices=np.searchsorted(own, entries))
+        dist = dist[:, np.searchsorted(own, exits)]
+        ei, xi = np.nonzero(np.isfinite(dist))
+        keep = entries[ei] != exits[xi]
+        return entries[ei][keep], exits[xi][keep], dist[ei, xi][keep]
+
+
+def build_region_store(
+        places: Iterable[str],
+        root: str,
+        weight_type: str = "distance",
+        tile_deg: float = DEFAULT_TILE_DEG,
+        network_type: str = "drive",
+        google_maps_api_url: str = "",
+        google_api_key: str = "",
+        **build_kwargs,
+) -> dict:
+    """
+    Descarga (con caché) cada lugar, construye su grafo de ruteo y lo agrega al almacén;
+    cada grafo se libera antes de pasar al siguiente. build_kwargs van a build_simple_graph.
+    """
+    from src.graph.builder import build_simple_graph
+    from src.graph.downloader import download_city_graph
+
+    builder = TileStoreBuilder(root, tile_deg=tile_deg, weight_type=weight_type)
+    for place in places:
+        G = download_city_graph(place, network_type=network_type, use_cache=True)
+        graph = build_simple_graph(google_maps_api_url, google_api_key, G, weight_type=weight_type,
+                                   as_csr=True, **build_kwargs)
+        builder.add(graph, G)
+        del G, graph
+    return builder.finalize()
+
+
+# ——— Consultas ———
+
+@dataclass
+class _LoadedTile:
+    graph: CSRGraph
+    entries: np.ndarray
+    exits: np.ndarray
+    nbytes: int
+
+
+class TiledGraphStore:
+    """
+    Almacén de teselas abierto para consultas.
+
+    - Índice global de nodos (ID, lat/lon, tesela) y overlay: snapshots con mmap.
+    - Teselas: se cargan en RAM al usarse y se expulsan las menos usadas (LRU) cuando la
+      suma supera `memory_budget_mb`; las teselas de una consulta en curso no se expulsan.
+    - route(s, t, mode):
+        "corridor": solo las teselas del rectángulo s-t (más `corridor_margin` teselas
+          alrededor). Es aproximado si el camino mínimo sale del corredor; si no hay
+          camino dentro, se repite con el overlay.
+        "overlay": teselas de s y t + overlay (aristas de corte y atajos entrada->salida
+          de cada tesela). Exacto; los atajos se expanden cargando su tesela.
+        "auto": corredor si abarca <= `max_corridor_tiles` teselas; si no, overlay.
+    - Es invocable con la firma de dijkstra (`dijkstra_fn`); el argumento graph se ignora.
+    """
+
+    def __init__(
+            self,
+            root: str,
+            memory_budget_mb: float = 512.0,
+            corridor_margin: int = 1,
+            max_corridor_tiles: int = 16,
+    ):
+        self.root = os.path.abspath(root)
+        with open(os.path.join(self.root, MANIFEST_FILE), encoding="utf-8") as fh:
+            self.manifest = json.load(fh)
+        if self.manifest.get("version") != TILE_STORE_FORMAT_VERSION:
+            raise ValueError(f"Versión de almacén de teselas incompatible en {self.root}")
+        self.tile_deg = float(self.manifest["tile_deg"])
+        self.weight_type = self.manifest["weight_type"]
+        self.memory_budget_bytes = int(memory_budget_mb * 1024 * 1024)
+        self.corridor_margin = corridor_margin
+        self.max_corridor_tiles = max_corridor_tiles
+
+        tiles = self.manifest["tiles"]
+        self._tile_keys = [t["key"] for t in tiles]
+        self._tile_by_cell = {(t["ix"], t["iy"]): i for i, t in enumerate(tiles)}
+
+        nodes_dir = os.path.join(self.root, NODES_DIR)
+        nodes = _read_arrays(nodes_dir, read_snapshot_meta(nodes_dir), mmap=True)
+        self.node_ids, self.lat, self.lon, self.node_tile = nodes["node_ids"], nodes["lat"], nodes["lon"], nodes["tile"]
+        overlay_dir = os.path.join(self.root, OVERLAY_DIR)
+        o = _read_arrays(overlay_dir, read_snapshot_meta(overlay_dir), mmap=True)
+        self.overlay = CSRGraph(o["node_ids"], o["indptr"], o["indices"], o["weights"], weight_type=self.weight_type)
+        self._via_tile = o["via_tile"]
+
+        self._lock = threading.Lock()
+        self._tiles: "OrderedDict[int, _LoadedTile]" = OrderedDict()
+        self._pins: Dict[int, int] = {}
+        self._resident_bytes = 0
+        self._snapping_index: Optional[SnappingIndex] = None
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+        self.load_seconds = 0.0
+
+    # ——— Nodos y teselas ———
+    def tile_id(self, node_id: int) -> int:
+        i = int(np.searchsorted(self.node_ids, node_id))
+        if i >= len(self.node_ids) or int(self.node_ids[i]) != int(node_id):
+            raise KeyError(node_id)
+        return int(self.node_tile[i])
+
+    def corridor_tiles(self, source: int, target: int, margin: Optional[int] = None) -> List[int]:
+        """Teselas existentes en el rectángulo de las teselas de s y t, ampliado en `margin`."""
+        margin = self.corridor_margin if margin is None else margin
+        tiles = self.manifest["tiles"]
+        a, b = tiles[self.tile_id(source)], tiles[self.tile_id(target)]
+        out = []
+        for ix in range(min(a["ix"], b["ix"]) - margin, max(a["ix"], b["ix"]) + margin + 1):
+            for iy in range(min(a["iy"], b["iy"]) - margin, max(a["iy"], b["iy"]) + margin + 1):
+                tid = self._tile_by_cell.get((ix, iy))
+                if tid is not None:
+                    out.append(tid)
+        return out
+
+    def snapping_index(self) -> SnappingIndex:
+        """KD-tree sobre todos los nodos del almacén (se construye una vez)."""
+        with self._lock:
+            if self._snapping_index is None:
+                self._snapping_index = SnappingIndex(self.node_ids, self.lat, self.lon)
+            return self._snapping_index
+
+    # ——— Caché LRU de teselas ———
+    def _acquire(self, tile_ids: Iterable[int]) -> List[int]:
+        """Carga (si hace falta) y fija las teselas; devuelve la lista para _release."""
+        tile_ids = list(dict.fromkeys(int(t) for t in tile_ids))
+        for tid in tile_ids:
+            with self._lock:
+                self._pins[tid] = self._pins.get(tid, 0) + 1
+                if tid in self._tiles:
+                    self._tiles.move_to_end(tid)
+                    self.hits += 1
+                    metrics.inc("tile_cache_total", result="hit")
+                    continue
+            tile = self._read_tile(tid)
+            with self._lock:
+                if tid not in self._tiles:
+                    self._tiles[tid] = tile
+                    self._resident_bytes += tile.nbytes
+                self._evict_locked()
+        return tile_ids
+
+    def _release(self, tile_ids: Iterable[int]) -> None:
+        with self._lock:
+            for tid in tile_ids:
+                left = self._pins.get(tid, 0) - 1
+                if left > 0:
+                    self._pins[tid] = left
+                else:
+                    self._pins.pop(tid, None)
+            self._evict_locked()
+
+    def _evict_locked(self) -> None:
+        for tid in list(self._tiles):
+            if self._resident_bytes <= self.memory_budget_bytes:
+                break
+            if tid in self._pins:
+                continue
+            tile = self._tiles.pop(tid)
+            self._resident_bytes -= tile.nbytes
+            self.evictions += 1
+            metrics.inc("tile_cache_total", result="evict")
+
+    def _read_tile(self, tid: int) -> _LoadedTile:
+        t0 = time.perf_counter()
+        directory = os.path.join(self.root, TILES_DIR, self._tile_keys[tid])
+        a = _read_arrays(directory, read_snapshot_meta(directory), mmap=False)
+        graph = CSRGraph(a["node_ids"], a["indptr"], a["indices"], a["weights"], weight_type=self.weight_type)
+        tile = _LoadedTile(graph, a["entries"], a["exits"],
+                           int(graph.memory_bytes() + a["entries"].nbytes + a["exits"].nbytes))
+        elapsed = time.perf_counter() - t0
+        with self._lock:
+            self.loads += 1
+            self.load_seconds += elapsed
+        metrics.inc("tile_cache_total", result="miss")
+        metrics.observe("tile_load_seconds", elapsed)
+        return tile
+
+    # ——— Búsqueda ———
+    def _search(self, source: int, target: int, tile_ids: Set[int], use_overlay: bool,
+                stats: Optional[dict] = None) -> Tuple[List[Tuple[int, int]], float]:
+        """
+        Dijkstra sobre las teselas cargadas `tile_ids` (aristas reales de cada nodo en su
+        tesela) y, con use_overlay, sobre el overlay para nodos de teselas no cargadas.
+
+        Returns:
+            ([(nodo, tesela del atajo usado para llegar a él o -1), ...], costo)
+        """
+        with self._lock:
+            tiles = {tid: self._tiles[tid].graph for tid in tile_ids}
+        node_ids, node_tile = self.node_ids, self.node_tile
+        overlay, via_tile = self.overlay, self._via_tile
+        inf = float("inf")
+
+        cost = {source: 0.0}
+        previous: Dict[int, Tuple[int, int]] = {}
+        visited = set()
+        queue = [(0.0, source)]
+        while queue:
+            current_cost, u = heapq.heappop(queue)
+            if u in visited:
+                continue
+            visited.add(u)
+            if u == target:
+                break
+
+            graph = tiles.get(int(node_tile[np.searchsorted(node_ids, u)]))
+            payload = None
+            if graph is None:
+                if not use_overlay:
+                    continue
+                graph = overlay
+            i = int(np.searchsorted(graph.node_ids, u))
+            if i >= graph.num_nodes or int(graph.node_ids[i]) != u:
+                continue
+            lo, hi = int(graph.indptr[i]), int(graph.indptr[i + 1])
+            nbrs = graph.node_ids[graph.indices[lo:hi]].tolist()
+            weights = graph.weights[lo:hi].tolist()
+            if graph is overlay:
+                payload = via_tile[lo:hi].tolist()
+            for k, (v, w) in enumerate(zip(nbrs, weights)):
+                new_cost = current_cost + w
+                if new_cost < cost.get(v, inf):
+                    cost[v] = new_cost
+                    previous[v] = (u, payload[k] if payload is not None else -1)
+                    heapq.heappush(queue, (new_cost, v))
+
+        if stats is not None:
+            stats["settled"] = stats.get("settled", 0) + len(visited)
+        if target not in visited:
+            return [(source, -1)], inf
+        hops = []
+        node = target
+        while node != source:
+            prev, via = previous[node]
+            hops.append((node, via))
+            node = prev
+        hops.append((source, -1))
+        return hops[::-1], cost[target]
+
+    def route(self, source: int, target: int, mode: str = "auto",
+              stats: Optional[dict] = None) -> Tuple[List[int], float]:
+        """Camino (IDs OSM) y costo entre dos nodos del almacén; ver la clase para los modos."""
+        if mode not in ("auto", "corridor", "overlay"):
+            raise ValueError("mode debe ser 'auto', 'corridor' u 'overlay'")
+        source, target = int(source), int(target)
+        t0 = time.perf_counter()
+        if mode == "auto":
+            corridor = self.corridor_tiles(source, target)
+            mode = "corridor" if len(corridor) <= self.max_corridor_tiles else "overlay"
+
+        used = mode
+        if mode == "corridor":
+            pinned = self._acquire(self.corridor_tiles(source, target))
+            try:
+                hops, total = self._search(source, target, set(pinned), use_overlay=False, stats=stats)
+            finally:
+                self._release(pinned)
+            if not np.isfinite(total) and source != target:
+                used = "overlay"
+        if used == "overlay":
+            pinned = self._acquire([self.tile_id(source), self.tile_id(target)])
+            try:
+                hops, total = self._search(source, target, set(pinned), use_overlay=True, stats=stats)
+            finally:
+                self._release(pinned)
+
+        path = self._expand(hops, stats)
+        if stats is not None:
+            stats["mode"] = used
+        metrics.observe("tile_route_seconds", time.perf_counter() - t0, mode=used)
+        return path, total
+
+    def _expand(self, hops: List[Tuple[int, int]], stats: Optional[dict]) -> List[int]:
+        """Reemplaza cada atajo del overlay por su camino dentro de la tesela."""
+        path = [hops[0][0]]
+        for (a, _), (b, via) in zip(hops[:-1], hops[1:]):
+            if via < 0:
+                path.append(b)
+                continue
+            pinned = self._acquire([via])
+            try:
+                inner, _cost = self._search(a, b, {via}, use_overlay=False, stats=stats)
+            finally:
+                self._release(pinned)
+            path.extend(node for node, _ in inner[1:])
+        return path
+
+    def __call__(self, graph, source, target, weight_type="distance", stats=None):
+        path, total_cost = self.route(source, target, stats=stats)
+        print(f"[INFO] Shortest path computed based on {weight_type} (tiles).")
+        return path, total_cost
+
+    # ——— Estado ———
+    def metrics(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.loads
+            return {
+                "tiles": len(self._tile_keys),
+                "tiles_resident": len(self._tiles),
+                "resident_mb": round(self._resident_bytes / 1024 / 1024, 2),
+                "budget_mb": round(self.memory_budget_bytes / 1024 / 1024, 2),
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+                "load_seconds": round(self.load_seconds, 3),
+                "overlay_edges": self.overlay.num_edges,
+            }
+
+    def __repr__(self) -> str:
+        m = self.manifest
+        return (f"TiledGraphStore(root={self.root!r}, tiles={len(self._tile_keys)}, nodes={m['nodes']}, "
+                f"edges={m['edges']}, weight_type={self.weight_type!r})")
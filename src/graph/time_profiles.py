@@ -0,0 +1,375 @@
+from __future__ import annotations
+
+# Perfiles de peso por franja horaria (15 min x 7 días) para ruteo dependiente del tiempo.
+# Cada arista del CSR apunta a un perfil (fila de factores multiplicativos sobre su peso
+# base); los perfiles por clase de vía salen de una curva estimada y se refinan con
+# muestras de Google Routes con departureTime. Comentarios en español, variables en inglés.
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from src.api.routes_batch import fetch_route_durations
+from src.graph.csr import CSRGraph
+
+SLOT_MINUTES = 15
+SLOT_SECONDS = SLOT_MINUTES * 60
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES   # 96
+NUM_SLOTS = 7 * SLOTS_PER_DAY             # 672 franjas por semana (lunes 00:00 = 0)
+WEEK_SECONDS = NUM_SLOTS * SLOT_SECONDS
+TD_FORMAT_VERSION = 1
+
+# Bogotá no tiene horario de verano: UTC-5 fijo
+LOCAL_TZ = timezone(timedelta(hours=-5), "America/Bogota")
+
+# Amplitud del pico de congestión por clase de vía (factor máximo ≈ 1 + amplitud).
+# Es una estimación inicial; fit_samples la reemplaza donde haya muestras.
+PEAK_AMPLITUDE = {
+    "motorway": 1.0,
+    "trunk": 1.0,
+    "primary": 0.9,
+    "secondary": 0.7,
+    "tertiary": 0.5,
+    "unclassified": 0.3,
+    "residential": 0.2,
+    "living_street": 0.1,
+}
+DEFAULT_AMPLITUDE = 0.3
+
+# Franjas muestreadas por defecto: un martes (representa lunes-viernes) cada hora clave
+# y un sábado (representa el fin de semana). 16 consultas por arista.
+DEFAULT_SAMPLE_SLOTS: Tuple[int, ...] = tuple(
+    [1 * SLOTS_PER_DAY + h * 4 for h in (0, 5, 6, 7, 8, 9, 11, 13, 15, 17, 18, 19, 21)]
+    + [5 * SLOTS_PER_DAY + h * 4 for h in (8, 12, 17)]
+)
+
+Departure = Union[datetime, str, float, int, None]
+
+
+def to_local_datetime(departure: Departure = None) -> datetime:
+    """
+    Normaliza la hora de salida a datetime con zona de Bogotá.
+    Acepta datetime (ingenuo = hora local), ISO 8601, epoch en segundos o None (ahora).
+    """
+    if departure is None:
+        return datetime.now(LOCAL_TZ)
+    if isinstance(departure, (int, float)):
+        return datetime.fromtimestamp(float(departure), LOCAL_TZ)
+    if isinstance(departure, str):
+        departure = datetime.fromisoformat(departure.strip().replace("Z", "+00:00"))
+    if departure.tzinfo is None:
+        return departure.replace(tzinfo=LOCAL_TZ)
+    return departure.astimezone(LOCAL_TZ)
+
+
+def week_seconds(departure: Departure = None) -> float:
+    """Segundos desde el lunes 00:00 (hora local) de la semana de `departure`."""
+    dt = to_local_datetime(departure)
+    return dt.weekday() * 86400 + dt.hour * 3600 + dt.minute * 60 + dt.second + dt.microsecond / 1e6
+
+
+def slot_of(departure: Departure = None) -> int:
+    """Franja semanal (0..671) de `departure`."""
+    return int(week_seconds(departure) // SLOT_SECONDS) % NUM_SLOTS
+
+
+def next_occurrence(slot: int, now: Optional[datetime] = None) -> datetime:
+    """Próxima fecha (local, futura) cuyo inicio de franja es `slot`; Google exige departureTime futuro."""
+    now = to_local_datetime(now)
+    monday = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+    candidate = monday + timedelta(seconds=int(slot) * SLOT_SECONDS)
+    if candidate <= now + timedelta(minutes=5):
+        candidate += timedelta(days=7)
+    return candidate
+
+
+def congestion_curve(amplitude: float) -> np.ndarray:
+    """
+    Curva semanal de factores (NUM_SLOTS,) con picos de mañana y tarde en días hábiles
+    y congestión menor el fin de semana. Estimación paramétrica, no medición.
+    """
+    slots = np.arange(NUM_SLOTS)
+    day = slots // SLOTS_PER_DAY
+    hour = (slots % SLOTS_PER_DAY + 0.5) * SLOT_MINUTES / 60.0
+
+    def bump(center: float, width: float) -> np.ndarray:
+        return np.exp(-0.5 * ((hour - center) / width) ** 2)
+
+    weekday = bump(7.25, 1.1) + 0.85 * bump(18.0, 1.3) + 0.35 * bump(13.0, 1.5)
+    saturday = 0.45 * bump(12.5, 2.5)
+    sunday = 0.25 * bump(13.5, 3.0)
+    shape = np.where(day < 5, weekday, np.where(day == 5, saturday, sunday))
+    return (1.0 + amplitude * shape).astype(np.float32)
+
+
+def _edge_highway(G, u: int, v: int) -> str:
+    data = G.get_edge_data(u, v) or G.get_edge_data(v, u) or {}
+    if not data:
+        return ""
+    d = min(data.values(), key=lambda a: float(a.get("length", float("inf"))))
+    hw = d.get("highway", "")
+    if isinstance(hw, (list, tuple)):
+        hw = hw[0] if hw else ""
+    return str(hw).replace("_link", "")
+
+
+class TimeDependentGraph:
+    """
+    Grafo de duraciones dependiente de la hora de salida.
+
+    - csr: CSRGraph con el peso base de cada arista (segundos).
+    - profile_ids (E,) int32: perfil de cada arista; las primeras filas son los
+      perfiles por clase de vía (`class_names`) y las siguientes, perfiles propios
+      de aristas muestreadas.
+    - factors (P, NUM_SLOTS) float32: factor multiplicativo por franja; entre
+      inicios de franja se interpola linealmente (ETA continua).
+    - class_ids (E,) int16: clase de vía de cada arista (para refinar con muestras).
+
+    Memoria: 6 bytes por arista más 2,7 KB por perfil.
+    """
+
+    weight_type = "duration"
+
+    def __init__(
+            self,
+            csr: CSRGraph,
+            class_ids: np.ndarray,
+            profile_ids: np.ndarray,
+            factors: np.ndarray,
+            class_names: Sequence[str],
+    ):
+        if csr.weight_type != "duration":
+            raise ValueError("TimeDependentGraph requiere un CSRGraph en modo 'duration'.")
+        if factors.shape[1] != NUM_SLOTS:
+            raise ValueError(f"factors debe tener {NUM_SLOTS} columnas.")
+        self.csr = csr
+        self.class_ids = np.asarray(class_ids, dtype=np.int16)
+        self.profile_ids = np.asarray(profile_ids, dtype=np.int32)
+        self.factors = np.asarray(factors, dtype=np.float32)
+        self.class_names = list(class_names)
+        self.revision = 0  # sube con cada fit_samples (cachés derivadas)
+        self._prepare_query_lists()
+
+    def _prepare_query_lists(self) -> None:
+        """Listas Python por nodo [(vecino, peso_base, perfil)] para la búsqueda."""
+        ptr = self.csr.indptr.tolist()
+        ind, wts, pid = self.csr.indices.tolist(), self.csr.weights.tolist(), self.profile_ids.tolist()
+        self._adj = [list(zip(ind[ptr[i]:ptr[i + 1]], wts[ptr[i]:ptr[i + 1]], pid[ptr[i]:ptr[i + 1]]))
+                     for i in range(len(ptr) - 1)]
+        self._rows = self.factors.tolist()
+        self._ids = self.csr.node_ids.tolist()
+        self._index = {node: i for i, node in enumerate(self._ids)}
+
+    # ——— Construcción ———
+    @classmethod
+    def from_graph(cls, G, csr: CSRGraph, amplitudes: Optional[Dict[str, float]] = None) -> "TimeDependentGraph":
+        """
+        Asigna a cada arista del CSR (salida de build_simple_graph en modo 'duration')
+        el perfil estimado de su clase de vía en G (`highway`).
+        """
+        t0 = time.perf_counter()
+        amplitudes = {**PEAK_AMPLITUDE, **(amplitudes or {})}
+        ids = csr.node_ids.tolist()
+        src = np.repeat(np.arange(csr.num_nodes), np.diff(csr.indptr)).tolist()
+        dst = csr.indices.tolist()
+
+        class_index: Dict[str, int] = {}
+        class_ids = np.empty(csr.num_edges, dtype=np.int16)
+        for e, (a, b) in enumerate(zip(src, dst)):
+            hw = _edge_highway(G, ids[a], ids[b])
+            class_ids[e] = class_index.setdefault(hw, len(class_index))
+        class_names = list(class_index)
+        factors = np.vstack([congestion_curve(amplitudes.get(hw, DEFAULT_AMPLITUDE)) for hw in class_names]) \
+            if class_names else np.ones((1, NUM_SLOTS), dtype=np.float32)
+
+        tdg = cls(csr, class_ids, class_ids.astype(np.int32), factors, class_names or [""])
+        print(
+            f"[INFO] Perfiles horarios: {len(class_names)} clases de vía, {csr.num_edges:,} aristas, "
+            f"{tdg.memory_bytes() / 1e6:.1f} MB, {time.perf_counter() - t0:.1f}s"
+        )
+        return tdg
+
+    def _positions(self, u: int, v: int) -> np.ndarray:
+        a = self.csr.index_of(u)
+        b = self.csr.index_of(v)
+        lo, hi = self.csr.indptr[a], self.csr.indptr[a + 1]
+        return lo + np.flatnonzero(self.csr.indices[lo:hi] == b)
+
+    def fit_samples(
+            self,
+            samples: Dict[Tuple[int, int], Dict[int, float]],
+            replicate_days: bool = True,
+            min_edges_per_class: int = 3,
+            decimals: int = 2,
+    ) -> Dict[str, int]:
+        """
+        Incorpora duraciones muestreadas {(u, v): {franja: segundos}}.
+
+        - Cada arista muestreada recibe su propio perfil: razón muestra / peso base en las
+          franjas muestreadas e interpolación circular en el resto.
+        - Con replicate_days, una muestra de lunes-viernes vale para los cinco días hábiles
+          a la misma hora, y una de sábado o domingo, para ambos.
+        - Las clases de vía con al menos `min_edges_per_class` aristas muestreadas
+          reemplazan su curva estimada por la mediana de las curvas muestreadas, así que
+          también mejoran las aristas no muestreadas de esa clase.
+        - Los perfiles se redondean a `decimals` y se deduplican.
+        """
+        all_slots = np.arange(NUM_SLOTS)
+        curves_by_class: Dict[int, List[np.ndarray]] = {}
+        edge_curves: List[Tuple[np.ndarray, np.ndarray]] = []
+        skipped = 0
+
+        for (u, v), by_slot in samples.items():
+            try:
+                pos = self._positions(u, v)
+            except KeyError:
+                pos = np.zeros(0, dtype=np.int64)
+            base = float(self.csr.weights[pos].min()) if len(pos) else 0.0
+            points = {int(s) % NUM_SLOTS: float(d) / base for s, d in by_slot.items()
+                      if d is not None and d > 0 and base > 0}
+            if not points:
+                skipped += 1
+                continue
+            if replicate_days:
+                for s, r in list(points.items()):
+                    day, tod = divmod(s, SLOTS_PER_DAY)
+                    for other in (range(5) if day < 5 else (5, 6)):
+                        points.setdefault(other * SLOTS_PER_DAY + tod, r)
+            xs = np.array(sorted(points), dtype=np.float64)
+            ys = np.array([points[int(x)] for x in xs], dtype=np.float64)
+            curve = np.interp(all_slots, xs, ys, period=NUM_SLOTS).astype(np.float32)
+            edge_curves.append((pos, curve))
+            curves_by_class.setdefault(int(self.class_ids[pos[0]]), []).append(curve)
+
+        factors = self.factors.copy()
+        refined = 0
+        for cls_id, curves in curves_by_class.items():
+            if len(curves) >= min_edges_per_class:
+                factors[cls_id] = np.median(np.vstack(curves), axis=0)
+                refined += 1
+
+        # Perfiles propios deduplicados (las clases conservan sus filas 0..C-1 y los
+        # perfiles de llamadas anteriores se mantienen)
+        num_classes = len(self.class_names)
+        rows = [factors[i] for i in range(len(factors))]
+        seen: Dict[bytes, int] = {rows[i].tobytes(): i for i in range(num_classes, len(rows))}
+        new_profiles = 0
+        profile_ids = self.profile_ids.copy()
+        for pos, curve in edge_curves:
+            q = np.round(curve, decimals).astype(np.float32)
+            key = q.tobytes()
+            if key not in seen:
+                seen[key] = len(rows)
+                rows.append(q)
+                new_profiles += 1
+            profile_ids[pos] = seen[key]
+
+        self.factors = np.vstack(rows).astype(np.float32)
+        self.profile_ids = profile_ids
+        self.revision += 1
+        self._prepare_query_lists()
+        summary = {"edges": len(edge_curves), "profiles": new_profiles, "classes_refined": refined, "skipped": skipped}
+        print(
+            f"[INFO] Muestras horarias: {summary['edges']} aristas, {summary['profiles']} perfiles propios, "
+            f"{refined} clases refinadas, {skipped} omitidas"
+        )
+        return summary
+
+    # ——— Pesos ———
+    def factor_at(self, profile_id: int, seconds_of_week: float) -> float:
+        tau = (seconds_of_week % WEEK_SECONDS) / SLOT_SECONDS
+        i = int(tau)
+        frac = tau - i
+        row = self._rows[profile_id]
+        return row[i] + (row[(i + 1) % NUM_SLOTS] - row[i]) * frac
+
+    def snapshot_at(self, departure: Departure = None) -> CSRGraph:
+        """CSRGraph estático con los pesos de la franja de `departure` (p. ej. para CH/ALT por franja)."""
+        tau = week_seconds(departure) / SLOT_SECONDS
+        i = int(tau) % NUM_SLOTS
+        frac = tau - int(tau)
+        f = self.factors[:, i] + (self.factors[:, (i + 1) % NUM_SLOTS] - self.factors[:, i]) * frac
+        return self.csr.with_weights(self.csr.weights * f[self.profile_ids])
+
+    def path_travel_time(self, path: Sequence[int], departure: Departure = None) -> float:
+        """Segundos para recorrer `path` (IDs OSM) saliendo en `departure` (toma la arista más rápida)."""
+        t = week_seconds(departure)
+        elapsed = 0.0
+        for u, v in zip(path[:-1], path[1:]):
+            a, b = self._index[u], self._index[v]
+            now = t + elapsed
+            elapsed += min(w * self.factor_at(p, now) for y, w, p in self._adj[a] if y == b)
+        return elapsed
+
+    def memory_bytes(self) -> int:
+        return int(self.class_ids.nbytes + self.profile_ids.nbytes + self.factors.nbytes)
+
+    # ——— Persistencia ———
+    def save(self, path: str) -> str:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez_compressed(
+            path,
+            version=np.array(TD_FORMAT_VERSION),
+            node_ids=self.csr.node_ids,
+            indptr=self.csr.indptr,
+            indices=self.csr.indices,
+            weights=self.csr.weights,
+            class_ids=self.class_ids,
+            profile_ids=self.profile_ids,
+            factors=self.factors,
+            class_names=np.array(self.class_names),
+        )
+        print(f"[INFO] Perfiles horarios guardados en: {path}")
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "TimeDependentGraph":
+        with np.load(path) as data:
+            if int(data["version"]) != TD_FORMAT_VERSION:
+                raise ValueError(f"Versión de perfiles horarios incompatible en {path}")
+            csr = CSRGraph(data["node_ids"], data["indptr"], data["indices"], data["weights"], weight_type="duration")
+            return cls(csr, data["class_ids"], data["profile_ids"], data["factors"],
+                       [str(x) for x in data["class_names"]])
+
+    def __repr__(self) -> str:
+        return (
+            f"TimeDependentGraph(nodes={self.csr.num_nodes:,}, edges={self.csr.num_edges:,}, "
+            f"profiles={len(self.factors)}, classes={len(self.class_names)})"
+        )
+
+
+def sample_edge_durations(
+        G,
+        edges: Iterable[Tuple[int, int]],
+        google_maps_api_url: str,
+        google_api_key: str,
+        slots: Sequence[int] = DEFAULT_SAMPLE_SLOTS,
+        traffic_model: str = "BEST_GUESS",
+        now: Optional[datetime] = None,
+        **fetch_kwargs,
+) -> Dict[Tuple[int, int], Dict[int, float]]:
+    """
+    Duraciones de Google Routes por arista y franja, consultando con departureTime en
+    la próxima ocurrencia de cada franja. Hace len(edges) x len(slots) consultas,
+    con el cliente concurrente de build_simple_graph (fetch_kwargs: concurrency,
+    rate_limit_per_sec, max_retries, backoff_base).
+    """
+    requests_by_key = {}
+    for u, v in edges:
+        nu, nv = G.nodes[u], G.nodes[v]
+        requests_by_key[(u, v)] = (float(nu["y"]), float(nu["x"]), float(nv["y"]), float(nv["x"]))
+
+    samples: Dict[Tuple[int, int], Dict[int, float]] = {k: {} for k in requests_by_key}
+    for slot in slots:
+        departure = next_occurrence(slot, now).astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+        fetched = fetch_route_durations(
+            google_maps_api_url, google_api_key, requests_by_key,
+            departure_time=departure, traffic_model=traffic_model, **fetch_kwargs,
+        )
+        for key, dur in fetched.items():
+            if dur is not None and dur > 0:
+                samples[key][int(slot)] = float(dur)
+    print(f"[INFO] Muestreo horario: {len(requests_by_key)} aristas x {len(slots)} franjas")
+    return {k: v for k, v in samples.items() if v}
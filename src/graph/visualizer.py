@@ -1,23 +1,31 @@
 # Render interactivo con GeoPandas.explore
 
 # Comentarios en español, variables en inglés.
+import json
 import os
 import geopandas as gpd
+import numpy as np
 import osmnx as ox
 from shapely.geometry import Point
 
+from src.observability import metrics
+
 def plot_route_explore_compliant(
         G,
         route_nodes,
         save_path="data/outputs/route_map.html",
         show_network=False,
         network_padding_deg=0.01,
+        context=None,
 ):
     """
     Render interactivo con GeoPandas.explore SIN fijar zoom inicial.
     - No usa helpers deprecados de OSMnx.
     - Crea un mapa base vacío con .explore() (sin centrar/zoom manual),
       agrega capas, y al final hace fit_bounds a la ruta.
+    - Solo convierte la red completa a GeoDataFrames si show_network=True; con
+      `context` (GraphContext) reutiliza los GeoDataFrames ya calculados.
+    - Cada etapa se mide en `render_stage_seconds` (route_gdf, network, layers, save).
     """
 
     if not route_nodes or len(route_nodes) < 2:
@@ -25,20 +33,27 @@ def plot_route_explore_compliant(
 
     os.makedirs(os.path.dirname(save_path), exist_ok=True)
 
-    # 1) Grafo -> GeoDataFrames
-    nodes_all, edges_all = ox.graph_to_gdfs(G, nodes=True, edges=True)
+    # 1) Grafo -> GeoDataFrames (solo si se van a usar; cacheados en el contexto)
+    def _graph_gdfs():
+        if context is not None:
+            return context.nodes_gdf, context.edges_gdf
+        return ox.graph_to_gdfs(G, nodes=True, edges=True)
 
     # 2) Ruta -> GeoDataFrames (firma cambia según versión de OSMnx)
-    r = ox.routing.route_to_gdf(G, route_nodes)
-    if isinstance(r, tuple) and len(r) == 2:
-        route_nodes_gdf, route_edges_gdf = r
-    else:
-        route_edges_gdf = r
-        idx = [n for n in route_nodes if n in nodes_all.index]
-        route_nodes_gdf = nodes_all.loc[idx].copy()
-        if "geometry" not in route_nodes_gdf.columns or route_nodes_gdf.geometry.isna().any():
-            route_nodes_gdf["geometry"] = [Point(G.nodes[n]["x"], G.nodes[n]["y"]) for n in idx]
-            route_nodes_gdf = gpd.GeoDataFrame(route_nodes_gdf, geometry="geometry", crs=nodes_all.crs)
+    with metrics.span("render_stage_seconds", renderer="explore", stage="route_gdf"):
+        r = ox.routing.route_to_gdf(G, route_nodes)
+        if isinstance(r, tuple) and len(r) == 2:
+            route_nodes_gdf, route_edges_gdf = r
+        else:
+            route_edges_gdf = r
+            # Nodos de la ruta directamente desde G (sin convertir todo el grafo)
+            idx = list(dict.fromkeys(n for n in route_nodes if n in G.nodes))
+            route_nodes_gdf = gpd.GeoDataFrame(
+                {"osmid": idx},
+                geometry=[Point(G.nodes[n]["x"], G.nodes[n]["y"]) for n in idx],
+                index=idx,
+                crs=route_edges_gdf.crs,
+            )
 
     # 3) Construir polilínea en [lat, lon] para encuadre final sin confusiones
     latlngs = [[float(G.nodes[n]["y"]), float(G.nodes[n]["x"])] for n in route_nodes]
@@ -48,53 +63,275 @@ def plot_route_explore_compliant(
     east  = max(p[1] for p in latlngs)
 
     # 4) (Opcional) recorte de red alrededor de la ruta para aligerar el HTML
-    edges_clip = edges_all
-    if show_network:
-        min_lat = south - network_padding_deg
-        max_lat = north + network_padding_deg
-        min_lon = west  - network_padding_deg
-        max_lon = east  + network_padding_deg
-        # GeoPandas.cx usa lon,lat en ese orden:
-        edges_clip = edges_all.cx[min_lon:max_lon, min_lat:max_lat]
+    with metrics.span("render_stage_seconds", renderer="explore", stage="network"):
+        edges_clip = route_edges_gdf
+        if show_network:
+            _nodes_all, edges_all = _graph_gdfs()
+            min_lat = south - network_padding_deg
+            max_lat = north + network_padding_deg
+            min_lon = west  - network_padding_deg
+            max_lon = east  + network_padding_deg
+            # GeoPandas.cx usa lon,lat en ese orden:
+            edges_clip = edges_all.cx[min_lon:max_lon, min_lat:max_lat]
 
     # 5) Crear mapa base con .explore() sin fijar zoom/centro (clave para “como antes”)
     #    Mapa vacío/ligero como base:
-    base_empty = edges_clip.head(0)  # GDF vacío con el mismo CRS
-    m = base_empty.explore(tiles="CartoDB positron", name="Base")
+    with metrics.span("render_stage_seconds", renderer="explore", stage="layers"):
+        base_empty = edges_clip.head(0)  # GDF vacío con el mismo CRS
+        m = base_empty.explore(tiles="CartoDB positron", name="Base")
+
+        # 6) Capas: red (opcional), ruta, origen/destino/intermedios
+        if show_network and not edges_clip.empty:
+            edges_clip.explore(
+                m=m,
+                name="Street network",
+                style_kwds={"weight": 1, "opacity": 0.25},
+            )
 
-    # 6) Capas: red (opcional), ruta, origen/destino/intermedios
-    if show_network and not edges_clip.empty:
-        edges_clip.explore(
+        route_edges_gdf.explore(
             m=m,
-            name="Street network",
-            style_kwds={"weight": 1, "opacity": 0.25},
+            name="Route",
+            color="red",
+            style_kwds={"weight": 5, "opacity": 0.9},
         )
 
-    route_edges_gdf.explore(
-        m=m,
-        name="Route",
-        color="red",
-        style_kwds={"weight": 5, "opacity": 0.9},
-    )
-
-    if not route_nodes_gdf.empty:
-        first_id = route_nodes[0]
-        last_id  = route_nodes[-1]
-        if first_id in route_nodes_gdf.index:
-            route_nodes_gdf.loc[[first_id]].explore(
-                m=m, name="Origin", color="green", marker_kwds={"radius": 6}
-            )
-        if last_id in route_nodes_gdf.index:
-            route_nodes_gdf.loc[[last_id]].explore(
-                m=m, name="Destination", color="black", marker_kwds={"radius": 6}
-            )
-        inter_ids = [n for n in route_nodes[1:-1] if n in route_nodes_gdf.index]
-        if inter_ids:
-            route_nodes_gdf.loc[inter_ids].explore(
-                m=m, name="Route nodes", color="red", marker_kwds={"radius": 3}
-            )
+        if not route_nodes_gdf.empty:
+            first_id = route_nodes[0]
+            last_id  = route_nodes[-1]
+            if first_id in route_nodes_gdf.index:
+                route_nodes_gdf.loc[[first_id]].explore(
+                    m=m, name="Origin", color="green", marker_kwds={"radius": 6}
+                )
+            if last_id in route_nodes_gdf.index:
+                route_nodes_gdf.loc[[last_id]].explore(
+                    m=m, name="Destination", color="black", marker_kwds={"radius": 6}
+                )
+            inter_ids = [n for n in route_nodes[1:-1] if n in route_nodes_gdf.index]
+            if inter_ids:
+                route_nodes_gdf.loc[inter_ids].explore(
+                    m=m, name="Route nodes", color="red", marker_kwds={"radius": 3}
+                )
 
     # 7) Encadrar a la ruta (bounds en [lat, lon]) y guardar
     m.fit_bounds([[south, west], [north, east]])
-    m.save(save_path)
+    with metrics.span("render_stage_seconds", renderer="explore", stage="save"):
+        m.save(save_path)
+    return save_path
+
+
+# ——— Render rápido (folium/GeoJSON directo, sin GeoDataFrames de toda la ciudad) ———
+
+ROUTE_COLORS = ["#e41a1c", "#377eb8", "#4daf4a", "#984ea3", "#ff7f00", "#a65628", "#f781bf", "#999999"]
+
+
+def route_latlngs(G, route_nodes, precision=6):
+    """
+    Polilínea [[lat, lon], ...] de una ruta siguiendo la `geometry` de cada arista
+    (la de menor `length` entre u y v); sin geometry usa las coordenadas de los nodos.
+    """
+    coords = []
+    for u, v in zip(route_nodes[:-1], route_nodes[1:]):
+        data = G.get_edge_data(u, v) or G.get_edge_data(v, u)
+        pts = None
+        if data:
+            d = min(data.values(), key=lambda a: float(a.get("length", float("inf"))))
+            geom = d.get("geometry")
+            if geom is not None:
+                pts = [(y, x) for x, y in geom.coords]
+                # Orientar la geometría de u hacia v
+                ux, uy = float(G.nodes[u]["x"]), float(G.nodes[u]["y"])
+                d_first = (pts[0][0] - uy) ** 2 + (pts[0][1] - ux) ** 2
+                d_last = (pts[-1][0] - uy) ** 2 + (pts[-1][1] - ux) ** 2
+                if d_last < d_first:
+                    pts.reverse()
+        if pts is None:
+            pts = [(float(G.nodes[u]["y"]), float(G.nodes[u]["x"])), (float(G.nodes[v]["y"]), float(G.nodes[v]["x"]))]
+        if coords:
+            pts = pts[1:]  # el primer punto ya está (fin del tramo anterior)
+        coords.extend([round(float(lat), precision), round(float(lon), precision)] for lat, lon in pts)
+    if not coords and route_nodes:
+        n = route_nodes[0]
+        coords = [[float(G.nodes[n]["y"]), float(G.nodes[n]["x"])]]
+    return coords
+
+
+class NetworkBackground:
+    """
+    Red vial simplificada para el fondo de los mapas, calculada una vez por grafo.
+
+    Guarda las polilíneas como coordenadas planas + offsets y el bbox de cada una,
+    de modo que recortar a la zona de las rutas es una operación vectorizada.
+    """
+
+    def __init__(self, coords, offsets, bbox, num_nodes=0, num_edges=0):
+        self.coords = coords      # (m, 2) lat, lon
+        self.offsets = offsets    # (k+1,)
+        self.bbox = bbox          # (k, 4) min_lat, min_lon, max_lat, max_lon
+        self.num_nodes = num_nodes
+        self.num_edges = num_edges
+
+    @classmethod
+    def build(cls, G, tolerance_m=5.0, highways=None):
+        """
+        Simplifica (Douglas-Peucker, shapely) cada arista una sola vez por par {u, v}.
+
+        Args:
+            tolerance_m: tolerancia de simplificación en metros.
+            highways: si se da, solo incluye esas clases de `highway` (p. ej. vías principales).
+        """
+        import shapely
+        from shapely.geometry import LineString
+
+        seen, lines = set(), []
+        for u, v, d in G.edges(data=True):
+            pair = (u, v) if u <= v else (v, u)
+            if pair in seen:
+                continue
+            if highways is not None:
+                hw = d.get("highway")
+                hw = hw if isinstance(hw, list) else [hw]
+                if not any(h in highways for h in hw):
+                    continue
+            seen.add(pair)
+            geom = d.get("geometry")
+            if geom is None:
+                geom = LineString([(G.nodes[u]["x"], G.nodes[u]["y"]), (G.nodes[v]["x"], G.nodes[v]["y"])])
+            lines.append(geom)
+
+        simplified = shapely.simplify(np.array(lines, dtype=object), tolerance_m / 111_320.0)
+        coords, index = shapely.get_coordinates(simplified, return_index=True)
+        counts = np.bincount(index, minlength=len(lines))
+        offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        latlon = np.round(coords[:, ::-1], 5)
+        bounds = shapely.bounds(simplified)  # minx, miny, maxx, maxy
+        bbox = bounds[:, [1, 0, 3, 2]]
+        return cls(latlon, offsets, bbox, G.number_of_nodes(), G.number_of_edges())
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        np.savez_compressed(path, coords=self.coords, offsets=self.offsets, bbox=self.bbox,
+                            num_nodes=np.array(self.num_nodes), num_edges=np.array(self.num_edges))
+        return path
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["coords"], data["offsets"], data["bbox"], int(data["num_nodes"]), int(data["num_edges"]))
+
+    @classmethod
+    def load_or_build(cls, G, path, **build_kwargs):
+        """Reutiliza el fondo en disco si corresponde al grafo (mismo número de nodos/aristas)."""
+        if path and os.path.exists(path):
+            try:
+                bg = cls.load(path)
+                if (bg.num_nodes, bg.num_edges) == (G.number_of_nodes(), G.number_of_edges()):
+                    return bg
+            except (OSError, ValueError, KeyError):
+                print(f"[WARN] No se pudo leer el fondo en caché: {path}. Se reconstruirá.")
+        bg = cls.build(G, **build_kwargs)
+        if path:
+            bg.save(path)
+        return bg
+
+    def clip(self, south, west, north, east):
+        """Polilíneas [[lat, lon], ...] cuyo bbox intersecta la ventana dada."""
+        b = self.bbox
+        sel = np.flatnonzero((b[:, 0] <= north) & (b[:, 2] >= south) & (b[:, 1] <= east) & (b[:, 3] >= west))
+        return [self.coords[self.offsets[i]:self.offsets[i + 1]].tolist() for i in sel]
+
+
+def _routes_bounds(polylines):
+    lats = [p[0] for line in polylines for p in line]
+    lons = [p[1] for line in polylines for p in line]
+    return min(lats), min(lons), max(lats), max(lons)
+
+
+def write_routes_geojson(G, routes, save_path="data/outputs/routes.geojson", properties=None):
+    """
+    Escribe las rutas como FeatureCollection GeoJSON (LineString en lon, lat).
+
+    Args:
+        routes: lista de rutas (listas de IDs de nodos).
+        properties: lista opcional de dicts con propiedades por ruta (p. ej. costo).
+
+    Las rutas con menos de 2 nodos (p. ej. `[source]` de un par sin camino) se escriben
+    con geometry null, así cada feature conserva el índice de su ruta y sus propiedades.
+    """
+    features = []
+    for i, route_nodes in enumerate(routes):
+        route_nodes = list(route_nodes or [])
+        props = {
+            "route": i,
+            "origin": int(route_nodes[0]) if route_nodes else None,
+            "destination": int(route_nodes[-1]) if route_nodes else None,
+        }
+        if properties:
+            props.update(properties[i])
+        geometry = None
+        if len(route_nodes) >= 2:
+            line = route_latlngs(G, route_nodes)
+            geometry = {"type": "LineString", "coordinates": [[lon, lat] for lat, lon in line]}
+        features.append({"type": "Feature", "geometry": geometry, "properties": props})
+    os.makedirs(os.path.dirname(os.path.abspath(save_path)), exist_ok=True)
+    with open(save_path, "w", encoding="utf-8") as fh:
+        json.dump({"type": "FeatureCollection", "features": features}, fh, separators=(",", ":"))
+    return save_path
+
+
+def plot_routes_fast(
+        G,
+        routes,
+        save_path="data/outputs/route_map.html",
+        background=None,
+        network_padding_deg=0.01,
+        labels=None,
+):
+    """
+    Render rápido de una o varias rutas con folium, sin GeoDataFrames ni .explore().
+
+    - Cada ruta es una polilínea (geometry de las aristas) con marcadores de origen/destino.
+    - `background` (NetworkBackground) agrega la red simplificada recortada alrededor
+      de las rutas como una sola capa ligera.
+    - Útil para resultados en lote: todas las rutas quedan en el mismo mapa.
+
+    Returns:
+        str: ruta del HTML guardado.
+    """
+    import folium
+
+    # Se conserva el índice original de cada ruta para que etiqueta y color no se corran
+    # cuando se descartan rutas de menos de 2 nodos
+    kept = [(i, r) for i, r in enumerate(routes) if r and len(r) >= 2]
+    if not kept:
+        raise ValueError("Ruta muy corta para dibujar (>=2 nodos).")
+    os.makedirs(os.path.dirname(os.path.abspath(save_path)), exist_ok=True)
+
+    with metrics.span("render_stage_seconds", renderer="fast", stage="route_geometry"):
+        polylines = [route_latlngs(G, r) for _i, r in kept]
+        south, west, north, east = _routes_bounds(polylines)
+
+    m = folium.Map(tiles="CartoDB positron", control_scale=True)
+
+    if background is not None:
+        with metrics.span("render_stage_seconds", renderer="fast", stage="network"):
+            lines = background.clip(south - network_padding_deg, west - network_padding_deg,
+                                     north + network_padding_deg, east + network_padding_deg)
+        if lines:
+            folium.PolyLine(lines, color="#555555", weight=1, opacity=0.35, name="Street network").add_to(m)
+
+    for (i, _route_nodes), line in zip(kept, polylines):
+        color = ROUTE_COLORS[i % len(ROUTE_COLORS)] if len(kept) > 1 else "red"
+        label = labels[i] if labels else f"Route {i + 1}"
+        layer = folium.FeatureGroup(name=label)
+        folium.PolyLine(line, color=color, weight=5, opacity=0.9, tooltip=label).add_to(layer)
+        folium.CircleMarker(line[0], radius=6, color="green", fill=True, tooltip="Origin").add_to(layer)
+        folium.CircleMarker(line[-1], radius=6, color="black", fill=True, tooltip="Destination").add_to(layer)
+        layer.add_to(m)
+
+    if len(kept) > 1 or background is not None:
+        folium.LayerControl().add_to(m)
+    m.fit_bounds([[south, west], [north, east]])
+    with metrics.span("render_stage_seconds", renderer="fast", stage="save"):
+        m.save(save_path)
     return save_path
@@ -0,0 +1,277 @@
+from __future__ import annotations
+
+# Registro de métricas en proceso: contadores, histogramas y spans de tiempo por
+# etapa, exportables en texto Prometheus y como líneas JSON. Desactivado, cada
+# llamada retorna de inmediato (un if y un objeto nulo compartido).
+# Comentarios en español, variables en inglés.
+#
+# Activación por entorno:
+#   ROUTING_METRICS=1                  -> habilita el registro global
+#   ROUTING_METRICS_JSONL=ruta.jsonl   -> además escribe cada span como una línea JSON
+import bisect
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+# Buckets (segundos) pensados para etapas de ruteo: de sub-milisegundo a decenas de segundos
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: dict) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape_label_value(value: str) -> str:
+    """Escapa barra invertida, comillas y saltos de línea (formato de exposición de Prometheus)."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    inner = ",".join(f'{k}="{_escape_label_value(v)}"' for k, v in items)
+    return "{" + inner + "}"
+
+
+class Histogram:
+    """Histograma acumulativo estilo Prometheus (buckets fijos, suma y conteo)."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # último = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Cuantil aproximado (límite superior del bucket que lo contiene)."""
+        if not self.count:
+            return 0.0
+        rank, acc = q * self.count, 0
+        for i, c in enumerate(self.counts):
+            acc += c
+            if acc >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+class _NullSpan:
+    """Span que no hace nada: lo que devuelve span() con las métricas desactivadas."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("registry", "name", "labels", "t0")
+
+    def __init__(self, registry: "MetricsRegistry", name: str, labels: dict):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+        self.t0 = 0.0
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.t0
+        if exc_type is not None:
+            self.labels = {**self.labels, "error": exc_type.__name__}
+        self.registry.observe(self.name, elapsed, **self.labels)
+        self.registry._log_span(self.name, self.labels, elapsed)
+        return False
+
+
+class MetricsRegistry:
+    """
+    Contadores e histogramas con etiquetas, seguros entre hilos.
+
+    - inc(name, value=1, **labels): contador monotónico.
+    - observe(name, value, **labels): muestra en un histograma.
+    - span(name, **labels): context manager que mide la duración del bloque
+      (en segundos) en el histograma `name`; si el bloque lanza una excepción
+      se etiqueta con error=<tipo>.
+
+    Con enabled=False todas las operaciones retornan sin registrar nada.
+    """
+
+    def __init__(self, enabled: bool = True, jsonl_path: Optional[str] = None,
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[LabelKey, float]] = {}
+        self._histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._jsonl = None
+        self.jsonl_path = None
+        if jsonl_path:
+            self.set_jsonl_path(jsonl_path)
+
+    @classmethod
+    def from_env(cls) -> "MetricsRegistry":
+        env = os.environ
+        enabled = env.get("ROUTING_METRICS", "").strip().lower() in ("1", "true", "yes")
+        return cls(enabled=enabled, jsonl_path=env.get("ROUTING_METRICS_JSONL") or None)
+
+    # ------------------------------------------------------------------ registro
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        if not self.enabled:
+            return
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            hist = series.get(key)
+            if hist is None:
+                hist = series[key] = Histogram(self.buckets)
+            hist.observe(float(value))
+
+    def span(self, name: str, **labels):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name, labels)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    # ---------------------------------------------------------------- JSON lines
+    def set_jsonl_path(self, path: Optional[str]) -> None:
+        """Escribe cada span terminado como una línea JSON en `path` (None = desactiva)."""
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.close()
+                self._jsonl = None
+            self.jsonl_path = path
+            if path:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self._jsonl = open(path, "a", encoding="utf-8", buffering=1)
+
+    def _log_span(self, name: str, labels: dict, seconds: float) -> None:
+        if self._jsonl is None:
+            return
+        line = json.dumps({"ts": round(time.time(), 6), "metric": name, "labels": labels,
+                           "seconds": round(seconds, 6)}, ensure_ascii=False, default=str)
+        with self._lock:
+            if self._jsonl is not None:
+                self._jsonl.write(line + "\n")
+
+    # -------------------------------------------------------------- exportación
+    def snapshot(self) -> dict:
+        """Copia serializable: {"counters": {...}, "histograms": {...}} con etiquetas como dict."""
+        with self._lock:
+            counters = {
+                name: [{"labels": dict(k), "value": v} for k, v in series.items()]
+                for name, series in self._counters.items()
+            }
+            histograms = {
+                name: [
+                    {
+                        "labels": dict(k),
+                        "count": h.count,
+                        "sum": round(h.sum, 6),
+                        "p50": h.quantile(0.5),
+                        "p90": h.quantile(0.9),
+                        "p99": h.quantile(0.99),
+                    }
+                    for k, h in series.items()
+                ]
+                for name, series in self._histograms.items()
+            }
+        return {"counters": counters, "histograms": histograms}
+
+    def to_json_lines(self) -> str:
+        """Una línea JSON por serie (contadores e histogramas), con marca de tiempo."""
+        ts = round(time.time(), 3)
+        snap = self.snapshot()
+        lines = []
+        for name, series in snap["counters"].items():
+            for s in series:
+                lines.append(json.dumps({"ts": ts, "type": "counter", "metric": name, **s}, ensure_ascii=False))
+        for name, series in snap["histograms"].items():
+            for s in series:
+                lines.append(json.dumps({"ts": ts, "type": "histogram", "metric": name, **s}, ensure_ascii=False))
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def export_prometheus(self) -> str:
+        """Formato de texto de exposición de Prometheus (version 0.0.4)."""
+        out = []
+        with self._lock:
+            for name in sorted(self._counters):
+                out.append(f"# TYPE {name} counter")
+                for key, value in sorted(self._counters[name].items()):
+                    out.append(f"{name}{_format_labels(key)} {value:g}")
+            for name in sorted(self._histograms):
+                out.append(f"# TYPE {name} histogram")
+                for key, h in sorted(self._histograms[name].items()):
+                    acc = 0
+                    for bound, c in zip(h.buckets, h.counts):
+                        acc += c
+                        out.append(f"{name}_bucket{_format_labels(key, ('le', f'{bound:g}'))} {acc}")
+                    out.append(f"{name}_bucket{_format_labels(key, ('le', '+Inf'))} {h.count}")
+                    out.append(f"{name}_sum{_format_labels(key)} {h.sum:.6f}")
+                    out.append(f"{name}_count{_format_labels(key)} {h.count}")
+        return "\n".join(out) + "\n"
+
+
+# Registro global usado por la instrumentación del pipeline
+REGISTRY = MetricsRegistry.from_env()
+
+
+def get_registry() -> MetricsRegistry:
+    return REGISTRY
+
+
+def enable(jsonl_path: Optional[str] = None) -> MetricsRegistry:
+    """Activa el registro global en tiempo de ejecución (p. ej. desde el servicio o un CLI)."""
+    REGISTRY.enabled = True
+    if jsonl_path:
+        REGISTRY.set_jsonl_path(jsonl_path)
+    return REGISTRY
+
+
+def disable() -> None:
+    REGISTRY.enabled = False
+
+
+def span(name: str, **labels):
+    return REGISTRY.span(name, **labels)
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    REGISTRY.inc(name, value, **labels)
+
+
+def observe(name: str, value: float, **labels) -> None:
+    REGISTRY.observe(name, value, **labels)
@@ -0,0 +1,363 @@
+from __future__ import annotations
+
+# Ruteo en lote: lee pares origen/destino (CSV o Parquet) en streaming, geocodifica y
+# ajusta al grafo por bloques, reparte las búsquedas en un pool de procesos y escribe
+# los resultados de forma incremental con checkpoints reanudables.
+# Comentarios en español, variables en inglés.
+#
+# Uso:
+#   python -m src.routing.batch jobs.csv results.csv --place "Bogotá, Colombia" --processes 8
+#   python -m src.routing.batch jobs.parquet results.csv --resume --with-path
+import argparse
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, Iterator, Optional, Sequence
+
+import numpy as np
+
+from src.algorithms.dijkstra import dijkstra_one_to_many
+
+try:  # Parquet es opcional
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - depende del entorno
+    pq = None
+
+OUTPUT_FIELDS = ["id", "origin_node", "dest_node", "cost", "num_nodes", "status"]
+
+# Grafo cargado una sola vez por proceso del pool (igual que en matrix.py)
+_WORKER_GRAPH = None
+
+
+def _init_worker(graph) -> None:
+    global _WORKER_GRAPH
+    _WORKER_GRAPH = graph
+
+
+def _route_group(graph, origin: int, dests: Sequence[int], with_path: bool):
+    """Una búsqueda uno-a-muchos por origen: [(costo, num_nodos, camino|None), ...] alineado con dests."""
+    costs, previous = dijkstra_one_to_many(graph, origin, dests)
+    out = []
+    for d in dests:
+        c = costs.get(d, float("inf"))
+        if not np.isfinite(c):
+            out.append((c, 0, None))
+            continue
+        path = [d]
+        while path[-1] != origin:
+            path.append(previous[path[-1]])
+        path.reverse()
+        out.append((c, len(path), path if with_path else None))
+    return out
+
+
+def _worker_groups(groups, with_path: bool, graph=None):
+    graph = _WORKER_GRAPH if graph is None else graph
+    return [_route_group(graph, o, ds, with_path) for o, ds in groups]
+
+
+# ——— Lectura en streaming ———
+def iter_job_blocks(path: str, block_size: int, skip_rows: int = 0) -> Iterator[list[dict]]:
+    """
+    Devuelve bloques de filas (dicts) sin cargar el archivo completo.
+    CSV con csv.DictReader; Parquet con pyarrow (iter_batches), si está instalado.
+    """
+    if path.lower().endswith((".parquet", ".pq")):
+        if pq is None:
+            raise ImportError("Leer Parquet requiere pyarrow (pip install pyarrow).")
+        pf = pq.ParquetFile(path)
+        skipped = 0
+        for batch in pf.iter_batches(batch_size=block_size):
+            rows = batch.to_pylist()
+            if skipped < skip_rows:
+                take = min(len(rows), skip_rows - skipped)
+                rows, skipped = rows[take:], skipped + take
+            if rows:
+                yield rows
+        return
+
+    with open(path, newline="", encoding="utf-8") as fh:
+        reader = csv.DictReader(fh)
+        for _ in range(skip_rows):
+            if next(reader, None) is None:
+                return
+        block = []
+        for row in reader:
+            block.append(row)
+            if len(block) >= block_size:
+                yield block
+                block = []
+        if block:
+            yield block
+
+
+def _float_or_none(value) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    try:
+        f = float(str(value).strip().replace(",", "."))
+    except ValueError:
+        return None
+    return f if np.isfinite(f) else None
+
+
+class BatchRouter:
+    """
+    Procesa un archivo de trabajos con columnas:
+      - id (opcional; si falta se usa el número de fila),
+      - origin / destination (direcciones) o
+        origin_lat, origin_lng, dest_lat, dest_lng (coordenadas; tienen prioridad).
+
+    Escribe un CSV con OUTPUT_FIELDS (+ path si with_path) y un checkpoint
+    `<salida>.checkpoint.json` tras cada bloque; con resume=True retoma desde ahí.
+    """
+
+    def __init__(
+            self,
+            context,
+            graph_simple,
+            geocoder=None,
+            google_api_key: Optional[str] = None,
+            processes: Optional[int] = None,
+            block_size: int = 5_000,
+            groups_per_task: int = 64,
+            geocode_concurrency: int = 16,
+            max_snap_distance_m: Optional[float] = None,
+            with_path: bool = False,
+    ):
+        self.context = context
+        self.graph = graph_simple
+        self.geocoder = geocoder
+        self.google_api_key = google_api_key
+        self.processes = processes or os.cpu_count() or 1
+        self.block_size = block_size
+        self.groups_per_task = groups_per_task
+        self.geocode_concurrency = geocode_concurrency
+        self.max_snap_distance_m = max_snap_distance_m
+        self.with_path = with_path
+
+    # ——— Geocodificación y ajuste en lote ———
+    def _geocode_many(self, addresses: Sequence[str]) -> Dict[str, tuple]:
+        if not addresses:
+            return {}
+        if self.geocoder is None or not self.google_api_key:
+            raise ValueError("Hay direcciones en la entrada: se requiere geocoder y Google API key.")
+        bounds = self.context.bounds
+
+        def _one(addr):
+            try:
+                return self.geocoder(self.google_api_key, addr, bounds=bounds)
+            except Exception as e:  # un error de red no debe tumbar el lote completo
+                print(f"[WARN] Geocodificación falló para '{addr}': {e}")
+                return None, None
+
+        with ThreadPoolExecutor(max_workers=self.geocode_concurrency) as ex:
+            return dict(zip(addresses, ex.map(_one, addresses)))
+
+    def _snap_block(self, rows: list[dict]):
+        """Devuelve (origin_nodes, dest_nodes, status) alineados con rows; -1 = sin nodo."""
+        n = len(rows)
+        lat = np.full(2 * n, np.nan)
+        lng = np.full(2 * n, np.nan)
+        need = set()
+        for i, row in enumerate(rows):
+            for side, (kl, kg, ka) in enumerate([("origin_lat", "origin_lng", "origin"),
+                                                 ("dest_lat", "dest_lng", "destination")]):
+                la, lo = _float_or_none(row.get(kl)), _float_or_none(row.get(kg))
+                if la is not None and lo is not None:
+                    lat[2 * i + side], lng[2 * i + side] = la, lo
+                elif row.get(ka):
+                    need.add(str(row[ka]))
+
+        geocoded = self._geocode_many(sorted(need))
+        for i, row in enumerate(rows):
+            for side, ka in enumerate(("origin", "destination")):
+                if np.isnan(lat[2 * i + side]) and row.get(ka):
+                    la, lo = geocoded.get(str(row[ka]), (None, None))
+                    if la is not None and lo is not None:
+                        lat[2 * i + side], lng[2 * i + side] = la, lo
+
+        nodes = np.full(2 * n, -1, dtype=np.int64)
+        ok = ~np.isnan(lat)
+        if ok.any():
+            nodes[ok] = self.context.snapping_index.nearest_nodes(
+                lat[ok], lng[ok], max_distance_m=self.max_snap_distance_m
+            )
+        origin_nodes, dest_nodes = nodes[0::2], nodes[1::2]
+        status = np.where(ok[0::2] & ok[1::2], "ok", "geocode_failed").astype(object)
+        status[(status == "ok") & ((origin_nodes < 0) | (dest_nodes < 0))] = "snap_failed"
+        return origin_nodes, dest_nodes, status
+
+    # ——— Ruteo del bloque en el pool ———
+    def _route_block(self, pool, origin_nodes, dest_nodes, status):
+        by_origin: Dict[int, dict] = {}
+        for o, d, st in zip(origin_nodes.tolist(), dest_nodes.tolist(), status):
+            if st == "ok":
+                by_origin.setdefault(o, {})[d] = None  # dict como conjunto ordenado
+        groups = [(o, list(ds)) for o, ds in by_origin.items()]
+        # Bloques de a lo sumo groups_per_task orígenes, pero al menos uno por proceso
+        per_task = max(1, min(self.groups_per_task, -(-len(groups) // self.processes)))
+        chunks = [groups[i:i + per_task] for i in range(0, len(groups), per_task)]
+        if pool is None:
+            results = [_worker_groups(c, self.with_path, graph=self.graph) for c in chunks]
+        else:
+            futures = [pool.submit(_worker_groups, c, self.with_path) for c in chunks]
+            results = [f.result() for f in futures]
+
+        answer = {}
+        for chunk, res in zip(chunks, results):
+            for (o, ds), rows in zip(chunk, res):
+                for d, r in zip(ds, rows):
+                    answer[(o, d)] = r
+        return answer
+
+    def run(self, input_path: str, output_path: str, resume: bool = False, log_every_s: float = 10.0) -> dict:
+        """Procesa el archivo completo; devuelve un resumen (filas, ok, errores, filas/s)."""
+        checkpoint_path = f"{output_path}.checkpoint.json"
+        done, ok_rows, prev_elapsed = 0, 0, 0.0
+        fields = OUTPUT_FIELDS + (["path"] if self.with_path else [])
+
+        ck = None
+        if resume and os.path.exists(checkpoint_path):
+            with open(checkpoint_path, encoding="utf-8") as fh:
+                ck = json.load(fh)
+            if ck.get("input") and ck["input"] != os.path.abspath(input_path):
+                raise ValueError(
+                    f"El checkpoint {checkpoint_path} es de otro archivo de entrada ({ck['input']}); "
+                    f"bórralo o usa otra salida para procesar {os.path.abspath(input_path)}."
+                )
+            if not os.path.exists(output_path) or os.path.getsize(output_path) < ck["output_bytes"]:
+                print(f"[WARN] La salida {output_path} falta o es más corta que el checkpoint; se empieza de cero.")
+                ck = None
+
+        if ck is not None:
+            done, ok_rows, prev_elapsed = ck["rows_done"], ck["rows_ok"], ck.get("elapsed_s", 0.0)
+            # Descarta lo escrito después del último checkpoint (bloque a medias)
+            with open(output_path, "r+b") as fh:
+                fh.truncate(ck["output_bytes"])
+            out = open(output_path, "a", newline="", encoding="utf-8")
+            writer = csv.DictWriter(out, fieldnames=fields)
+            print(f"[INFO] Reanudando desde la fila {done:,} ({checkpoint_path})")
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+            out = open(output_path, "w", newline="", encoding="utf-8")
+            writer = csv.DictWriter(out, fieldnames=fields)
+            writer.writeheader()
+
+        t0 = time.perf_counter()
+        last_log = t0
+        rows_this_run = 0
+        pool = None
+        if self.processes > 1:
+            pool = ProcessPoolExecutor(max_workers=self.processes, initializer=_init_worker,
+                                       initargs=(self.graph,))
+        try:
+            for rows in iter_job_blocks(input_path, self.block_size, skip_rows=done):
+                origin_nodes, dest_nodes, status = self._snap_block(rows)
+                answer = self._route_block(pool, origin_nodes, dest_nodes, status)
+
+                for i, row in enumerate(rows):
+                    o, d, st = int(origin_nodes[i]), int(dest_nodes[i]), status[i]
+                    rec = {"id": row.get("id", done + i), "origin_node": o, "dest_node": d,
+                           "cost": "", "num_nodes": 0, "status": st}
+                    if st == "ok":
+                        cost, num_nodes, path = answer[(o, d)]
+                        if np.isfinite(cost):
+                            rec.update(cost=f"{cost:.3f}", num_nodes=num_nodes)
+                            if self.with_path:
+                                rec["path"] = " ".join(map(str, path))
+                            ok_rows += 1
+                        else:
+                            rec["status"] = "unreachable"
+                    writer.writerow(rec)
+
+                done += len(rows)
+                rows_this_run += len(rows)
+                out.flush()
+                os.fsync(out.fileno())
+                elapsed = prev_elapsed + time.perf_counter() - t0
+                _write_checkpoint(checkpoint_path, {
+                    "input": os.path.abspath(input_path),
+                    "rows_done": done,
+                    "rows_ok": ok_rows,
+                    "output_bytes": out.tell(),
+                    "elapsed_s": elapsed,
+                })
+
+                now = time.perf_counter()
+                if now - last_log >= log_every_s:
+                    rate = rows_this_run / (now - t0)
+                    print(f"[INFO] {done:,} filas ({ok_rows:,} ok) — {rate:,.0f} filas/s")
+                    last_log = now
+        finally:
+            out.close()
+            if pool is not None:
+                pool.shutdown()
+
+        wall = time.perf_counter() - t0
+        summary = {
+            "rows": done,
+            "ok": ok_rows,
+            "failed": done - ok_rows,
+            "rows_per_s": (rows_this_run / wall) if wall > 0 else 0.0,
+            "elapsed_s": prev_elapsed + wall,
+        }
+        print(
+            f"[INFO] Lote terminado: {done:,} filas, {ok_rows:,} ok, {done - ok_rows:,} con error — "
+            f"{summary['rows_per_s']:,.0f} filas/s"
+        )
+        return summary
+
+
+def _write_checkpoint(path: str, data: dict) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(data, fh)
+    os.replace(tmp, path)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> dict:
+    from src.caching.duration_cache import DurationCache
+    from src.caching.geocode_cache import GeocodeCache, cached_geocoder
+    from src.api.google_maps import get_coordinates_from_address
+    from src.graph.builder import build_simple_graph
+    from src.graph.context import GraphContext
+    from src.graph.downloader import download_city_graph
+
+    parser = argparse.ArgumentParser(description="Ruteo en lote de pares origen/destino.")
+    parser.add_argument("input", help="CSV o Parquet con los trabajos")
+    parser.add_argument("output", help="CSV de resultados")
+    parser.add_argument("--place", default="Bogotá, Colombia")
+    parser.add_argument("--weight-type", default="distance", choices=["distance", "duration"])
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--block-size", type=int, default=5_000)
+    parser.add_argument("--max-snap-distance-m", type=float, default=None)
+    parser.add_argument("--with-path", action="store_true", help="incluye la secuencia de nodos")
+    parser.add_argument("--resume", action="store_true", help="retoma desde el último checkpoint")
+    args = parser.parse_args(argv)
+
+    api_key = os.environ.get("GOOGLE_API_KEY")
+    G = download_city_graph(args.place, network_type="drive", use_cache=True)
+    graph_simple = build_simple_graph(
+        "https://routes.googleapis.com/directions/v2:computeRoutes", api_key or "", G,
+        weight_type=args.weight_type, as_csr=True,
+        duration_store=DurationCache() if args.weight_type == "duration" else None,
+    )
+    context = GraphContext(G, graph_simple, args.weight_type, place=args.place).warm_up()
+    router = BatchRouter(
+        context,
+        graph_simple,
+        geocoder=cached_geocoder(get_coordinates_from_address, GeocodeCache()),
+        google_api_key=api_key,
+        processes=args.processes,
+        block_size=args.block_size,
+        max_snap_distance_m=args.max_snap_distance_m,
+        with_path=args.with_path,
+    )
+    return router.run(args.input, args.output, resume=args.resume)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,21 @@
 from __future__ import annotations
 
 import asyncio
+import functools
+import time
 from dataclasses import dataclass
+from datetime import datetime, timedelta
 from typing import Callable, Optional, Tuple, Dict
 
 import osmnx as ox
 import numpy as np
 
+from src.graph.csr import CSRGraph
+from src.graph.context import GraphContext
+from src.graph.spatial_index import SnappingIndex
+from src.graph.time_profiles import Departure, slot_of, to_local_datetime
+from src.observability import metrics
+
 
 GeocoderFn = Callable[..., Tuple[Optional[float], Optional[float]]]
 DijkstraFn = Callable[..., Tuple[list[int], float]]
@@ -24,6 +33,14 @@ class RouteResult:
     origin_lng: float
     dest_lat: float
     dest_lng: float
+    departure_time: Optional[datetime] = None  # solo en ruteo dependiente del tiempo
+
+    @property
+    def arrival_time(self) -> Optional[datetime]:
+        """ETA (hora local) cuando la ruta se calculó con departure_time en modo 'duration'."""
+        if self.departure_time is None or self.weight_type != "duration" or not np.isfinite(self.total_cost):
+            return None
+        return self.departure_time + timedelta(seconds=float(self.total_cost))
 
 
 def _as_float(value) -> float:
@@ -42,14 +59,57 @@ def _as_float(value) -> float:
 
 def _graph_bounds_latlon(G) -> Tuple[Tuple[float, float], Tuple[float, float]]:
     """Devuelve ((sw_lat, sw_lng), (ne_lat, ne_lng)) a partir del grafo."""
-    nodes_gdf, _ = ox.graph_to_gdfs(G, nodes=True, edges=True)
-    minx, miny, maxx, maxy = nodes_gdf.total_bounds  # lon, lat
-    return (miny, minx), (maxy, maxx)
+    xs = np.fromiter((float(d["x"]) for _n, d in G.nodes(data=True)), dtype=np.float64)  # lon
+    ys = np.fromiter((float(d["y"]) for _n, d in G.nodes(data=True)), dtype=np.float64)  # lat
+    return (float(ys.min()), float(xs.min())), (float(ys.max()), float(xs.max()))
+
+
+async def geocode_with_bounds(
+        get_coordinates_from_address: GeocoderFn,
+        google_api_key: str,
+        addr: str,
+        sw: Tuple[float, float],
+        ne: Tuple[float, float],
+) -> Tuple[Optional[float], Optional[float]]:
+    """
+    Envuelve la llamada al geocoder de Google en un hilo,
+    pasando bounds y city_hint.
+    """
+    def _call():
+        try:
+            # Firma extendida: (key, address, city_hint=..., bounds=..., region=..., language=...)
+            return get_coordinates_from_address(
+                google_api_key,
+                addr,
+                city_hint="Bogotá, Colombia",
+                bounds=(sw, ne),
+                region="co",
+                language="es",
+            )
+        except TypeError:
+            # Firma antigua: (key, address)
+            return get_coordinates_from_address(google_api_key, addr)
+
+    return await asyncio.to_thread(_call)
+
+
+async def geocode_or_fail(
+        get_coordinates_from_address: GeocoderFn,
+        google_api_key: str,
+        addr: str,
+        sw: Tuple[float, float],
+        ne: Tuple[float, float],
+) -> Tuple[float, float]:
+    """Geocodifica `addr` o lanza ValueError si Google no devuelve coordenadas."""
+    lat, lng = await geocode_with_bounds(get_coordinates_from_address, google_api_key, addr, sw, ne)
+    if lat is None or lng is None:
+        raise ValueError(f"No se pudo geocodificar: {addr}")
+    return float(lat), float(lng)
 
 
 async def compute_route_async(
         G,
-        graph_simple: Dict[int, list[tuple[int, float]]],
+        graph_simple: Dict[int, list[tuple[int, float]]] | CSRGraph,
         dijkstra_fn: DijkstraFn,
         get_coordinates_from_address: GeocoderFn,
         origin_text: str,
@@ -57,6 +117,11 @@ async def compute_route_async(
         google_api_key: str,
         weight_type: str = "distance",
         timeout_seconds: int = 25,
+        snapping_index: Optional[SnappingIndex] = None,
+        max_snap_distance_m: Optional[float] = None,
+        context: Optional[GraphContext] = None,
+        departure_time: Departure = None,
+        route_cache=None,
 ) -> RouteResult:
     """
     Calcula la ruta de forma asíncrona usando SIEMPRE Google (requiere API key):
@@ -64,45 +129,46 @@ async def compute_route_async(
       2) Normaliza/valida coordenadas; nearest_nodes con arrays.
       3) Ejecuta Dijkstra con el grafo simplificado.
       4) Devuelve RouteResult.
+
+    Si se pasa `snapping_index` (SnappingIndex construido una vez por grafo), el ajuste
+    de origen y destino se hace con él en una sola consulta en lote; si no, con OSMnx.
+    `max_snap_distance_m` (solo con índice) rechaza puntos demasiado lejos de la red.
+
+    Con `context` (GraphContext), bounds e índice espacial salen del contexto ya
+    calculado, de modo que la latencia por consulta no depende del tamaño del grafo.
+
+    Con `departure_time` (datetime, ISO 8601 o epoch; hora de Bogotá si no trae zona),
+    la búsqueda se hace sobre perfiles por franja: `graph_simple` debe ser un
+    TimeDependentGraph y `dijkstra_fn` aceptar `departure_time` (dijkstra lo hace).
+    El resultado trae `departure_time` y `arrival_time` (ETA).
+
+    Con `route_cache` (RouteCache) la búsqueda se reutiliza para pares
+    (origen, destino, modo, versión del grafo[, franja]) ya calculados; con franja solo
+    se reutiliza el camino y su duración se recalcula para `departure_time`.
+
+    Cada etapa (bounds, geocode, snapping, search) se mide en el histograma
+    `route_stage_seconds` del registro de métricas (src.observability.metrics).
     """
     if not google_api_key:
         raise ValueError("Google API key es obligatoria para geocodificar direcciones.")
+    departure = to_local_datetime(departure_time) if departure_time is not None else None
+    search_fn = dijkstra_fn if departure is None else functools.partial(dijkstra_fn, departure_time=departure)
 
     # 0) bounds del grafo para sesgar la geocodificación
-    sw, ne = _graph_bounds_latlon(G)
-
-    async def _geocode_google(addr: str) -> Tuple[Optional[float], Optional[float]]:
-        """
-        Envuelve la llamada al geocoder de Google en un hilo,
-        pasando bounds y city_hint.
-        """
-        def _call():
-            try:
-                # Firma extendida: (key, address, city_hint=..., bounds=..., region=..., language=...)
-                return get_coordinates_from_address(
-                    google_api_key,
-                    addr,
-                    city_hint="Bogotá, Colombia",
-                    bounds=(sw, ne),
-                    region="co",
-                    language="es",
-                )
-            except TypeError:
-                # Firma antigua: (key, address)
-                return get_coordinates_from_address(google_api_key, addr)
-
-        return await asyncio.to_thread(_call)
+    with metrics.span("route_stage_seconds", stage="bounds"):
+        sw, ne = context.bounds if context is not None else _graph_bounds_latlon(G)
+    if context is not None and snapping_index is None:
+        with metrics.span("route_stage_seconds", stage="snapping_index"):
+            snapping_index = context.snapping_index
 
     async def _geocode_or_fail(addr: str) -> Tuple[float, float]:
-        lat, lng = await _geocode_google(addr)
-        if lat is None or lng is None:
-            raise ValueError(f"No se pudo geocodificar: {addr}")
-        return float(lat), float(lng)
+        return await geocode_or_fail(get_coordinates_from_address, google_api_key, addr, sw, ne)
 
     async def _compute() -> RouteResult:
         # 1) Geocodificar con Google (obligatorio)
-        o_lat, o_lng = await _geocode_or_fail(origin_text)
-        d_lat, d_lng = await _geocode_or_fail(dest_text)
+        with metrics.span("route_stage_seconds", stage="geocode"):
+            o_lat, o_lng = await _geocode_or_fail(origin_text)
+            d_lat, d_lng = await _geocode_or_fail(dest_text)
 
         # 2) Normalizar/validar
         o_lat = _as_float(o_lat); o_lng = _as_float(o_lng)
@@ -111,14 +177,43 @@ async def compute_route_async(
             if not (-90 <= lat <= 90 and -180 <= lng <= 180):
                 raise ValueError(f"Coordenadas fuera de rango para {name}: lat={lat}, lng={lng}")
 
-        # 3) nearest_nodes pasando arrays (compatibilidad con versiones que usan .any())
-        origin_node = ox.distance.nearest_nodes(G, X=[o_lng], Y=[o_lat])[0]
-        dest_node   = ox.distance.nearest_nodes(G, X=[d_lng], Y=[d_lat])[0]
+        # 3) nearest_nodes: índice precalculado (ambos puntos en un lote) o OSMnx
+        with metrics.span("route_stage_seconds", stage="snapping"):
+            if snapping_index is not None:
+                nodes, dists = snapping_index.nearest_nodes(
+                    [o_lat, d_lat], [o_lng, d_lng], max_distance_m=max_snap_distance_m, return_distance=True
+                )
+                for name, node, dist in [("origen", nodes[0], dists[0]), ("destino", nodes[1], dists[1])]:
+                    if node < 0:
+                        raise ValueError(f"El {name} está a {dist:.0f} m de la red vial (máximo {max_snap_distance_m} m).")
+                origin_node, dest_node = int(nodes[0]), int(nodes[1])
+            else:
+                # pasando arrays (compatibilidad con versiones que usan .any())
+                origin_node = ox.distance.nearest_nodes(G, X=[o_lng], Y=[o_lat])[0]
+                dest_node   = ox.distance.nearest_nodes(G, X=[d_lng], Y=[d_lat])[0]
 
         # 4) Dijkstra (en hilo)
-        path, total_cost = await asyncio.to_thread(
-            dijkstra_fn, graph_simple, origin_node, dest_node, weight_type
-        )
+        cache_key = cached = None
+        if route_cache is not None:
+            cache_key = route_cache.key_for(
+                graph_simple, origin_node, dest_node, weight_type,
+                slot=slot_of(departure) if departure is not None else None,
+            )
+            cached = route_cache.get(cache_key)
+        if cached is not None:
+            path, total_cost = list(cached.path), cached.cost
+            if departure is not None and hasattr(graph_simple, "path_travel_time") and len(path) > 1:
+                # La franja solo reutiliza el camino: el costo se interpola de forma continua
+                # dentro de ella, así que se recalcula para esta hora de salida exacta.
+                total_cost = graph_simple.path_travel_time(path, departure)
+        else:
+            with metrics.span("route_stage_seconds", stage="search"):
+                t_search = time.perf_counter()
+                path, total_cost = await asyncio.to_thread(
+                    search_fn, graph_simple, origin_node, dest_node, weight_type
+                )
+            if route_cache is not None:
+                route_cache.set(cache_key, path, total_cost, time.perf_counter() - t_search)
 
         return RouteResult(
             path_nodes=path,
@@ -130,7 +225,15 @@ async def compute_route_async(
             origin_lng=o_lng,
             dest_lat=d_lat,
             dest_lng=d_lng,
+            departure_time=departure,
         )
 
     # Timeout exterior para todo el flujo
-    return await asyncio.wait_for(_compute(), timeout=timeout_seconds)
+    with metrics.span("route_seconds"):
+        try:
+            result = await asyncio.wait_for(_compute(), timeout=timeout_seconds)
+        except Exception as exc:
+            metrics.inc("route_requests_total", status=type(exc).__name__)
+            raise
+    metrics.inc("route_requests_total", status="ok")
+    return result
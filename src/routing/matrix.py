@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+# Matrices origen x destino (distancia/duración) para despacho de flota.
+# Comentarios en español, variables en inglés.
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from src.algorithms.dijkstra import dijkstra_one_to_many
+
+# Grafo cargado una sola vez por proceso del pool (evita serializarlo en cada tarea)
+_WORKER_GRAPH = None
+
+
+@dataclass
+class CostMatrixResult:
+    """Matriz de costos origen x destino y, opcionalmente, árboles de predecesores."""
+    costs: np.ndarray          # (len(sources), len(targets)); inf si no hay camino
+    sources: list[int]
+    targets: list[int]
+    weight_type: str           # "distance" | "duration"
+    predecessors: Optional[list[Dict[int, int]]] = None  # por origen: {nodo: anterior}
+
+    def path(self, i: int, j: int) -> list[int]:
+        """Reconstruye bajo demanda el camino sources[i] -> targets[j]."""
+        if self.predecessors is None:
+            raise ValueError("La matriz se calculó sin predecesores (return_predecessors=False).")
+        if not np.isfinite(self.costs[i, j]):
+            return []
+        source, node = self.sources[i], self.targets[j]
+        previous = self.predecessors[i]
+        path = [node]
+        while node != source:
+            node = previous[node]
+            path.append(node)
+        path.reverse()
+        return path
+
+
+def _prune_predecessors(previous: Dict[int, int], source: int, targets: Sequence[int],
+                        costs: Dict[int, float]) -> Dict[int, int]:
+    """Conserva solo las entradas del árbol necesarias para llegar a los targets alcanzables."""
+    kept: Dict[int, int] = {}
+    for t in targets:
+        if not np.isfinite(costs[t]):
+            continue
+        node = t
+        while node != source and node not in kept:
+            kept[node] = previous[node]
+            node = previous[node]
+    return kept
+
+
+def _row(graph, source: int, targets: Sequence[int], return_predecessors: bool):
+    """Una fila de la matriz: búsqueda uno-a-muchos desde `source`."""
+    costs, previous = dijkstra_one_to_many(graph, source, targets)
+    row = np.fromiter((costs[t] for t in targets), dtype=np.float64, count=len(targets))
+    pred = _prune_predecessors(previous, source, targets, costs) if return_predecessors else None
+    return row, pred
+
+
+def _init_worker(graph) -> None:
+    global _WORKER_GRAPH
+    _WORKER_GRAPH = graph
+
+
+def _worker_rows(sources: Sequence[int], targets: Sequence[int], return_predecessors: bool):
+    return [_row(_WORKER_GRAPH, s, targets, return_predecessors) for s in sources]
+
+
+def compute_cost_matrix(
+        graph,
+        sources: Sequence[int],
+        targets: Sequence[int],
+        weight_type: str = "distance",
+        processes: Optional[int] = None,
+        chunk_size: int = 8,
+        return_predecessors: bool = False,
+) -> CostMatrixResult:
+    """
+    Calcula la matriz de costos entre nodos origen y destino del grafo simplificado.
+
+    Cada origen ejecuta UNA búsqueda uno-a-muchos que se detiene al asentar todos
+    los destinos (en vez de N x M llamadas a dijkstra). Los orígenes se reparten
+    por bloques en un pool de procesos; el grafo se envía una sola vez por proceso.
+
+    Args:
+        graph: salida de build_simple_graph (dict o CSRGraph).
+        sources: IDs de nodos origen (p. ej. depósitos/conductores ya ajustados al grafo).
+        targets: IDs de nodos destino (p. ej. entregas).
+        weight_type: "distance" o "duration" (metadato del resultado).
+        processes: procesos del pool; None = os.cpu_count(), 1 = sin pool.
+        chunk_size: orígenes por tarea enviada al pool.
+        return_predecessors: si es True, guarda árboles de predecesores podados para
+            reconstruir caminos con CostMatrixResult.path(i, j).
+
+    Returns:
+        CostMatrixResult con costs de forma (len(sources), len(targets)).
+    """
+    sources, targets = list(sources), list(targets)
+    t0 = time.perf_counter()
+    processes = processes or os.cpu_count() or 1
+    processes = min(processes, max(1, len(sources)))
+
+    if processes <= 1:
+        results = [_row(graph, s, targets, return_predecessors) for s in sources]
+    else:
+        chunks = [sources[i:i + chunk_size] for i in range(0, len(sources), chunk_size)]
+        with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=(graph,)) as pool:
+            futures = [pool.submit(_worker_rows, chunk, targets, return_predecessors) for chunk in chunks]
+            results = [row for f in futures for row in f.result()]
+
+    costs = np.vstack([r for r, _p in results]) if results else np.zeros((0, len(targets)))
+    predecessors = [p for _r, p in results] if return_predecessors else None
+
+    print(
+        f"[INFO] Matriz {len(sources)}x{len(targets)} ({weight_type}) calculada en "
+        f"{time.perf_counter() - t0:.2f}s con {processes} proceso(s)."
+    )
+    return CostMatrixResult(
+        costs=costs,
+        sources=sources,
+        targets=targets,
+        weight_type=weight_type,
+        predecessors=predecessors,
+    )
@@ -0,0 +1,392 @@
+from __future__ import annotations
+
+# Optimizador multi-parada (TSP/VRP heurístico) sobre el grafo simplificado.
+# Comentarios en español, variables en inglés.
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Optional, Sequence, Tuple
+
+import numpy as np
+import osmnx as ox
+
+from src.routing.compute_routes_async import (
+    GeocoderFn,
+    _as_float,
+    _graph_bounds_latlon,
+    geocode_or_fail,
+)
+from src.routing.matrix import CostMatrixResult, compute_cost_matrix
+
+
+@dataclass
+class VehicleRoute:
+    """Ruta de un vehículo: orden de paradas y camino de nodos ya unido."""
+    vehicle: int
+    stop_order: list[int]          # índices de paradas; empieza en el depósito
+    cost: float
+    load: float
+    arrival_times: list[float]     # llegada a cada parada (unidades del costo)
+    path_nodes: list[int] = field(default_factory=list)
+
+
+@dataclass
+class MultiStopResult:
+    """Resultado del optimizador multi-parada."""
+    routes: list[VehicleRoute]
+    total_cost: float
+    weight_type: str
+    stop_nodes: list[int]
+    stop_coords: list[Tuple[float, float]]
+    unassigned: list[int]
+    elapsed_seconds: float
+
+    @property
+    def path_nodes(self) -> list[int]:
+        """Camino unido del primer vehículo (compatible con plot_route_explore_compliant)."""
+        return self.routes[0].path_nodes if self.routes else []
+
+
+class _Problem:
+    """Datos del VRP y evaluación de rutas (costo, carga y ventanas de tiempo)."""
+
+    def __init__(self, costs, depot, demands, capacity, time_windows, service_times, return_to_depot):
+        self.c = costs.tolist()
+        self.depot = depot
+        self.demands = demands
+        self.capacity = capacity
+        self.tw = time_windows
+        self.service = service_times
+        self.return_to_depot = return_to_depot
+
+    def route_cost(self, route: list[int]) -> float:
+        c = self.c
+        total = sum(c[a][b] for a, b in zip(route, route[1:]))
+        if self.return_to_depot and len(route) > 1:
+            total += c[route[-1]][self.depot]
+        return total
+
+    def schedule(self, route: list[int]) -> Optional[list[float]]:
+        """Horas de llegada (con espera) o None si viola alguna ventana de tiempo."""
+        c, tw, service = self.c, self.tw, self.service
+        t = tw[route[0]][0] if tw else 0.0
+        times = [t]
+        for a, b in zip(route, route[1:]):
+            t = t + (service[a] if service else 0.0) + c[a][b]
+            if tw:
+                start, end = tw[b]
+                if t > end:
+                    return None
+                t = max(t, start)
+            times.append(t)
+        if tw and self.return_to_depot and len(route) > 1:
+            back = t + (service[route[-1]] if service else 0.0) + c[route[-1]][self.depot]
+            if back > tw[self.depot][1]:
+                return None
+        return times
+
+    def load(self, route: list[int]) -> float:
+        if not self.demands:
+            return 0.0
+        return sum(self.demands[i] for i in route[1:])
+
+    def feasible(self, route: list[int]) -> bool:
+        if not np.isfinite(self.route_cost(route)):
+            return False
+        if self.capacity is not None and self.load(route) > self.capacity:
+            return False
+        if self.tw and self.schedule(route) is None:
+            return False
+        return True
+
+
+def _construct(problem: _Problem, stops: list[int], num_vehicles: int) -> Tuple[list[list[int]], list[int]]:
+    """Inserción más barata secuencial: cada parada va a la posición factible de menor costo extra."""
+    depot = problem.depot
+    routes = [[depot] for _ in range(num_vehicles)]
+    unassigned = []
+    c = problem.c
+    # Primero las paradas más lejanas del depósito (o con ventana más temprana)
+    if problem.tw:
+        order = sorted(stops, key=lambda i: problem.tw[i][1])
+    else:
+        order = sorted(stops, key=lambda i: -c[depot][i])
+
+    for stop in order:
+        best = None
+        for r_idx, route in enumerate(routes):
+            base = problem.route_cost(route)
+            for pos in range(1, len(route) + 1):
+                candidate = route[:pos] + [stop] + route[pos:]
+                delta = problem.route_cost(candidate) - base
+                if best is not None and delta >= best[0]:
+                    continue
+                if problem.feasible(candidate):
+                    best = (delta, r_idx, pos)
+        if best is None:
+            unassigned.append(stop)
+        else:
+            _delta, r_idx, pos = best
+            routes[r_idx].insert(pos, stop)
+    return routes, unassigned
+
+
+def _two_opt(problem: _Problem, route: list[int], deadline: float) -> bool:
+    """2-opt intra-ruta (primera mejora). Devuelve True si mejoró."""
+    improved = False
+    best_cost = problem.route_cost(route)
+    n = len(route)
+    for i in range(1, n - 1):
+        for j in range(i + 1, n):
+            if time.perf_counter() > deadline:
+                return improved
+            candidate = route[:i] + route[i:j + 1][::-1] + route[j + 1:]
+            cost = problem.route_cost(candidate)
+            if cost + 1e-9 < best_cost and problem.feasible(candidate):
+                route[:] = candidate
+                best_cost = cost
+                improved = True
+    return improved
+
+
+def _or_opt(problem: _Problem, routes: list[list[int]], deadline: float) -> bool:
+    """Or-opt: mueve segmentos de 1 a 3 paradas dentro de la ruta o a otro vehículo."""
+    improved = False
+    for seg_len in (1, 2, 3):
+        for a_idx in range(len(routes)):
+            i = 1
+            while i + seg_len <= len(routes[a_idx]):
+                if time.perf_counter() > deadline:
+                    return improved
+                src = routes[a_idx]
+                segment = src[i:i + seg_len]
+                rest = src[:i] + src[i + seg_len:]
+                old_total = problem.route_cost(src)
+                moved = False
+                for b_idx in range(len(routes)):
+                    dst = rest if b_idx == a_idx else routes[b_idx]
+                    base = old_total if b_idx == a_idx else old_total + problem.route_cost(dst)
+                    removed = problem.route_cost(rest) if b_idx != a_idx else 0.0
+                    for pos in range(1, len(dst) + 1):
+                        if b_idx == a_idx and pos == i:
+                            continue
+                        for seg in (segment, segment[::-1]):
+                            cand_dst = dst[:pos] + seg + dst[pos:]
+                            new_total = problem.route_cost(cand_dst) + removed
+                            if new_total + 1e-9 < base and problem.feasible(cand_dst) and (
+                                    b_idx == a_idx or problem.feasible(rest)):
+                                if b_idx == a_idx:
+                                    routes[a_idx] = cand_dst
+                                else:
+                                    routes[a_idx] = rest
+                                    routes[b_idx] = cand_dst
+                                moved = improved = True
+                                break
+                        if moved:
+                            break
+                    if moved:
+                        break
+                if not moved:
+                    i += 1
+    return improved
+
+
+def solve_vrp(
+        costs: np.ndarray,
+        depot: int = 0,
+        num_vehicles: int = 1,
+        demands: Optional[Sequence[float]] = None,
+        vehicle_capacity: Optional[float] = None,
+        time_windows: Optional[Sequence[Tuple[float, float]]] = None,
+        service_times: Optional[Sequence[float]] = None,
+        time_budget_s: float = 5.0,
+        return_to_depot: bool = True,
+) -> Tuple[list[list[int]], list[int]]:
+    """
+    Heurística VRP sobre una matriz de costos (n x n, índices de parada).
+
+    1) Construcción por inserción más barata respetando capacidad y ventanas de tiempo.
+    2) Búsqueda local 2-opt + Or-opt (intra e inter-vehículo) hasta agotar el presupuesto.
+
+    Returns:
+        (routes, unassigned): rutas como listas de índices que empiezan en `depot`,
+        y paradas que no se pudieron asignar sin violar restricciones.
+    """
+    deadline = time.perf_counter() + time_budget_s
+    n = costs.shape[0]
+    problem = _Problem(
+        costs, depot,
+        list(demands) if demands is not None else None,
+        vehicle_capacity,
+        [tuple(map(float, tw)) for tw in time_windows] if time_windows is not None else None,
+        list(service_times) if service_times is not None else None,
+        return_to_depot,
+    )
+    stops = [i for i in range(n) if i != depot]
+    routes, unassigned = _construct(problem, stops, max(1, num_vehicles))
+
+    # Búsqueda local hasta que no haya mejoras o se acabe el tiempo
+    while time.perf_counter() < deadline:
+        improved = False
+        for route in routes:
+            improved |= _two_opt(problem, route, deadline)
+        improved |= _or_opt(problem, routes, deadline)
+        if not improved:
+            break
+    return routes, unassigned
+
+
+def _stitch(matrix: CostMatrixResult, order: list[int], return_to_depot: bool) -> list[int]:
+    """Une los caminos parada a parada en una sola lista de nodos."""
+    legs = list(zip(order, order[1:]))
+    if return_to_depot and len(order) > 1:
+        legs.append((order[-1], order[0]))
+    path: list[int] = [matrix.sources[order[0]]] if order else []
+    for a, b in legs:
+        leg = matrix.path(a, b)
+        path.extend(leg[1:])
+    return path
+
+
+def optimize_stops(
+        graph_simple,
+        stop_nodes: Sequence[int],
+        weight_type: str = "distance",
+        num_vehicles: int = 1,
+        demands: Optional[Sequence[float]] = None,
+        vehicle_capacity: Optional[float] = None,
+        time_windows: Optional[Sequence[Tuple[float, float]]] = None,
+        service_times: Optional[Sequence[float]] = None,
+        time_budget_s: float = 5.0,
+        return_to_depot: bool = True,
+        processes: Optional[int] = None,
+        stop_coords: Optional[Sequence[Tuple[float, float]]] = None,
+) -> MultiStopResult:
+    """
+    Optimiza el orden de visita de paradas ya ajustadas a nodos del grafo.
+    La parada 0 es el depósito (inicio de todos los vehículos).
+
+    Args:
+        graph_simple: salida de build_simple_graph (dict o CSRGraph).
+        stop_nodes: nodos del grafo de cada parada (0 = depósito).
+        weight_type: "distance" o "duration". Las ventanas de tiempo y los tiempos
+            de servicio se expresan en segundos, por lo que requieren "duration".
+        num_vehicles: vehículos disponibles.
+        demands / vehicle_capacity: demanda por parada y capacidad por vehículo (opcionales).
+        time_windows: (inicio, fin) por parada, en segundos desde el inicio del turno.
+        service_times: segundos de servicio en cada parada.
+        time_budget_s: presupuesto de tiempo para la búsqueda local.
+        return_to_depot: si los vehículos vuelven al depósito.
+        processes: procesos para la matriz de costos (ver compute_cost_matrix).
+    """
+    if (time_windows is not None or service_times is not None) and weight_type != "duration":
+        raise ValueError("Las ventanas de tiempo requieren weight_type='duration'.")
+    if len(stop_nodes) < 2:
+        raise ValueError("Se requieren al menos 2 paradas (depósito + 1).")
+
+    t0 = time.perf_counter()
+    nodes = list(stop_nodes)
+    matrix = compute_cost_matrix(
+        graph_simple, nodes, nodes, weight_type=weight_type,
+        processes=processes, return_predecessors=True,
+    )
+    routes_idx, unassigned = solve_vrp(
+        matrix.costs,
+        depot=0,
+        num_vehicles=num_vehicles,
+        demands=demands,
+        vehicle_capacity=vehicle_capacity,
+        time_windows=time_windows,
+        service_times=service_times,
+        time_budget_s=time_budget_s,
+        return_to_depot=return_to_depot,
+    )
+
+    problem = _Problem(
+        matrix.costs, 0, list(demands) if demands is not None else None, vehicle_capacity,
+        [tuple(map(float, tw)) for tw in time_windows] if time_windows is not None else None,
+        list(service_times) if service_times is not None else None, return_to_depot,
+    )
+    routes = []
+    for k, order in enumerate(routes_idx):
+        if len(order) < 2:
+            continue  # vehículo sin paradas asignadas
+        schedule = problem.schedule(order) if problem.tw else None
+        if schedule is None:
+            schedule = np.cumsum([0.0] + [problem.c[a][b] for a, b in zip(order, order[1:])]).tolist()
+        routes.append(VehicleRoute(
+            vehicle=k,
+            stop_order=order,
+            cost=problem.route_cost(order),
+            load=problem.load(order),
+            arrival_times=schedule,
+            path_nodes=_stitch(matrix, order, return_to_depot),
+        ))
+
+    total = sum(r.cost for r in routes)
+    elapsed = time.perf_counter() - t0
+    print(
+        f"[INFO] Multi-parada: {len(nodes) - 1} paradas, {len(routes)} vehículo(s), "
+        f"costo={total:.1f} ({weight_type}), sin asignar={len(unassigned)}, {elapsed:.2f}s"
+    )
+    return MultiStopResult(
+        routes=routes,
+        total_cost=total,
+        weight_type=weight_type,
+        stop_nodes=nodes,
+        stop_coords=list(stop_coords) if stop_coords is not None else [],
+        unassigned=unassigned,
+        elapsed_seconds=elapsed,
+    )
+
+
+async def optimize_stops_async(
+        G,
+        graph_simple,
+        get_coordinates_from_address: GeocoderFn,
+        stops_text: Sequence[str],
+        google_api_key: str,
+        weight_type: str = "distance",
+        timeout_seconds: int = 120,
+        snapping_index=None,
+        context=None,
+        **optimizer_kwargs,
+) -> MultiStopResult:
+    """
+    Geocodifica y ajusta al grafo las N paradas UNA sola vez y optimiza el recorrido.
+    La primera dirección es el depósito. `optimizer_kwargs` se pasa a optimize_stops.
+    Con `snapping_index` (SnappingIndex) el ajuste usa el KD-tree precalculado;
+    con `context` (GraphContext) se toman de él los bounds y el índice.
+    """
+    if not google_api_key:
+        raise ValueError("Google API key es obligatoria para geocodificar direcciones.")
+
+    if context is not None:
+        sw, ne = context.bounds
+        if snapping_index is None:
+            snapping_index = context.snapping_index
+    else:
+        sw, ne = _graph_bounds_latlon(G)
+
+    async def _compute() -> MultiStopResult:
+        # 1) Geocodificar todas las paradas en paralelo
+        coords = await asyncio.gather(*[
+            geocode_or_fail(get_coordinates_from_address, google_api_key, addr, sw, ne)
+            for addr in stops_text
+        ])
+        lats = [_as_float(lat) for lat, _lng in coords]
+        lngs = [_as_float(lng) for _lat, lng in coords]
+
+        # 2) Ajuste al grafo en lote (una sola llamada)
+        if snapping_index is not None:
+            stop_nodes = [int(n) for n in snapping_index.nearest_nodes(lats, lngs)]
+        else:
+            stop_nodes = [int(n) for n in ox.distance.nearest_nodes(G, X=lngs, Y=lats)]
+
+        # 3) Matriz + heurística (CPU) en un hilo
+        return await asyncio.to_thread(
+            optimize_stops, graph_simple, stop_nodes, weight_type,
+            stop_coords=list(zip(lats, lngs)), **optimizer_kwargs,
+        )
+
+    return await asyncio.wait_for(_compute(), timeout=timeout_seconds)
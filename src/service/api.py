@@ -0,0 +1,372 @@
+from __future__ import annotations
+
+# Servicio HTTP de ruteo (FastAPI). Carga grafo, grafo simplificado e índice espacial
+# una sola vez al arrancar; las búsquedas (CPU) corren en un pool de procesos que
+# comparte el grafo por mmap. Comentarios en español, variables en inglés.
+#
+# Ejecutar:  python -m src.service.api     (o: uvicorn src.service.api:create_app --factory)
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+
+from src.algorithms.dijkstra import dijkstra
+from src.api.google_maps import GeocodingError, get_coordinates_from_address
+from src.caching.duration_cache import DurationCache
+from src.caching.geocode_cache import GeocodeCache, cached_geocoder
+from src.caching.route_cache import RouteCache
+from src.graph.builder import build_simple_graph
+from src.graph.context import GraphContext
+from src.graph.downloader import CACHE_DIR, download_city_graph
+from src.graph.reduction import largest_scc_nodes
+from src.graph.shared import SharedGraphHandle, SharedGraphPublisher
+from src.observability import metrics
+from src.routing.compute_routes_async import compute_route_async, geocode_or_fail
+from src.routing.matrix import compute_cost_matrix
+from src.security.encrypted_env import ENV_FILE, KEY_FILE, load_secret
+
+
+@dataclass
+class ServiceConfig:
+    """Configuración del servicio (variables de entorno ROUTING_*)."""
+    place: str = "Bogotá, Colombia"
+    network_type: str = "drive"
+    weight_type: str = "distance"
+    workers: int = max(1, (os.cpu_count() or 2) - 1)
+    request_timeout_s: float = 30.0
+    max_matrix_cells: int = 10_000
+    google_maps_api_url: str = "https://routes.googleapis.com/directions/v2:computeRoutes"
+    shared_root: str = field(default_factory=lambda: os.path.join(CACHE_DIR, "shared"))
+    route_cache_size: int = 50_000           # 0 desactiva el caché de rutas
+    route_cache_path: Optional[str] = None   # SQLite compartido entre réplicas (opcional)
+
+    @classmethod
+    def from_env(cls) -> "ServiceConfig":
+        env = os.environ
+        cfg = cls()
+        cfg.place = env.get("ROUTING_PLACE", cfg.place)
+        cfg.network_type = env.get("ROUTING_NETWORK_TYPE", cfg.network_type)
+        cfg.weight_type = env.get("ROUTING_WEIGHT_TYPE", cfg.weight_type)
+        cfg.workers = int(env.get("ROUTING_WORKERS", cfg.workers))
+        cfg.request_timeout_s = float(env.get("ROUTING_TIMEOUT_S", cfg.request_timeout_s))
+        cfg.max_matrix_cells = int(env.get("ROUTING_MAX_MATRIX_CELLS", cfg.max_matrix_cells))
+        cfg.shared_root = env.get("ROUTING_SHARED_ROOT", cfg.shared_root)
+        cfg.route_cache_size = int(env.get("ROUTING_ROUTE_CACHE_SIZE", cfg.route_cache_size))
+        cfg.route_cache_path = env.get("ROUTING_ROUTE_CACHE_PATH") or cfg.route_cache_path
+        return cfg
+
+
+def _load_api_key() -> Optional[str]:
+    """GOOGLE_API_KEY del entorno o, si existen, los archivos cifrados (sin pedir input)."""
+    key = os.environ.get("GOOGLE_API_KEY")
+    if key:
+        return key
+    if os.path.exists(KEY_FILE) and os.path.exists(ENV_FILE):
+        return load_secret()
+    return None
+
+
+# ——— Pool de procesos: cada worker se adjunta al grafo compartido (mmap) ———
+_WORKER_HANDLE: Optional[SharedGraphHandle] = None
+
+
+def _init_worker(shared_root: str) -> None:
+    global _WORKER_HANDLE
+    _WORKER_HANDLE = SharedGraphHandle(shared_root)
+
+
+def _worker_route(source: int, target: int, weight_type: str):
+    return dijkstra(_WORKER_HANDLE.graph, source, target, weight_type)
+
+
+def _worker_matrix_rows(sources: list[int], targets: list[int], weight_type: str) -> np.ndarray:
+    return compute_cost_matrix(_WORKER_HANDLE.graph, sources, targets, weight_type, processes=1).costs
+
+
+class PoolDijkstra:
+    """
+    dijkstra_fn para compute_route_async que ejecuta la búsqueda en el pool de procesos.
+    compute_route_async ya la llama desde un hilo, así que el event loop no se bloquea.
+    El argumento `graph` se ignora: cada worker tiene su propia vista del grafo compartido.
+    """
+
+    def __init__(self, pool: ProcessPoolExecutor):
+        self.pool = pool
+
+    def __call__(self, graph, source, target, weight_type="distance"):
+        return self.pool.submit(_worker_route, int(source), int(target), weight_type).result()
+
+
+class RoutingService:
+    """Estado cargado una vez en el arranque (lifespan) y compartido por todas las peticiones."""
+
+    def __init__(self, config: ServiceConfig):
+        self.config = config
+        self.api_key: Optional[str] = None
+        self.context: Optional[GraphContext] = None
+        self.geocoder = None
+        self.route_cache: Optional[RouteCache] = None
+        self.pool: Optional[ProcessPoolExecutor] = None
+        self.dijkstra_fn: Optional[PoolDijkstra] = None
+        self.graph_version: Optional[str] = None
+        self.started_at = time.time()
+
+    def start(self) -> None:
+        cfg = self.config
+        t0 = time.perf_counter()
+        self.api_key = _load_api_key()
+
+        G = download_city_graph(cfg.place, network_type=cfg.network_type, use_cache=True)
+        duration_store = DurationCache() if cfg.weight_type == "duration" else None
+        graph_simple = build_simple_graph(
+            cfg.google_maps_api_url, self.api_key or "", G, weight_type=cfg.weight_type,
+            as_csr=True, duration_store=duration_store,
+        )
+        # Ajuste solo a la componente fuertemente conexa más grande: todo par tiene camino
+        self.context = GraphContext(
+            G, graph_simple, cfg.weight_type, place=cfg.place, snap_nodes=largest_scc_nodes(graph_simple),
+        ).warm_up()
+
+        publisher = SharedGraphPublisher(cfg.shared_root)
+        self.graph_version = publisher.publish(graph_simple, G)
+        publisher.gc(keep=2)
+
+        self.pool = ProcessPoolExecutor(
+            max_workers=cfg.workers, initializer=_init_worker, initargs=(cfg.shared_root,)
+        )
+        self.dijkstra_fn = PoolDijkstra(self.pool)
+        self.geocoder = cached_geocoder(get_coordinates_from_address, GeocodeCache())
+        if cfg.route_cache_size > 0:
+            self.route_cache = RouteCache(memory_size=cfg.route_cache_size, path=cfg.route_cache_path)
+        print(f"[INFO] Servicio listo en {time.perf_counter() - t0:.1f}s ({cfg.workers} workers, {cfg.weight_type})")
+
+    def stop(self) -> None:
+        if self.pool is not None:
+            self.pool.shutdown(wait=False, cancel_futures=True)
+        if self.geocoder is not None:
+            self.geocoder.cache.close()
+        if self.route_cache is not None:
+            self.route_cache.close()
+
+    def require_key(self) -> str:
+        if not self.api_key:
+            raise HTTPException(status_code=503, detail="Google API key no configurada (GOOGLE_API_KEY).")
+        return self.api_key
+
+    def check_weight_type(self, weight_type: Optional[str]) -> str:
+        wt = weight_type or self.config.weight_type
+        if wt != self.config.weight_type:
+            raise HTTPException(
+                status_code=400,
+                detail=f"El servicio tiene cargado weight_type='{self.config.weight_type}'.",
+            )
+        return wt
+
+
+# ——— Esquemas ———
+class RouteRequest(BaseModel):
+    origin: str = Field(..., min_length=1)
+    destination: str = Field(..., min_length=1)
+    weight_type: Optional[str] = None
+    include_path: bool = False
+    max_snap_distance_m: Optional[float] = None
+
+
+class RouteResponse(BaseModel):
+    total_cost: Optional[float]
+    weight_type: str
+    num_nodes: int
+    origin_node: int
+    dest_node: int
+    origin: tuple[float, float]
+    destination: tuple[float, float]
+    path_nodes: Optional[list[int]] = None
+    elapsed_ms: float
+
+
+class MatrixRequest(BaseModel):
+    sources: list[str] = Field(..., min_length=1)
+    targets: list[str] = Field(..., min_length=1)
+    weight_type: Optional[str] = None
+
+
+class MatrixResponse(BaseModel):
+    costs: list[list[Optional[float]]]  # None = sin camino
+    source_nodes: list[int]
+    target_nodes: list[int]
+    weight_type: str
+    elapsed_ms: float
+
+
+class GeocodeResponse(BaseModel):
+    address: str
+    lat: float
+    lng: float
+    node: int
+    snap_distance_m: float
+
+
+def _finite_or_none(x: float) -> Optional[float]:
+    return float(x) if np.isfinite(x) else None
+
+
+def create_app(config: Optional[ServiceConfig] = None) -> FastAPI:
+    """Crea la app FastAPI; el grafo se carga en el lifespan (una vez por proceso)."""
+    service = RoutingService(config or ServiceConfig.from_env())
+
+    @asynccontextmanager
+    async def lifespan(_app: FastAPI):
+        await asyncio.to_thread(service.start)
+        try:
+            yield
+        finally:
+            service.stop()
+
+    app = FastAPI(title="LogiExpress Routing Service", lifespan=lifespan)
+    app.state.service = service
+
+    async def _with_timeout(coro):
+        try:
+            return await asyncio.wait_for(coro, timeout=service.config.request_timeout_s)
+        except asyncio.TimeoutError:
+            raise HTTPException(status_code=504, detail="Tiempo de espera agotado.")
+        except ValueError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except GeocodingError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+
+    @app.middleware("http")
+    async def _http_metrics(request: Request, call_next):
+        if not metrics.REGISTRY.enabled:
+            return await call_next(request)
+        t0 = time.perf_counter()
+        response = await call_next(request)
+        # Plantilla de la ruta (p. ej. /route), no la URL cruda: acota las series y el contenido de la etiqueta
+        route = request.scope.get("route")
+        path = getattr(route, "path", None) or "unmatched"
+        metrics.observe("http_request_seconds", time.perf_counter() - t0,
+                        path=path, status=response.status_code)
+        return response
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics_endpoint():
+        """Métricas en formato de texto Prometheus (vacío si ROUTING_METRICS no está activo)."""
+        return PlainTextResponse(metrics.REGISTRY.export_prometheus(),
+                                 media_type="text/plain; version=0.0.4")
+
+    @app.get("/health")
+    async def health():
+        ctx = service.context
+        return {
+            "status": "ok" if ctx is not None else "loading",
+            "place": service.config.place,
+            "weight_type": service.config.weight_type,
+            "nodes": ctx.num_nodes if ctx else 0,
+            "edges": ctx.num_edges if ctx else 0,
+            "graph_version": service.graph_version,
+            "workers": service.config.workers,
+            "geocode_cache": service.geocoder.cache.metrics() if service.geocoder else None,
+            "route_cache": service.route_cache.metrics() if service.route_cache else None,
+            "uptime_s": round(time.time() - service.started_at, 1),
+        }
+
+    @app.post("/route", response_model=RouteResponse)
+    async def route(req: RouteRequest):
+        key = service.require_key()
+        weight_type = service.check_weight_type(req.weight_type)
+        t0 = time.perf_counter()
+        result = await _with_timeout(compute_route_async(
+            G=service.context.G,
+            graph_simple=service.context.graph_simple,
+            dijkstra_fn=service.dijkstra_fn,
+            get_coordinates_from_address=service.geocoder,
+            origin_text=req.origin,
+            dest_text=req.destination,
+            google_api_key=key,
+            weight_type=weight_type,
+            timeout_seconds=service.config.request_timeout_s,
+            max_snap_distance_m=req.max_snap_distance_m,
+            context=service.context,
+            route_cache=service.route_cache,
+        ))
+        return RouteResponse(
+            total_cost=_finite_or_none(result.total_cost),
+            weight_type=result.weight_type,
+            num_nodes=len(result.path_nodes),
+            origin_node=int(result.origin_node),
+            dest_node=int(result.dest_node),
+            origin=(result.origin_lat, result.origin_lng),
+            destination=(result.dest_lat, result.dest_lng),
+            path_nodes=[int(n) for n in result.path_nodes] if req.include_path else None,
+            elapsed_ms=round((time.perf_counter() - t0) * 1000, 2),
+        )
+
+    @app.post("/matrix", response_model=MatrixResponse)
+    async def matrix(req: MatrixRequest):
+        key = service.require_key()
+        weight_type = service.check_weight_type(req.weight_type)
+        if len(req.sources) * len(req.targets) > service.config.max_matrix_cells:
+            raise HTTPException(status_code=413, detail="Matriz demasiado grande.")
+        ctx = service.context
+        sw, ne = ctx.bounds
+        t0 = time.perf_counter()
+
+        async def _compute():
+            addrs = list(req.sources) + list(req.targets)
+            coords = await asyncio.gather(*[
+                geocode_or_fail(service.geocoder, key, a, sw, ne) for a in addrs
+            ])
+            nodes = ctx.snapping_index.nearest_nodes([c[0] for c in coords], [c[1] for c in coords])
+            src = [int(n) for n in nodes[:len(req.sources)]]
+            dst = [int(n) for n in nodes[len(req.sources):]]
+            # Filas repartidas en el pool (una tarea por bloque de orígenes)
+            chunk = max(1, len(src) // max(1, service.config.workers))
+            loop = asyncio.get_running_loop()
+            futures = [
+                asyncio.wrap_future(service.pool.submit(_worker_matrix_rows, src[i:i + chunk], dst, weight_type),
+                                    loop=loop)
+                for i in range(0, len(src), chunk)
+            ]
+            rows = np.vstack(await asyncio.gather(*futures))
+            return src, dst, rows
+
+        src, dst, rows = await _with_timeout(_compute())
+        return MatrixResponse(
+            costs=[[_finite_or_none(x) for x in row] for row in rows.tolist()],
+            source_nodes=src,
+            target_nodes=dst,
+            weight_type=weight_type,
+            elapsed_ms=round((time.perf_counter() - t0) * 1000, 2),
+        )
+
+    @app.get("/geocode", response_model=GeocodeResponse)
+    async def geocode(address: str = Query(..., min_length=1)):
+        key = service.require_key()
+        sw, ne = service.context.bounds
+        lat, lng = await _with_timeout(geocode_or_fail(service.geocoder, key, address, sw, ne))
+        nodes, dists = service.context.snapping_index.nearest_nodes([lat], [lng], return_distance=True)
+        return GeocodeResponse(address=address, lat=lat, lng=lng, node=int(nodes[0]),
+                               snap_distance_m=round(float(dists[0]), 2))
+
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    host = os.environ.get("ROUTING_HOST", "0.0.0.0")
+    port = int(os.environ.get("ROUTING_PORT", "8000"))
+    # Un solo proceso uvicorn: el paralelismo de CPU lo da el pool de procesos interno
+    uvicorn.run(create_app(), host=host, port=port, workers=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,14 @@ import webbrowser
 from src.security.encrypted_env import load_secret              # gestor de API key cifrada
 from src.graph.downloader import download_city_graph            # descarga/caché de OSMnx
 from src.graph.builder import build_simple_graph                 # construye grafo simplificado (distance|duration)
+from src.graph.context import GraphContext                       # bounds/índice/GeoDataFrames precalculados
+from src.graph.reduction import ReducedEngine, reduce_graph       # SCC más grande + contracción de cadenas
+from src.caching.duration_cache import DurationCache             # caché persistente de duraciones (SQLite)
+from src.caching.geocode_cache import GeocodeCache, cached_geocoder  # caché de geocodificación (LRU + SQLite)
+from src.caching.route_cache import RouteCache                   # caché de rutas (origen, destino, versión del grafo)
 from src.graph.visualizer import plot_route_explore_compliant    # renderer GeoPandas.explore compliant
+from src.graph.visualizer import plot_routes_fast                # renderer rápido (folium directo)
+from src.graph.downloader import graph_cache_path                # rutas de artefactos junto al grafo
 from src.routing.compute_routes_async import (                    # cálculo asíncrono de ruta
     compute_route_async,
     RouteResult,
@@ -31,6 +38,12 @@ class RouteGUI:
         self.google_maps_api_url = "https://routes.googleapis.com/directions/v2:computeRoutes"
         self.G = None               # grafo OSMnx completo (MultiDiGraph)
         self.graph_simple = None    # grafo simplificado {u:[(v,weight),...]}
+        self.context = None         # GraphContext: bounds, índice espacial, GDFs (una vez por grafo)
+        self.reduced = None         # ReducedGraph: SCC más grande + cadenas contraídas (src/graph/reduction.py)
+        self.search_fn = None       # ReducedEngine(dijkstra) sobre el grafo reducido
+        self.duration_store = None  # caché persistente de duraciones (se abre al construir en modo duration)
+        self.geocoder = None        # get_coordinates_from_address con caché (se crea en el primer cálculo)
+        self.route_cache = RouteCache(memory_size=5_000)  # rutas repetidas (se invalida sola al reconstruir el grafo)
         self.last_result: RouteResult | None = None
 
         # —— UI principal ——
@@ -77,6 +90,8 @@ class RouteGUI:
         self.btn_compute.pack(side="left")
         ttk.Button(row3, text="Open Map", command=self.on_open_map).pack(side="left", padx=8)
         ttk.Button(row3, text="Save As...", command=self.on_save_as).pack(side="left")
+        self.fast_map_var = tk.BooleanVar(value=True)  # render rápido (folium) vs GeoPandas.explore
+        ttk.Checkbutton(row3, text="Fast map", variable=self.fast_map_var).pack(side="left", padx=8)
 
         # Consola/Log
         ttk.Label(container, text="Log:").pack(anchor="w")
@@ -153,10 +168,14 @@ class RouteGUI:
             # Descarga con caché
             self.G = download_city_graph(place, network_type="drive", use_cache=True, max_age_days=30)
             self._log(f"[INFO] Grafo: {self.G.number_of_nodes():,} nodos, {self.G.number_of_edges():,} aristas")
+            self.context = GraphContext(self.G, place=place)
 
             weight_mode = self.weight_mode_var.get()
             self._log(f"[INFO] Construyendo grafo simplificado (weight={weight_mode}) ...")
 
+            if weight_mode == "duration" and self.duration_store is None:
+                self.duration_store = DurationCache()
+
             # build_simple_graph soporta 'duration' (si pasa API) o 'distance'
             try:
                 self.graph_simple = build_simple_graph(
@@ -165,10 +184,19 @@ class RouteGUI:
                     G=self.G,
                     weight_type=weight_mode,
                     sample_ratio=0.001,  # limita llamadas a API si 'duration'
+                    duration_store=self.duration_store,
                 )
             except TypeError:
                 self.graph_simple = build_simple_graph(self.G, weight_type=weight_mode)
 
+            # Reducción: ajuste solo a la SCC más grande y búsqueda sobre cadenas contraídas
+            self.reduced = reduce_graph(self.graph_simple, weight_type=weight_mode)
+            self.search_fn = ReducedEngine(self.reduced, dijkstra)
+            st = self.reduced.stats
+            self._log(f"[INFO] Grafo reducido: {st['nodes_in']:,} -> {st['nodes_out']:,} nodos, "
+                      f"{st['edges_in']:,} -> {st['edges_out']:,} aristas")
+            self.context.set_routing_graph(self.graph_simple, weight_mode, snap_nodes=self.reduced.snap_nodes)
+            self.context.warm_up()  # índice espacial una sola vez, ya restringido a la SCC
             self._log("[INFO] Grafo simplificado listo.")
         except Exception as e:
             self._log("[ERROR] Falló la construcción del grafo.")
@@ -200,19 +228,24 @@ class RouteGUI:
             dest_text = self.dest_var.get().strip()
             weight_mode = self.weight_mode_var.get()
 
+            if self.geocoder is None:
+                self.geocoder = cached_geocoder(get_coordinates_from_address, GeocodeCache())
+
             # Ejecuta el cómputo asíncrono en un event loop local (sin bloquear la UI)
             import asyncio
             result: RouteResult = asyncio.run(
                 compute_route_async(
                     G=self.G,
                     graph_simple=self.graph_simple,
-                    dijkstra_fn=dijkstra,
-                    get_coordinates_from_address=get_coordinates_from_address,
+                    dijkstra_fn=self.search_fn or dijkstra,
+                    get_coordinates_from_address=self.geocoder,
                     origin_text=origin_text,
                     dest_text=dest_text,
                     google_api_key=(self.google_api_key or ""),
                     weight_type=weight_mode,
                     timeout_seconds=30,
+                    context=self.context,
+                    route_cache=self.route_cache,
                 )
             )
 
@@ -222,14 +255,33 @@ class RouteGUI:
                 self._log(f"[RESULT] Distancia más corta: {result.total_cost:.2f} m — {len(result.path_nodes)} nodos")
             else:
                 self._log(f"[RESULT] Ruta más rápida: {result.total_cost/60:.2f} min — {len(result.path_nodes)} nodos")
-
-            # Render (GeoPandas.explore compliant, SIN fijar zoom por defecto)
-            html_path = plot_route_explore_compliant(
-                self.G,
-                result.path_nodes,
-                save_path="data/outputs/route_map.html",
-                show_network=False,  # True si se quiere sombrear red alrededor del trayecto
-            )
+            m = self.geocoder.cache.metrics()
+            self._log(f"[INFO] Caché de geocodificación: hits={m['memory_hits'] + m['disk_hits']} "
+                      f"misses={m['misses']} hit_ratio={m['hit_ratio']:.0%}")
+            rm = self.route_cache.metrics()
+            self._log(f"[INFO] Caché de rutas: hit_ratio={rm['hit_ratio']:.0%} "
+                      f"ahorro={rm['saved_seconds']:.2f}s entradas={rm['memory_entries']}")
+
+            if self.fast_map_var.get():
+                # Render rápido: polilínea + fondo simplificado de la red (cacheado por grafo)
+                background = self.context.network_background(
+                    graph_cache_path(self.context.place, "drive", suffix=".background.npz")
+                )
+                html_path = plot_routes_fast(
+                    self.G,
+                    [result.path_nodes],
+                    save_path="data/outputs/route_map.html",
+                    background=background,
+                )
+            else:
+                # Render (GeoPandas.explore compliant, SIN fijar zoom por defecto)
+                html_path = plot_route_explore_compliant(
+                    self.G,
+                    result.path_nodes,
+                    save_path="data/outputs/route_map.html",
+                    show_network=False,  # True si se quiere sombrear red alrededor del trayecto
+                    context=self.context,
+                )
             self._log(f"[INFO] Mapa interactivo guardado en: {html_path}")
 
         except Exception as e: